@@ -1,17 +1,59 @@
+import logging
+import os
 import pandas as pd
-import mysql.connector
-from sqlalchemy import create_engine
 from sqlalchemy.sql import text
 import re
 
-# MySQL connection details
-MYSQL_USER = 'root'  # Default MySQL user created by Homebrew
-MYSQL_PASSWORD = ''  # No password set
-MYSQL_HOST = 'localhost'  # Default host
-DATABASE_NAME = 'chatDB'
+# MySQL connection details live in backend/connections.py
+from backend.connections import DATABASE_NAME, get_mysql_connection, get_sql_engine
+from backend.schema_catalog import get_table_columns, invalidate_schema
+from backend.result_cache import result_cache
+from backend.value_dictionary import collect_values, update_values
+from backend.column_stats import collect_stats, save_stats
+from backend.index_manager import ensure_sql_indexes
+from backend.join_graph import update_join_graph
+from backend.bulk_loader import BATCH_SIZE, DEFAULT_LOAD_STRATEGY, bulk_load
 
-# Path to the data files
-FILE_PATHS = ['data/INCIDENT.csv','data/SHOOTER.csv','data/VICTIM.csv']
+logger = logging.getLogger("chatdb.backend_functions")
+
+# Rows read (and written) per chunk when streaming a file into MySQL
+CHUNK_SIZE = 50000
+
+# Narrowest column types are inferred from the data and widened as later chunks
+# (or appended files) need it: integer widths grow with the value range, INT
+# becomes FLOAT, ENUMs gain values until they have too many, and anything that
+# mixes kinds falls back to a VARCHAR long enough for every value, then TEXT.
+
+# Signed integer types and the largest value each holds
+INTEGER_TYPES = [
+    ("TINYINT", 127),
+    ("SMALLINT", 32767),
+    ("MEDIUMINT", 8388607),
+    ("INT", 2147483647),
+    ("BIGINT", 9223372036854775807),
+]
+# VARCHAR lengths text columns are rounded up to; longer text is stored as TEXT
+VARCHAR_LENGTHS = [16, 32, 64, 128, 255]
+# Text columns with at most ENUM_MAX_VALUES short values, each seen on average
+# ENUM_MIN_ROWS_PER_VALUE times, become ENUMs (gender, Yes/No flags, State, ...)
+ENUM_MAX_VALUES = 16
+ENUM_MAX_LENGTH = 32
+ENUM_MIN_ROWS_PER_VALUE = 4
+# Type of columns that are empty in every chunk
+DEFAULT_COLUMN_TYPE = "VARCHAR(255)"
+# Characters needed to store values of other kinds as text
+TEXT_LENGTHS = {"int": 20, "float": 32, "date": 10, "time": 8}
+
+MYSQL_TYPE_KINDS = {
+    "tinyint": "int", "smallint": "int", "mediumint": "int", "int": "int", "integer": "int", "bigint": "int",
+    "float": "float", "double": "float", "decimal": "float", "real": "float",
+    "varchar": "varchar", "char": "varchar", "enum": "enum", "date": "date", "time": "time",
+}
+
+_DATE_VALUE = r"\d{4}([-/])\d{1,2}\1\d{1,2}"
+_TIME_VALUE = r"\d{1,2}:\d{2}(:\d{2})?"
+_COLUMN_TYPE = re.compile(r"^\s*(\w+)\s*(?:\((.*)\))?", re.DOTALL)
+_ENUM_VALUE = re.compile(r"'((?:[^'\\]|''|\\.)*)'")
 
 # Create a new MySQL database
 def create_database(cursor, db):
@@ -27,37 +69,290 @@ def load_file(file_path):
     else:
         raise ValueError("Unsupported file type.")
 
-# Create a table in MySQL based on the DataFrame columns
-def create_table_from_dataframe(df, table_name, engine):
-    column_types = []
+# Stream the data file as DataFrame chunks
+def load_file_chunks(file_path, chunksize=CHUNK_SIZE):
+    """
+    Read a data file in fixed-size chunks so memory use does not grow with file size.
+
+    Args:
+        file_path (str): Path to a .csv/.txt (streamed) or .xlsx (read in one piece) file.
+        chunksize (int): Number of rows per chunk.
+
+    Yields:
+        tuple: (DataFrame chunk, fraction of the file read so far between 0 and 1).
+    """
+    if file_path.endswith('.csv') or file_path.endswith('.txt'):
+        file_size = os.path.getsize(file_path) or 1
+        with open(file_path, 'rb') as handle:
+            for chunk in pd.read_csv(handle, chunksize=chunksize):
+                yield chunk, min(handle.tell() / file_size, 1.0)
+    elif file_path.endswith('.xlsx'):
+        yield pd.read_excel(file_path), 1.0
+    else:
+        raise ValueError("Unsupported file type.")
+
+def integer_type(low, high):
+    for column_type, limit in INTEGER_TYPES:
+        if -limit - 1 <= low and high <= limit:
+            return column_type
+    return "FLOAT"
+
+def varchar_type(length):
+    for size in VARCHAR_LENGTHS:
+        if length <= size:
+            return f"VARCHAR({size})"
+    return "TEXT"
+
+def enum_type(values):
+    quoted = ("'" + value.replace("\\", "\\\\").replace("'", "''") + "'" for value in sorted(values))
+    return f"ENUM({','.join(quoted)})"
+
+# ENUM values are compared case-insensitively (and without trailing spaces), so values
+# that differ only in case (e.g. 'NO' and 'No') have to be stored in a VARCHAR
+def enum_or_varchar_type(values):
+    if len(values) <= ENUM_MAX_VALUES and len({value.rstrip().lower() for value in values}) == len(values):
+        return enum_type(values)
+    return varchar_type(max((len(value) for value in values), default=1))
+
+# Split a column type into its kind and detail, e.g. ("int", "SMALLINT"), ("varchar", 64), ("enum", ["No", "Yes"])
+def parse_column_type(column_type):
+    match = _COLUMN_TYPE.match(column_type)
+    name = match.group(1).lower()
+    kind = MYSQL_TYPE_KINDS.get(name, "text")
+    if kind == "int":
+        return kind, "INT" if name == "integer" else name.upper()
+    if kind == "varchar":
+        return kind, int(match.group(2) or 255)
+    if kind == "enum":
+        values = [value.replace("''", "'").replace("\\\\", "\\") for value in _ENUM_VALUE.findall(match.group(2) or "")]
+        return kind, values
+    return kind, None
+
+# Characters a column of this type needs when it is stored as text
+def text_length(column_type):
+    kind, detail = parse_column_type(column_type)
+    if kind == "varchar":
+        return detail
+    if kind == "enum":
+        return max((len(value) for value in detail), default=1)
+    return TEXT_LENGTHS.get(kind, VARCHAR_LENGTHS[-1] + 1)
+
+# Narrowest SQL column type for the values of one chunk (None if the column is empty)
+def infer_column_type(series):
+    values = series.dropna()
+    if values.empty:
+        return None
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return "TINYINT"
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return integer_type(values.min(), values.max())
+    if pd.api.types.is_float_dtype(series.dtype):
+        # CSV integer columns with empty fields are read as floats (15.0)
+        if (values % 1 == 0).all():
+            return integer_type(values.min(), values.max())
+        return "FLOAT"
+    # Surrounding spaces are not part of the value (coerce_chunk strips them too); blank values are missing
+    text_values = values.astype(str).str.strip()
+    text_values = text_values[text_values != ""]
+    if text_values.empty:
+        return None
+    if text_values.str.fullmatch(_DATE_VALUE).all():
+        return "DATE"
+    if text_values.str.fullmatch(_TIME_VALUE).all():
+        return "TIME"
+    lengths = text_values.str.len()
+    distinct = text_values.unique()
+    if (len(distinct) <= ENUM_MAX_VALUES and lengths.max() <= ENUM_MAX_LENGTH
+            and len(text_values) >= ENUM_MIN_ROWS_PER_VALUE * len(distinct)):
+        return enum_or_varchar_type(distinct)
+    return varchar_type(lengths.max())
+
+# Map each DataFrame column to a SQL column type
+def infer_column_types(df):
+    return {column: infer_column_type(df[column]) for column in df.columns}
+
+# The narrowest type that can hold the values of both types
+def merge_column_type(current, new):
+    if current is None or current == new:
+        return new
+    if new is None:
+        return current
+    current_kind, current_detail = parse_column_type(current)
+    new_kind, new_detail = parse_column_type(new)
+    kinds = {current_kind, new_kind}
+    if kinds == {"int"}:
+        names = [name for name, _ in INTEGER_TYPES]
+        return current_detail if names.index(current_detail) >= names.index(new_detail) else new_detail
+    if kinds == {"int", "float"} or kinds == {"float"}:
+        return "FLOAT"
+    if kinds == {"enum"}:
+        return enum_or_varchar_type(set(current_detail) | set(new_detail))
+    if "text" in kinds:
+        return "TEXT"
+    return varchar_type(max(text_length(current), text_length(new)))
+
+# Combine the column types seen so far with the types of a new chunk, keeping the wider type
+def merge_column_types(current, new):
+    merged = dict(current)
+    for column, column_type in new.items():
+        merged[column] = merge_column_type(merged.get(column), column_type)
+    return merged
+
+# Parse date text ('2022/6/1', '2022-06-01') into datetimes; anything else becomes NaT
+def parse_dates(series):
+    dates = series.astype("string").str.strip().str.replace("/", "-", regex=False)
+    return pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce")
+
+# Normalize time text ('1:30', '1:30:00') to 'HH:MM:SS', which sorts in time order; anything else becomes NA
+def parse_times(series):
+    parts = series.astype("string").str.strip().str.extract(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+    return parts[0].str.zfill(2) + ":" + parts[1] + ":" + parts[2].fillna("00")
+
+# Strip surrounding spaces from text values (' No' -> 'No'); values left blank become missing
+def strip_text(series):
+    if not (pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)):
+        return series
+    stripped = series.where(series.isna(), series.astype(str).str.strip())
+    return stripped.where(stripped != "", None)
+
+# Convert a chunk's values to what its column types store
+def coerce_chunk(df, column_types):
+    df = df.copy()
     for column in df.columns:
-        # if column == 'Sources':
-        #     column_types.append(f"`{column}` TEXT")
-        if df[column].dtype == 'object':
-            column_types.append(f"`{column}` TEXT")
-        elif df[column].dtype == 'int64':
-            column_types.append(f"`{column}` INT")
-        elif df[column].dtype == 'float64':
-            column_types.append(f"`{column}` FLOAT")
+        kind, _ = parse_column_type(column_types.get(column) or DEFAULT_COLUMN_TYPE)
+        if kind in ("varchar", "enum", "text"):
+            # The types were inferred from stripped values, so load stripped values ('No' fits ENUM('No','Yes'), ' No' does not)
+            df[column] = strip_text(df[column])
+        elif kind == "int":
+            df[column] = pd.to_numeric(df[column], errors="coerce").round().astype("Int64")
+        elif kind == "date":
+            df[column] = parse_dates(df[column]).dt.date
+        elif kind == "time":
+            df[column] = parse_times(df[column])
+    return df
+
+def coerce_chunks(chunks, column_types):
+    for chunk, fraction in chunks:
+        yield coerce_chunk(chunk, column_types), fraction
+
+# Read the column types of an existing table from the schema catalog
+def existing_column_types(table_name):
+    connection = get_mysql_connection()
+    try:
+        columns = get_table_columns(connection, table_name)
+    finally:
+        connection.close()
+    types = {}
+    for col in columns:
+        kind, detail = parse_column_type(col["type"])
+        if kind == "int":
+            types[col["name"]] = detail
+        elif kind == "varchar":
+            types[col["name"]] = f"VARCHAR({detail})"
+        elif kind == "enum":
+            types[col["name"]] = enum_type(detail)
         else:
-            column_types.append(f"`{column}` VARCHAR(255)") 
+            types[col["name"]] = {"float": "FLOAT", "date": "DATE", "time": "TIME"}.get(kind, "TEXT")
+    return types
+
+# Create a table in MySQL based on the DataFrame columns
+def create_table_from_dataframe(df, table_name, engine, column_types=None):
+    if column_types is None:
+        column_types = infer_column_types(df)
+    columns = [f"`{column}` {column_types[column] or DEFAULT_COLUMN_TYPE}" for column in df.columns]
+
+    create_table_query = f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(columns)});"
+    with engine.connect() as connection:
+        # Use text() to wrap the raw SQL string (colons in ENUM values are escaped so they are not bind parameters)
+        connection.execute(text(create_table_query.replace(":", "\\:")))
 
-    create_table_query = f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(column_types)});"
+# Widen columns whose type changed between chunks (and add columns the table does not have yet)
+def widen_table_columns(table_name, current, widened, engine):
+    clauses = []
+    for column, column_type in widened.items():
+        if column not in current:
+            clauses.append(f"ADD COLUMN `{column}` {column_type}")
+        elif column_type != current[column]:
+            clauses.append(f"MODIFY COLUMN `{column}` {column_type}")
+    if not clauses:
+        return
     with engine.connect() as connection:
-        connection.execute(text(create_table_query))  # Use text() to wrap the raw SQL string
+        connection.execute(text(f"ALTER TABLE {table_name} {', '.join(clauses)};".replace(":", "\\:")))
 
 # Insert DataFrame into MySQL
 def insert_dataframe_into_mysql(df, table_name, engine):
     df.to_sql(table_name, con=engine, if_exists='append', index=False)
 
+# Default progress report for implement()
+def log_progress(rows_loaded, fraction):
+    logger.info("%d rows loaded (%.0f%% of file)", rows_loaded, fraction * 100)
+
+# Scan the whole file chunk by chunk and create or widen the table to fit it.
+# All DDL happens here, before the load transaction starts (DDL would commit it).
+# The distinct values of low-cardinality columns and the column statistics are collected in the same pass.
+# A file read in a single chunk (and every .xlsx file) is returned parsed, so loading it does not read it again.
+def prepare_table(file, table_name, engine, chunksize=CHUNK_SIZE, values=None, stats=None):
+    existing = existing_column_types(table_name)
+    column_types = dict(existing)
+    columns = None
+    only_chunk = None
+    for index, (chunk, _) in enumerate(load_file_chunks(file, chunksize)):
+        if columns is None:
+            columns = list(chunk.columns)
+        # Holding more than one chunk would lift the memory bound of streaming
+        only_chunk = chunk if index == 0 else None
+        column_types = merge_column_types(column_types, infer_column_types(chunk))
+        if values is not None or stats is not None:
+            # Offer and count the values as they will be stored
+            stripped = chunk.apply(strip_text)
+            if values is not None:
+                collect_values(stripped, values)
+            if stats is not None:
+                collect_stats(stripped, stats)
+
+    if columns is None:
+        raise ValueError(f"{file} is empty.")
+    column_types = {column: column_type or DEFAULT_COLUMN_TYPE for column, column_type in column_types.items()}
+    if not existing:
+        # Create a table based on the widened types of every chunk
+        create_table_from_dataframe(pd.DataFrame(columns=columns), table_name, engine, column_types=column_types)
+    elif column_types != existing:
+        widen_table_columns(table_name, existing, column_types, engine)
+    if column_types != existing:
+        # Only DDL makes the cached catalog (and translations built from it) stale
+        invalidate_schema()
+    return columns, column_types, only_chunk
+
 # Main implementation
-def implement(file, table_name):
-    # Connect to MySQL
-    mydb = mysql.connector.connect(
-        host=MYSQL_HOST,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWORD
-    )
+def implement(file, table_name, chunksize=CHUNK_SIZE, progress=log_progress, strategy=DEFAULT_LOAD_STRATEGY, batch_size=BATCH_SIZE):
+    """
+    Stream a data file into a MySQL table.
+
+    A first streaming pass infers the column types (widening them across chunks)
+    and creates or alters the table. A second pass loads the rows chunk by chunk
+    inside one transaction using the chosen bulk-load strategy, so only one chunk
+    is held in memory at a time.
+
+    Files larger than one chunk are parsed twice. This is deliberate: the types
+    are only final once every chunk has been seen, and widening the table while
+    loading (ALTER TABLE) would implicitly commit the load transaction, so a
+    failed load could no longer be rolled back. Files that fit in one chunk (and .xlsx files, read in one
+    piece) are parsed once, and "infile" never parses the file a second time in
+    pandas (the server reads it).
+
+    Args:
+        file (str): Path to the data file.
+        table_name (str): Table to create or append to.
+        chunksize (int): Rows per chunk.
+        progress (callable, optional): Called as progress(rows_loaded, fraction) after each chunk.
+        strategy (str): "infile" (LOAD DATA LOCAL INFILE), "batched" (multi-row INSERTs) or "to_sql" (pandas fallback).
+        batch_size (int): Rows per INSERT statement for the "batched" strategy.
+
+    Returns:
+        dict: Load statistics ({"strategy", "rows", "seconds", "rows_per_sec"}).
+    """
+    # Server-level connection from the shared pool (the database may not exist yet)
+    mydb = get_mysql_connection(database=None)
     cursor = mydb.cursor()
 
     # Create a new database
@@ -65,26 +360,38 @@ def implement(file, table_name):
     cursor.close()
     mydb.close()
 
-    df = load_file(file)
-    engine = create_engine(f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{DATABASE_NAME}")
-
-    # Create a table based on the DataFrame
-    create_table_from_dataframe(df, table_name, engine)
+    engine = get_sql_engine(DATABASE_NAME)
 
-    # Insert the data into the table
-    insert_dataframe_into_mysql(df, table_name, engine)
+    try:
+        created = not existing_column_types(table_name)
+        values, column_stats = {}, {}
+        columns, column_types, only_chunk = prepare_table(file, table_name, engine, chunksize, values=values, stats=column_stats)
+        chunks = [(only_chunk, 1.0)] if only_chunk is not None else load_file_chunks(file, chunksize)
+        # Insert the data into the table, with values converted to the column types (dates, integers)
+        stats = bulk_load(
+            file, table_name, columns, coerce_chunks(chunks, column_types),
+            strategy=strategy, batch_size=batch_size, progress=progress, column_types=column_types
+        )
+        # The rows are committed, so their values can be offered and recognized
+        update_values("sql", table_name, values, replace=created)
+        save_stats("sql", table_name, column_stats, replace=created)
+        update_join_graph("sql", table_name)
+        # Index the join keys once the rows are in (cheaper than maintaining the index during the load)
+        try:
+            ensure_sql_indexes(table_name)
+        except Exception:
+            logger.exception("Could not index %s", table_name)
+    finally:
+        # The table was appended to, so cached results read from it are stale
+        result_cache.invalidate("sql", table_name)
 
-    print(f"Data from {file} has been successfully inserted into the database {DATABASE_NAME}.")
+    logger.info("Data from %s has been successfully inserted into the database %s.", file, DATABASE_NAME)
+    return stats
 
 
 if __name__ == "__main__":
-    for file in FILE_PATHS:
-        table_name = ''
-        match = re.search(r'/([A-Z]+)\.csv$', file)
-        if match:
-            table_name = match.group(1).lower()
-        implement(file, table_name)
+    # Load every CSV in data/ in parallel (see backend/bootstrap.py)
+    from backend.bootstrap import bootstrap, discover_manifest
+    bootstrap(discover_manifest(), targets=["mysql"])
 
     print(f"All files have been successfully inserted into the database {DATABASE_NAME}.")
-
-
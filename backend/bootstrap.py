@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from backend.connections import DATABASE_NAME
+from backend.backend_functions import implement
+from backend.bulk_loader import DEFAULT_LOAD_STRATEGY
+from backend.nosql_backend import import_csv_to_mongodb
+
+# Provision MySQL and/or MongoDB from every CSV file in the data directory,
+# ingesting files concurrently with a bounded worker pool.
+#
+# Usage (from the repository root):
+#     python -m backend.bootstrap [--targets mysql mongodb] [--workers 4] [--manifest manifest.json]
+
+DATA_DIR = "data"
+TARGETS = ("mysql", "mongodb")
+# Keep this below MYSQL_POOL_SIZE so every worker can get a pooled connection
+MAX_WORKERS = 4
+
+
+def discover_manifest(data_dir=DATA_DIR):
+    """
+    Build a manifest with one entry per CSV file in data_dir.
+
+    Returns:
+        list: [{"path": "data/INCIDENT.csv", "table": "incident"}, ...] sorted by path.
+    """
+    manifest = []
+    for name in sorted(os.listdir(data_dir)):
+        if name.lower().endswith(".csv"):
+            manifest.append({
+                "path": os.path.join(data_dir, name),
+                "table": os.path.splitext(name)[0].lower(),
+            })
+    return manifest
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, "r") as file:
+        return json.load(file)
+
+
+def write_manifest(manifest, manifest_path):
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+
+
+def ingest_file(entry, target, db_name=DATABASE_NAME, load_strategy=DEFAULT_LOAD_STRATEGY):
+    """
+    Ingest one manifest entry into one target and time it.
+
+    Returns:
+        dict: {"path", "table", "target", "rows", "seconds", "error"}.
+    """
+    result = {"path": entry["path"], "table": entry["table"], "target": target, "rows": 0, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        if target == "mysql":
+            result["rows"] = implement(entry["path"], entry["table"], progress=None, strategy=load_strategy)["rows"]
+        elif target == "mongodb":
+            result["rows"] = import_csv_to_mongodb(entry["path"], db_name, collection_name=entry["table"])
+        else:
+            raise ValueError(f"Unknown target {target}")
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def bootstrap(manifest, targets=TARGETS, max_workers=MAX_WORKERS, db_name=DATABASE_NAME, load_strategy=DEFAULT_LOAD_STRATEGY):
+    """
+    Ingest every manifest entry into every target, at most max_workers at a time.
+
+    Returns:
+        list: One result dict per (file, target), in manifest order.
+    """
+    jobs = [(entry, target) for entry in manifest for target in targets]
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(ingest_file, entry, target, db_name, load_strategy): index
+            for index, (entry, target) in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            status = f"error: {result['error']}" if result["error"] else f"{result['rows']} rows"
+            print(f"[{result['target']}] {result['path']} -> {result['table']}: {status} in {result['seconds']:.2f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load every CSV dataset into MySQL and/or MongoDB in parallel.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory scanned for CSV files when no manifest is given")
+    parser.add_argument("--manifest", help="JSON manifest ([{\"path\": ..., \"table\": ...}]) to use instead of scanning")
+    parser.add_argument("--write-manifest", help="Write the discovered manifest to this path and exit")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest) if args.manifest else discover_manifest(args.data_dir)
+    if args.write_manifest:
+        write_manifest(manifest, args.write_manifest)
+        print(f"Manifest with {len(manifest)} files written to {args.write_manifest}")
+        return
+
+    start = time.perf_counter()
+    results = bootstrap(manifest, targets=args.targets, max_workers=args.workers)
+    failed = [result for result in results if result["error"]]
+    total_rows = sum(result["rows"] for result in results)
+    print(f"Loaded {total_rows} rows from {len(manifest)} files into {', '.join(args.targets)} "
+          f"in {time.perf_counter() - start:.2f}s ({len(failed)} failed)")
+
+
+if __name__ == "__main__":
+    main()
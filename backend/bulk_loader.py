@@ -0,0 +1,159 @@
+import logging
+import time
+from backend.connections import get_mysql_connection, get_mysql_infile_connection, get_sql_engine
+
+logger = logging.getLogger("chatdb.bulk_loader")
+
+# Bulk-load strategies for writing a data file into an existing MySQL table.
+# Every strategy loads the whole file inside one transaction and reports rows per second.
+
+# Rows per multi-row INSERT statement for the "batched" strategy
+BATCH_SIZE = 5000
+
+DEFAULT_LOAD_STRATEGY = "batched"
+
+
+def dataframe_rows(df):
+    """
+    Convert a DataFrame chunk into a list of plain Python tuples, with NaN turned into None.
+    """
+    df = df.astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def detect_line_terminator(file):
+    with open(file, 'rb') as handle:
+        first_line = handle.readline()
+    return "\r\n" if first_line.endswith(b"\r\n") else "\n"
+
+
+def infile_expression(variable, column_type):
+    # Blank fields are stored as NULL and text is stripped (as coerce_chunk does); dates may be written 2022/6/1 and integers 15.0
+    value = f"NULLIF(TRIM({variable}), '')"
+    if column_type == "DATE":
+        return f"REPLACE({value}, '/', '-')"
+    if column_type and column_type.endswith("INT"):
+        return f"ROUND({value})"
+    return value
+
+
+def load_infile(file, table_name, columns, chunks, batch_size=BATCH_SIZE, progress=None, column_types=None):
+    """
+    Load a CSV file with LOAD DATA LOCAL INFILE. The server parses the file itself,
+    so no rows pass through pandas. Empty fields are stored as NULL.
+    """
+    column_types = column_types or {}
+    variables = [f"@v{i}" for i in range(len(columns))]
+    assignments = ", ".join(
+        f"`{column}` = {infile_expression(var, column_types.get(column))}" for column, var in zip(columns, variables)
+    )
+    query = (
+        f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+        f"LINES TERMINATED BY %s IGNORE 1 LINES ({', '.join(variables)}) SET {assignments}"
+    )
+    # Only this connection may send local files; the pooled ones may not
+    connection = get_mysql_infile_connection()
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        cursor.execute(query, (file, detect_line_terminator(file)))
+        rows = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+    if progress:
+        progress(rows, 1.0)
+    return rows
+
+
+def load_batched(file, table_name, columns, chunks, batch_size=BATCH_SIZE, progress=None, column_types=None):
+    """
+    Insert the file with multi-row INSERT statements of batch_size rows each.
+    """
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    query = f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})"
+
+    rows_loaded = 0
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        for chunk, fraction in chunks:
+            rows = dataframe_rows(chunk[columns])
+            for start in range(0, len(rows), batch_size):
+                # executemany sends the batch as a single multi-row INSERT
+                cursor.executemany(query, rows[start:start + batch_size])
+            rows_loaded += len(rows)
+            if progress:
+                progress(rows_loaded, fraction)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+    return rows_loaded
+
+
+def load_to_sql(file, table_name, columns, chunks, batch_size=BATCH_SIZE, progress=None, column_types=None):
+    """
+    Fallback: pandas DataFrame.to_sql with its default insert method.
+    """
+    rows_loaded = 0
+    with get_sql_engine().begin() as connection:
+        for chunk, fraction in chunks:
+            chunk.to_sql(table_name, con=connection, if_exists='append', index=False)
+            rows_loaded += len(chunk)
+            if progress:
+                progress(rows_loaded, fraction)
+    return rows_loaded
+
+
+LOAD_STRATEGIES = {
+    "infile": load_infile,
+    "batched": load_batched,
+    "to_sql": load_to_sql,
+}
+
+
+def bulk_load(file, table_name, columns, chunks, strategy=DEFAULT_LOAD_STRATEGY, batch_size=BATCH_SIZE, progress=None, column_types=None):
+    """
+    Load a data file into an existing table with the chosen strategy, in one transaction.
+
+    Args:
+        file (str): Path to the data file.
+        table_name (str): Target table (must already exist with the right columns).
+        columns (list): Column names in file order.
+        chunks (iterable): (DataFrame chunk, fraction) pairs, values already coerced to the column types; unused by "infile".
+        strategy (str): One of LOAD_STRATEGIES ("infile", "batched", "to_sql").
+        batch_size (int): Rows per INSERT statement for "batched".
+        progress (callable, optional): Called as progress(rows_loaded, fraction).
+        column_types (dict, optional): Column types of the table; "infile" converts values with them.
+
+    Returns:
+        dict: {"strategy", "rows", "seconds", "rows_per_sec"}.
+    """
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(f"Unknown load strategy {strategy}. Choose one of {', '.join(LOAD_STRATEGIES)}.")
+    # LOAD DATA only understands delimited text files
+    if strategy == "infile" and not (file.endswith('.csv') or file.endswith('.txt')):
+        strategy = "batched"
+
+    start = time.perf_counter()
+    rows = LOAD_STRATEGIES[strategy](file, table_name, columns, chunks, batch_size=batch_size, progress=progress, column_types=column_types)
+    seconds = time.perf_counter() - start
+    stats = {
+        "strategy": strategy,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else float("inf"),
+    }
+    logger.info("Loaded %d rows into %s with '%s' in %.2fs (%s rows/s)", rows, table_name, strategy, seconds, f"{stats['rows_per_sec']:,.0f}")
+    return stats
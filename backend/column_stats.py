@@ -0,0 +1,292 @@
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.connections import DATABASE_NAME, get_mongo_client, get_mysql_connection
+
+logger = logging.getLogger("chatdb.column_stats")
+
+# Per-column statistics of every table/collection: row count, null fraction,
+# distinct count, min/max and an equi-depth histogram of numeric columns.
+# They are computed with vectorized pandas/NumPy on the chunks the ingest
+# already reads, merged on every append, and persisted next to the data in
+# the _chatdb_column_stats table (MySQL) or collection (MongoDB).
+#
+# Merging works because every column keeps mergeable state: counts, min/max,
+# the hashes of up to DISTINCT_CAP distinct values and a bottom-k random
+# sample of up to SAMPLE_SIZE numeric values (the histogram is built from it).
+#
+# Statistics read from the catalog are kept in memory for STATS_CACHE_TTL
+# seconds, so tables another process loads in the meantime are seen; saving
+# re-reads a table's statistics before merging into them.
+
+STATS_TABLE = "_chatdb_column_stats"
+SAMPLE_SIZE = 1000
+DISTINCT_CAP = 1000
+HISTOGRAM_BUCKETS = 10
+# Seconds before a table's statistics are read from the catalog again
+STATS_CACHE_TTL = 300
+
+# Columns with more distinct values make poor GROUP BY categories, and
+# mostly-null columns poor measures or categories
+MAX_GROUP_CARDINALITY = 50
+MAX_NULL_FRACTION = 0.5
+
+# _lock only guards _cached; catalog reads and writes happen outside it
+_lock = threading.Lock()
+_cached = {}  # (backend, table) -> ({column: state}, loaded at)
+# Serialize the read-merge-write of saves to the same table
+_save_locks = {}  # (backend, table) -> Lock
+
+_rng = np.random.default_rng()
+
+
+def _column_state(series):
+    non_null = series.dropna()
+    numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+    # Signed 64-bit hashes, so they fit in BSON as well as JSON
+    hashes = np.unique(pd.util.hash_pandas_object(non_null.astype(str), index=False).to_numpy().view(np.int64))
+    state = {
+        "count": int(len(series)),
+        "nulls": int(len(series) - len(non_null)),
+        "numeric": bool(numeric),
+        "hashes": hashes[:DISTINCT_CAP].tolist(),
+        "distinct_overflow": bool(len(hashes) > DISTINCT_CAP),
+        "min": None,
+        "max": None,
+        "sample": [],
+        "keys": [],
+    }
+    if numeric and len(non_null):
+        values = non_null.to_numpy(dtype=float)
+        state["min"] = float(values.min())
+        state["max"] = float(values.max())
+        keys = _rng.random(len(values))
+        keep = np.argsort(keys)[:SAMPLE_SIZE]
+        state["sample"] = values[keep].tolist()
+        state["keys"] = keys[keep].tolist()
+    return state
+
+
+def _merge_state(current, new):
+    if current is None:
+        return new
+    merged = {
+        "count": current["count"] + new["count"],
+        "nulls": current["nulls"] + new["nulls"],
+        # A column that held text in any chunk is not numeric
+        "numeric": current["numeric"] and new["numeric"],
+        "min": None,
+        "max": None,
+        "sample": [],
+        "keys": [],
+    }
+    hashes = np.union1d(np.array(current["hashes"], dtype=np.int64), np.array(new["hashes"], dtype=np.int64))
+    merged["hashes"] = hashes[:DISTINCT_CAP].tolist()
+    merged["distinct_overflow"] = current["distinct_overflow"] or new["distinct_overflow"] or len(hashes) > DISTINCT_CAP
+    if merged["numeric"]:
+        bounds = [value for value in (current["min"], new["min"], current["max"], new["max"]) if value is not None]
+        if bounds:
+            merged["min"], merged["max"] = min(bounds), max(bounds)
+        # Bottom-k sampling: keeping the SAMPLE_SIZE smallest random keys of
+        # both samples gives a uniform sample of all rows seen
+        keys = np.array(current["keys"] + new["keys"])
+        sample = np.array(current["sample"] + new["sample"])
+        keep = np.argsort(keys)[:SAMPLE_SIZE]
+        merged["sample"] = sample[keep].tolist()
+        merged["keys"] = keys[keep].tolist()
+    return merged
+
+
+def collect_stats(df, collected=None):
+    """
+    Add the statistics of a DataFrame chunk to collected.
+
+    Args:
+        df (DataFrame): One chunk of a file.
+        collected (dict, optional): Result of earlier calls for the same file.
+
+    Returns:
+        dict: Column name -> mergeable column state.
+    """
+    if collected is None:
+        collected = {}
+    for column in df.columns:
+        collected[column] = _merge_state(collected.get(column), _column_state(df[column]))
+    return collected
+
+
+def summarize(state):
+    """
+    Turn a column state into its public statistics.
+
+    Returns:
+        dict: {"rows", "null_fraction", "distinct", "distinct_exact", "numeric", "min", "max", "histogram"};
+        histogram holds HISTOGRAM_BUCKETS + 1 equi-depth bucket bounds (numeric columns only).
+    """
+    histogram = None
+    if state["numeric"] and state["sample"]:
+        histogram = np.quantile(state["sample"], np.linspace(0, 1, HISTOGRAM_BUCKETS + 1)).tolist()
+    return {
+        "rows": state["count"],
+        "null_fraction": state["nulls"] / state["count"] if state["count"] else 1.0,
+        "distinct": len(state["hashes"]),
+        "distinct_exact": not state["distinct_overflow"],
+        "numeric": state["numeric"],
+        "min": state["min"],
+        "max": state["max"],
+        "histogram": histogram,
+    }
+
+
+def _read_sql_states(table):
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SHOW TABLES LIKE '{STATS_TABLE}'")
+        if not cursor.fetchall():
+            return {}
+        cursor.execute(f"SELECT column_name, state FROM {STATS_TABLE} WHERE table_name = %s", (table,))
+        return {column: json.loads(state) for column, state in cursor.fetchall()}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _write_sql_states(table, states, replace):
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATS_TABLE} ("
+            f"table_name VARCHAR(64) NOT NULL, column_name VARCHAR(64) NOT NULL, state LONGTEXT NOT NULL, "
+            f"PRIMARY KEY (table_name, column_name))"
+        )
+        connection.start_transaction()
+        if replace:
+            cursor.execute(f"DELETE FROM {STATS_TABLE} WHERE table_name = %s", (table,))
+        cursor.executemany(
+            f"REPLACE INTO {STATS_TABLE} (table_name, column_name, state) VALUES (%s, %s, %s)",
+            [(table, column, json.dumps(state)) for column, state in states.items()]
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _read_mongo_states(table, db_name):
+    documents = get_mongo_client()[db_name][STATS_TABLE].find({"table": table})
+    return {doc["column"]: doc["state"] for doc in documents}
+
+
+def _write_mongo_states(table, states, replace, db_name):
+    collection = get_mongo_client()[db_name][STATS_TABLE]
+    if replace:
+        collection.delete_many({"table": table})
+    for column, state in states.items():
+        collection.replace_one(
+            {"_id": f"{table}.{column}"},
+            {"table": table, "column": column, "state": state},
+            upsert=True
+        )
+
+
+def _load_states(backend, table, db_name=DATABASE_NAME, refresh=False):
+    key = (backend, table)
+    with _lock:
+        states, loaded_at = _cached.get(key, (None, 0.0))
+    started = time.monotonic()
+    if states is not None and not refresh and started - loaded_at < STATS_CACHE_TTL:
+        return states
+    try:
+        read = _read_sql_states(table) if backend == "sql" else _read_mongo_states(table, db_name)
+    except Exception:
+        logger.exception("Could not read column statistics of %s", table)
+        return states or {}
+    with _lock:
+        # A save that finished while we were reading stored newer statistics; keep those
+        current, current_at = _cached.get(key, (None, 0.0))
+        if current is not None and current_at > started:
+            return current
+        _cached[key] = (read, time.monotonic())
+    return read
+
+
+def save_stats(backend, table, collected, replace=False, db_name=DATABASE_NAME):
+    """
+    Merge statistics collected from newly loaded rows into the catalog and persist them.
+
+    Args:
+        backend (str): "sql" or "mongo".
+        table (str): Table or collection the rows were loaded into.
+        collected (dict): From collect_stats().
+        replace (bool): Drop the table's previous statistics first (it was just created).
+    """
+    table = table.lower()
+    key = (backend, table)
+    with _lock:
+        save_lock = _save_locks.setdefault(key, threading.Lock())
+    with save_lock:
+        # Appends merge into the statistics as saved, which another process may have extended
+        states = {} if replace else dict(_load_states(backend, table, db_name, refresh=True))
+        for column, state in collected.items():
+            states[column] = _merge_state(states.get(column), state)
+        try:
+            if backend == "sql":
+                _write_sql_states(table, states, replace)
+            else:
+                _write_mongo_states(table, states, replace, db_name)
+        except Exception:
+            logger.exception("Could not save column statistics of %s", table)
+        with _lock:
+            _cached[key] = (states, time.monotonic())
+
+
+def get_table_stats(backend, table, db_name=DATABASE_NAME):
+    """
+    Return {column: statistics} of a table or collection (empty if none were collected).
+    """
+    states = _load_states(backend, table.lower(), db_name)
+    return {column: summarize(state) for column, state in states.items()}
+
+
+def get_table_sketches(backend, table, db_name=DATABASE_NAME):
+    """
+    Return {column: (sorted distinct-value hashes, complete)} of a table.
+
+    The hashes are the smallest DISTINCT_CAP of the column (all of them when
+    complete), i.e. a bottom-k sketch: comparing the sketches of two columns
+    estimates how much their values overlap without reading any rows.
+    """
+    states = _load_states(backend, table.lower(), db_name)
+    return {column: (list(state["hashes"]), not state["distinct_overflow"]) for column, state in states.items()}
+
+
+def table_rows(table_stats):
+    """
+    Row count recorded in a table's statistics (0 if there are none).
+    """
+    return max((stats["rows"] for stats in table_stats.values()), default=0)
+
+
+def is_measure(stats):
+    """
+    True for numeric columns worth summing or averaging.
+    """
+    return bool(stats) and stats["numeric"] and stats["null_fraction"] <= MAX_NULL_FRACTION
+
+
+def is_category(stats):
+    """
+    True for columns cheap and meaningful to GROUP BY: few distinct values, mostly filled in.
+    """
+    return (bool(stats) and stats["distinct_exact"] and 1 < stats["distinct"] <= MAX_GROUP_CARDINALITY
+            and stats["null_fraction"] <= MAX_NULL_FRACTION)
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+from pymongo import MongoClient
+from sqlalchemy import create_engine
+
+# Connection details shared by every module. Each one can be overridden with an
+# environment variable so the same code runs against other local servers.
+MYSQL_USER = os.environ.get("CHATDB_MYSQL_USER", "root")
+MYSQL_PASSWORD = os.environ.get("CHATDB_MYSQL_PASSWORD", "")
+MYSQL_HOST = os.environ.get("CHATDB_MYSQL_HOST", "localhost")
+DATABASE_NAME = os.environ.get("CHATDB_DATABASE", "chatDB")
+MONGO_URI = os.environ.get("CHATDB_MONGO_URI", "mongodb://localhost:27017/")
+
+# Upper bound on open MySQL connections per database for this process
+MYSQL_POOL_SIZE = int(os.environ.get("CHATDB_MYSQL_POOL_SIZE", "8"))
+# Connections of the separate pool user queries run on (one per query worker)
+MYSQL_QUERY_POOL_SIZE = int(os.environ.get("CHATDB_MYSQL_QUERY_POOL_SIZE", "4"))
+# How long a caller waits for a free pooled connection before giving up (seconds)
+MYSQL_POOL_TIMEOUT = 30
+
+_lock = threading.Lock()
+_mysql_pools = {}
+_sql_engines = {}
+_mongo_clients = {}
+
+
+def _get_mysql_pool(database, queries=False):
+    """
+    Return a process-wide MySQL pool for a database, creating it on first use.
+
+    Args:
+        database (str): Database name, or None for a server-level pool (e.g. for CREATE DATABASE).
+        queries (bool): The pool user queries run on (see get_mysql_query_connection()).
+
+    Returns:
+        MySQLConnectionPool: The shared pool.
+    """
+    key = (database, queries)
+    pool = _mysql_pools.get(key)
+    if pool is not None:
+        return pool
+    with _lock:
+        pool = _mysql_pools.get(key)
+        if pool is None:
+            config = {
+                "host": MYSQL_HOST,
+                "user": MYSQL_USER,
+                "password": MYSQL_PASSWORD,
+            }
+            if database:
+                config["database"] = database
+            if queries:
+                # Every statement commits on its own, so no transaction or read snapshot
+                # outlives a checkout even though the session is not reset
+                config["autocommit"] = True
+            # The pool opens its connections eagerly, so the server-level pool
+            # (only used for CREATE DATABASE) is kept to a single connection
+            size = MYSQL_QUERY_POOL_SIZE if queries else MYSQL_POOL_SIZE if database else 1
+            pool = pooling.MySQLConnectionPool(
+                pool_name=f"chatdb_{database or 'server'}{'_queries' if queries else ''}",
+                pool_size=size,
+                # Resetting the session on check-in would deallocate the prepared statements
+                # of backend/statement_cache.py; the query pool clears sessions itself instead
+                pool_reset_session=not queries,
+                **config
+            )
+            _mysql_pools[key] = pool
+    return pool
+
+
+def _checkout(pool, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return pool.get_connection()
+        except PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+
+def get_mysql_connection(database=DATABASE_NAME, timeout=MYSQL_POOL_TIMEOUT):
+    """
+    Check out a connection from the shared MySQL pool.
+
+    Calling close() on the returned connection hands it back to the pool
+    (which resets its session) instead of closing the socket. When every pooled
+    connection is in use the call waits for one to be returned rather than opening a new one.
+
+    Args:
+        database (str): Database to connect to. None gives a server-level connection.
+        timeout (float): Seconds to wait for a free connection.
+
+    Returns:
+        PooledMySQLConnection: A pooled connection.
+    """
+    return _checkout(_get_mysql_pool(database), timeout)
+
+
+def get_mysql_query_connection(database=DATABASE_NAME, timeout=MYSQL_POOL_TIMEOUT):
+    """
+    Check out a connection for running user queries.
+
+    The query pool keeps each connection's session between checkouts, so the
+    statements prepared on it stay prepared (see backend/statement_cache.py).
+    Whoever runs a statement that may leave session state behind (anything but
+    a prepared SELECT) clears it with statement_cache.reset_session() before
+    handing the connection back.
+
+    Returns:
+        PooledMySQLConnection: A pooled connection in autocommit mode.
+    """
+    return _checkout(_get_mysql_pool(database, queries=True), timeout)
+
+
+def get_mysql_infile_connection(database=DATABASE_NAME):
+    """
+    Open an unpooled connection that may run LOAD DATA LOCAL INFILE, for the "infile"
+    bulk-load strategy only (the server must also enable local_infile). Close it when done.
+    """
+    return mysql.connector.connect(
+        host=MYSQL_HOST,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWORD,
+        database=database,
+        allow_local_infile=True,
+    )
+
+
+def get_sql_engine(database=DATABASE_NAME):
+    """
+    Return the shared SQLAlchemy engine for a database (it keeps its own bounded pool).
+    """
+    engine = _sql_engines.get(database)
+    if engine is not None:
+        return engine
+    with _lock:
+        engine = _sql_engines.get(database)
+        if engine is None:
+            engine = create_engine(
+                f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{database}",
+                pool_size=MYSQL_POOL_SIZE,
+                max_overflow=0,
+                pool_pre_ping=True,
+            )
+            _sql_engines[database] = engine
+    return engine
+
+
+def get_mongo_client(uri=MONGO_URI):
+    """
+    Return the single MongoClient for a URI. MongoClient is thread-safe and
+    pools its own sockets, so one instance is shared by the whole process.
+    """
+    client = _mongo_clients.get(uri)
+    if client is not None:
+        return client
+    with _lock:
+        client = _mongo_clients.get(uri)
+        if client is None:
+            client = MongoClient(uri)
+            _mongo_clients[uri] = client
+    return client
+
+
+def get_mongo_db(db_name=DATABASE_NAME, uri=MONGO_URI):
+    return get_mongo_client(uri)[db_name]
+
+
+def close_all():
+    """
+    Close every pooled connection and client. Only needed at interpreter shutdown or in scripts.
+    """
+    with _lock:
+        for engine in _sql_engines.values():
+            engine.dispose()
+        _sql_engines.clear()
+        for client in _mongo_clients.values():
+            client.close()
+        _mongo_clients.clear()
+        for pool in _mysql_pools.values():
+            try:
+                pool._remove_connections()
+            except Exception:
+                pass
+        _mysql_pools.clear()
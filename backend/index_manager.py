@@ -0,0 +1,271 @@
+import argparse
+import logging
+import re
+
+from pymongo import ASCENDING
+
+from backend.connections import DATABASE_NAME, get_mongo_client, get_mysql_connection
+from backend.column_stats import get_table_stats, is_category
+from backend.schema_catalog import INTERNAL_TABLE_PREFIX, LOWERCASE_SUFFIX, invalidate_schema, list_tables
+
+logger = logging.getLogger("chatdb.index_manager")
+
+# Indexes on the key columns the joins use (Incident_ID, incidentid, ...) and
+# case-insensitive indexes on the category columns questions filter on
+# (gender, injury, ...), so "count shooters that are male" is an index lookup.
+# Ingestion creates them after loading; the command line lists and rebuilds them.
+#
+# Case-insensitive indexes: MongoDB indexes with the CASE_INSENSITIVE collation
+# (queries must pass the same collation); MySQL columns with a _ci collation
+# (the default) get a plain index, other text columns an indexed invisible
+# generated column <column>__lc = LOWER(<column>).
+#
+# Usage (from the repository root):
+#     python -m backend.index_manager list [--backend mysql mongodb] [--table shooter]
+#     python -m backend.index_manager rebuild [--backend mysql mongodb] [--table shooter]
+
+BACKENDS = ("mysql", "mongodb")
+# Every index this module creates is named idx_<column>, so it can tell its own indexes apart
+INDEX_PREFIX = "idx_"
+# Case-insensitive indexes are named idx_ci_<column>
+CASE_INSENSITIVE_PREFIX = INDEX_PREFIX + "ci_"
+# Index prefix (in characters) for TEXT key columns, which MySQL cannot index whole
+KEY_PREFIX_LENGTH = 32
+# Collation that compares strings ignoring case (strength 2 also keeps accents significant)
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+_KEY_COLUMN = re.compile(r"id$", re.IGNORECASE)
+
+
+def key_columns(columns, table_stats=None):
+    """
+    Pick the join key columns of a table: names ending in "id" (Incident_ID, incidentid),
+    minus low-cardinality flags (e.g. "Valid") when statistics are available.
+    """
+    keys = []
+    for column in columns:
+        if column == "_id" or not _KEY_COLUMN.search(column):
+            continue
+        if table_stats and is_category(table_stats.get(column)):
+            continue
+        keys.append(column)
+    return keys
+
+
+def category_columns(columns, table_stats):
+    """
+    Pick the text columns questions filter on by value (gender, injury, State):
+    non-numeric columns with few distinct values according to the statistics.
+    """
+    return [
+        column for column in columns
+        if column != "_id" and is_category(table_stats.get(column)) and not table_stats[column]["numeric"]
+    ]
+
+
+def index_name(column, case_insensitive=False):
+    prefix = CASE_INSENSITIVE_PREFIX if case_insensitive else INDEX_PREFIX
+    return f"{prefix}{column.lower()}"[:64]
+
+
+def list_sql_indexes(table=None):
+    """
+    Return the indexes of the current database (or one table).
+
+    Returns:
+        list: {"table", "index", "column", "prefix", "managed"} dicts.
+    """
+    query = (
+        "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE()"
+    )
+    params = ()
+    if table:
+        query += " AND TABLE_NAME = %s"
+        params = (table,)
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query + " ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX", params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    return [
+        {"table": table_name, "index": name, "column": column, "prefix": prefix, "managed": name.startswith(INDEX_PREFIX)}
+        for table_name, name, column, prefix in rows
+    ]
+
+
+def _sql_columns(table):
+    # Read directly: the schema catalog hides the lowercase copies
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, COLLATION_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,)
+        )
+        return {column: (data_type, collation) for column, data_type, collation in cursor.fetchall()}
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def ensure_sql_indexes(table):
+    """
+    Create the missing key-column and case-insensitive category-column indexes of a MySQL table.
+
+    Returns:
+        list: Names of the indexes created.
+    """
+    columns = _sql_columns(table)
+    indexed = {index["column"] for index in list_sql_indexes(table)}
+    table_stats = get_table_stats("sql", table)
+
+    def prefix(column):
+        data_type = columns[column][0]
+        return f"({KEY_PREFIX_LENGTH})" if data_type.endswith("text") or data_type.endswith("blob") else ""
+
+    created = []
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        for column in key_columns(list(columns), table_stats):
+            if column in indexed:
+                continue
+            cursor.execute(f"CREATE INDEX {index_name(column)} ON {table} (`{column}`{prefix(column)})")
+            created.append(index_name(column))
+        for column in category_columns(list(columns), table_stats):
+            collation = columns[column][1]
+            if collation is None:
+                continue  # Not a text column
+            target = column
+            if collation.endswith("_ci"):
+                if column in indexed:
+                    continue
+            else:
+                # Case-sensitive column: index LOWER(column) instead; translations compare against it
+                target = column + LOWERCASE_SUFFIX
+                if target not in columns:
+                    cursor.execute(
+                        f"ALTER TABLE {table} ADD COLUMN `{target}` VARCHAR(255) "
+                        f"AS (LOWER(`{column}`)) VIRTUAL INVISIBLE"
+                    )
+                    invalidate_schema()
+                if target in indexed:
+                    continue
+            name = index_name(column, case_insensitive=True)
+            cursor.execute(f"CREATE INDEX {name} ON {table} (`{target}`{prefix(column) if target == column else ''})")
+            created.append(name)
+    finally:
+        cursor.close()
+        connection.close()
+    if created:
+        logger.info("Created indexes on %s: %s", table, ", ".join(created))
+    return created
+
+
+def rebuild_sql_indexes(table=None):
+    """
+    Drop and recreate the managed indexes of one table, or of every table.
+    """
+    connection = get_mysql_connection()
+    try:
+        tables = [table] if table else [name for name in list_tables(connection) if not name.startswith(INTERNAL_TABLE_PREFIX)]
+    finally:
+        connection.close()
+    created = []
+    for name in tables:
+        managed = {index["index"] for index in list_sql_indexes(name) if index["managed"]}
+        connection = get_mysql_connection()
+        cursor = connection.cursor()
+        try:
+            for index in managed:
+                cursor.execute(f"DROP INDEX {index} ON {name}")
+        finally:
+            cursor.close()
+            connection.close()
+        created += ensure_sql_indexes(name)
+    return created
+
+
+def list_mongo_indexes(collection_name=None, db_name=DATABASE_NAME):
+    db = get_mongo_client()[db_name]
+    names = [collection_name] if collection_name else db.list_collection_names()
+    indexes = []
+    for name in names:
+        if name.startswith(INTERNAL_TABLE_PREFIX):
+            continue
+        for index, info in db[name].index_information().items():
+            indexes.append({
+                "table": name,
+                "index": index,
+                "column": ", ".join(field for field, _ in info["key"]),
+                "prefix": None,
+                "managed": index.startswith(INDEX_PREFIX),
+            })
+    return indexes
+
+
+def ensure_mongo_indexes(collection_name, fields=None, db_name=DATABASE_NAME):
+    """
+    Create single-field indexes on the key fields and case-insensitive ones on the category
+    fields of a collection (create_index is a no-op for existing ones).
+
+    Args:
+        fields (list, optional): Field names; read from one document when not given.
+
+    Returns:
+        list: Names of the indexes ensured.
+    """
+    collection = get_mongo_client()[db_name][collection_name]
+    if fields is None:
+        document = collection.find_one() or {}
+        fields = list(document)
+    table_stats = get_table_stats("mongo", collection_name, db_name)
+    created = []
+    for field in key_columns(fields, table_stats):
+        created.append(collection.create_index([(field, ASCENDING)], name=index_name(field)))
+    for field in category_columns(fields, table_stats):
+        created.append(collection.create_index(
+            [(field, ASCENDING)], name=index_name(field, case_insensitive=True), collation=CASE_INSENSITIVE
+        ))
+    return created
+
+
+def rebuild_mongo_indexes(collection_name=None, db_name=DATABASE_NAME):
+    db = get_mongo_client()[db_name]
+    names = [collection_name] if collection_name else [
+        name for name in db.list_collection_names() if not name.startswith(INTERNAL_TABLE_PREFIX)
+    ]
+    created = []
+    for name in names:
+        for index in db[name].index_information():
+            if index.startswith(INDEX_PREFIX):
+                db[name].drop_index(index)
+        created += ensure_mongo_indexes(name, db_name=db_name)
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or rebuild the key-column indexes ChatDB manages.")
+    parser.add_argument("command", choices=["list", "rebuild"])
+    parser.add_argument("--backend", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--table", help="Only this table/collection")
+    args = parser.parse_args()
+
+    for backend in args.backend:
+        if args.command == "rebuild":
+            rebuilt = rebuild_sql_indexes(args.table) if backend == "mysql" else rebuild_mongo_indexes(args.table)
+            print(f"[{backend}] rebuilt {len(rebuilt)} indexes")
+        indexes = list_sql_indexes(args.table) if backend == "mysql" else list_mongo_indexes(args.table)
+        for index in indexes:
+            prefix = f"({index['prefix']})" if index["prefix"] else ""
+            managed = " [managed]" if index["managed"] else ""
+            print(f"[{backend}] {index['table']}.{index['index']} on {index['column']}{prefix}{managed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from backend.connections import DATABASE_NAME
+from backend.column_stats import get_table_sketches, get_table_stats
+from backend.index_manager import key_columns
+
+logger = logging.getLogger("chatdb.join_graph")
+
+# Which tables join on which columns (INCIDENT.Incident_ID <-> SHOOTER/VICTIM/
+# WEAPON.incidentid), discovered at ingest by comparing the values of key
+# columns, and used to plan joins without reading any metadata per query.
+#
+# The overlap of two columns is estimated from the bottom-k hash sketches the
+# column statistics already keep: on the hash range both sketches cover, the
+# fraction of one column's hashes found in the other estimates how many of its
+# values the other column contains. Only the best-overlapping column pair of
+# two tables becomes an edge, so joins never pick a key that merely looks right.
+#
+# Like the value dictionary, the graph is served from memory and kept on disk:
+# an update re-reads the file first, and readers pick up edges another process
+# discovered once JOIN_GRAPH_CACHE_TTL seconds have passed.
+# Tables are matched case-insensitively, but edges and join paths carry each
+# table's name as it was loaded, since MySQL table names can be case-sensitive.
+
+JOIN_GRAPH_PATH = os.path.join(".chatdb", "join_graph.json")
+# Share of one column's values that must appear in the other for the two to join
+MIN_CONTAINMENT = 0.8
+# Fewer shared-range values than this are too few to judge an overlap
+MIN_SAMPLE = 5
+# Seconds before the graph is re-read from disk
+JOIN_GRAPH_CACHE_TTL = 300
+
+_lock = threading.Lock()
+_version = 0
+# {"sql"/"mongo": {"keys": {table: {column: {"hashes": [...], "complete": bool}}}, "names": {table: name as loaded},
+#                  "edges": [edge, ...]}}, tables keyed in lowercase
+_graph = None
+_loaded_at = 0.0
+
+
+def _load(refresh=False):
+    # Callers hold _lock
+    global _graph, _loaded_at, _version
+    now = time.monotonic()
+    if _graph is None or refresh or now - _loaded_at >= JOIN_GRAPH_CACHE_TTL:
+        try:
+            with open(JOIN_GRAPH_PATH, "r") as file:
+                loaded = json.load(file)
+        except (OSError, ValueError):
+            loaded = _graph if _graph is not None else {}
+        if loaded != _graph:
+            _graph = loaded
+            _version += 1
+        _loaded_at = now
+    return _graph
+
+
+def _save():
+    os.makedirs(os.path.dirname(JOIN_GRAPH_PATH), exist_ok=True)
+    temp_path = JOIN_GRAPH_PATH + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(_graph, file)
+    os.replace(temp_path, JOIN_GRAPH_PATH)
+
+
+def get_join_graph_version():
+    """
+    Return a stamp that changes every time the graph changes, also when it is re-read with another process's edges.
+    """
+    with _lock:
+        _load()
+        return _version
+
+
+def _name(graph, table):
+    # The table's name as it was loaded (graphs saved before names were kept only have the lowercase key)
+    return graph.get("names", {}).get(table, table)
+
+
+def containment(left, right):
+    """
+    Estimate the share of the left column's distinct values that the right column also holds.
+
+    Args:
+        left, right (dict): {"hashes": sorted bottom-k hashes, "complete": bool}.
+
+    Returns:
+        float or None: None when the sketches share too few values to tell.
+    """
+    left_hashes = np.array(left["hashes"], dtype=np.int64)
+    right_hashes = np.array(right["hashes"], dtype=np.int64)
+    if not len(left_hashes) or not len(right_hashes):
+        return None
+    # Beyond the largest hash an incomplete sketch kept, absence means nothing
+    limit = min(
+        left_hashes[-1] if not left["complete"] else np.iinfo(np.int64).max,
+        right_hashes[-1] if not right["complete"] else np.iinfo(np.int64).max,
+    )
+    sample = left_hashes[left_hashes <= limit]
+    if len(sample) < MIN_SAMPLE:
+        return None
+    return float(np.isin(sample, right_hashes).mean())
+
+
+def _best_edge(table, columns, other, other_columns):
+    best = None
+    for column, sketch in columns.items():
+        for other_column, other_sketch in other_columns.items():
+            # A foreign key is contained in the key it references, in whichever direction that is
+            scores = [score for score in (containment(sketch, other_sketch), containment(other_sketch, sketch)) if score is not None]
+            if not scores or max(scores) < MIN_CONTAINMENT:
+                continue
+            if best is None or max(scores) > best["containment"]:
+                best = {
+                    "left": table, "left_column": column,
+                    "right": other, "right_column": other_column,
+                    "containment": max(scores),
+                }
+    return best
+
+
+def update_join_graph(backend, table, db_name=DATABASE_NAME):
+    """
+    Recompute the join edges of a table from its column statistics. Called after a load.
+
+    Args:
+        backend (str): "sql" or "mongo".
+        table (str): Table or collection that was loaded.
+
+    Returns:
+        list: The table's edges.
+    """
+    global _version
+    name, table = table, table.lower()
+    table_stats = get_table_stats(backend, table, db_name)
+    sketches = get_table_sketches(backend, table, db_name)
+    columns = {
+        column: {"hashes": sketches[column][0], "complete": sketches[column][1]}
+        for column in key_columns(list(sketches), table_stats)
+    }
+    with _lock:
+        # Tables another process loaded since the last read are joined against too
+        graph = _load(refresh=True).setdefault(backend, {"keys": {}, "edges": []})
+        graph["keys"][table] = columns
+        graph.setdefault("names", {})[table] = name
+        graph["edges"] = [edge for edge in graph["edges"] if table not in (edge["left"].lower(), edge["right"].lower())]
+        edges = []
+        for other, other_columns in graph["keys"].items():
+            if other == table:
+                continue
+            edge = _best_edge(name, columns, _name(graph, other), other_columns)
+            if edge:
+                edges.append(edge)
+        graph["edges"] += edges
+        _version += 1
+        try:
+            _save()
+        except OSError as e:
+            logger.warning("Could not save the join graph: %s", e)
+    if edges:
+        logger.info("Join keys of %s: %s", table, ", ".join(
+            f"{edge['left_column']} = {edge['right']}.{edge['right_column']}" for edge in edges
+        ))
+    return edges
+
+
+def has_join_table(backend, table):
+    with _lock:
+        return table.lower() in _load().get(backend, {}).get("keys", {})
+
+
+def join_table_name(backend, table):
+    """
+    Return a table's name as it was loaded (e.g. "incident" -> "INCIDENT"), or table itself when the graph does not know it.
+    """
+    with _lock:
+        graph = _load().get(backend, {})
+        return _name(graph, table.lower()) if table.lower() in graph.get("keys", {}) else table
+
+
+def join_edges(backend, table=None):
+    """
+    Return the edges of the graph (or of one table) as {"left", "left_column", "right", "right_column", "containment"} dicts.
+    """
+    with _lock:
+        edges = list(_load().get(backend, {}).get("edges", []))
+    if table is None:
+        return edges
+    table = table.lower()
+    return [edge for edge in edges if table in (edge["left"].lower(), edge["right"].lower())]
+
+
+def find_join_path(backend, source, target):
+    """
+    Plan the joins leading from one table to another: the path with the fewest
+    hops, preferring the best-overlapping keys.
+
+    Tables are matched case-insensitively; the hops name them as they were loaded.
+
+    Returns:
+        list or None: (table, column, next table, next column) hops, [] when source
+        and target are the same table, or None when they are not connected.
+    """
+    source, target = source.lower(), target.lower()
+    neighbours = {}
+    for edge in sorted(join_edges(backend), key=lambda edge: -edge["containment"]):
+        left, right = edge["left"], edge["right"]
+        neighbours.setdefault(left.lower(), []).append((left, edge["left_column"], right, edge["right_column"]))
+        neighbours.setdefault(right.lower(), []).append((right, edge["right_column"], left, edge["left_column"]))
+
+    previous = {source: None}
+    queue = deque([source])
+    while queue:
+        table = queue.popleft()
+        if table == target:
+            path = []
+            while previous[table] is not None:
+                hop = previous[table]
+                path.append(hop)
+                table = hop[0].lower()
+            return path[::-1]
+        for hop in neighbours.get(table, []):
+            other = hop[2].lower()
+            if other not in previous:
+                previous[other] = hop
+                queue.append(other)
+    return None
@@ -1,10 +1,23 @@
 import sys
 import json
+import logging
 import pandas as pd
-from pymongo import MongoClient
+from backend.connections import get_mongo_client
+from backend.result_cache import result_cache
+from backend.value_dictionary import collect_values, update_values
+from backend.column_stats import collect_stats, save_stats
+from backend.index_manager import ensure_mongo_indexes
+from backend.join_graph import update_join_graph
+from backend.backend_functions import infer_column_type, parse_dates, parse_times
 import os
 import re
 
+logger = logging.getLogger("chatdb.nosql_backend")
+
+# CSV rows read per chunk and documents per insert_many call for streaming imports
+CHUNK_SIZE = 50000
+INSERT_BATCH_SIZE = 1000
+
 def csv_to_json(csv_file_path, json_file_path=None):
     try:
         df = pd.read_csv(csv_file_path, encoding="utf-8")
@@ -15,23 +28,134 @@ def csv_to_json(csv_file_path, json_file_path=None):
         if json_file_path:
             with open(json_file_path, "w") as outfile:
                 json.dump(json_data, outfile, indent=4)
-            print(f"JSON file saved at: {json_file_path}")
+            logger.info("JSON file saved at: %s", json_file_path)
 
         return json_data
     except pd.errors.ParserError as e:
-        print(f"Parsing error during CSV to JSON conversion: {e}")
+        logger.warning("Parsing error during CSV to JSON conversion: %s", e)
         return None
     except json.JSONDecodeError as e:
-        print(f"JSON encoding error: {e}")
+        logger.warning("JSON encoding error: %s", e)
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    except Exception:
+        logger.exception("An unexpected error occurred converting %s to JSON", csv_file_path)
         return None
 
+def typed_chunk(df, column_types=None):
+    """
+    Parse the date and time columns of a chunk: dates become datetimes (stored as
+    BSON dates), times zero-padded 'HH:MM:SS' strings, so both compare in order.
+
+    Args:
+        df (DataFrame): One chunk of a file.
+        column_types (dict, optional): Column name -> type decided on earlier chunks of
+            the same file. Columns it has no type for yet are inferred from this chunk
+            and added to it, so every chunk of a file is typed the same way.
+
+    Returns:
+        DataFrame: The typed copy of the chunk; values a DATE or TIME column cannot
+        parse are kept as they were read rather than dropped.
+    """
+    if column_types is None:
+        column_types = {}
+    df = df.copy()
+    for column in df.columns:
+        if column_types.get(column) is None:
+            column_types[column] = infer_column_type(df[column])
+        column_type = column_types[column]
+        if column_type == "DATE":
+            parsed = parse_dates(df[column])
+            # list(): newer pandas returns a Series with a fresh index here, which would not align with the chunk's
+            dates = pd.Series(list(parsed.dt.to_pydatetime()), index=df.index, dtype=object)
+            df[column] = dates.where(parsed.notna(), df[column])
+        elif column_type == "TIME":
+            parsed = parse_times(df[column])
+            df[column] = parsed.astype(object).where(parsed.notna(), df[column])
+    return df
+
+def dataframe_documents(df):
+    """
+    Turn a DataFrame chunk into BSON-ready documents: empty rows dropped,
+    NaN turned into None and NumPy scalars into plain Python values.
+    """
+    df = df.dropna(how="all").astype(object)
+    return df.where(df.notna(), None).to_dict(orient="records")
+
+def import_csv_to_mongodb(csv_file_path, db_name, collection_name=None, batch_size=INSERT_BATCH_SIZE, chunksize=CHUNK_SIZE, json_file_path=None):
+    """
+    Stream a CSV file straight into a MongoDB collection.
+
+    The CSV is read in chunks, each chunk is converted to documents once and
+    written with unordered insert_many calls of batch_size documents. No JSON
+    file is produced unless json_file_path is given.
+
+    Args:
+        csv_file_path (str): Path to the CSV file.
+        db_name (str): Target database.
+        collection_name (str, optional): Target collection; defaults to the file name in lowercase.
+        batch_size (int): Documents per insert_many call.
+        chunksize (int): CSV rows read per chunk.
+        json_file_path (str, optional): Also write the documents to this JSON file.
+
+    Returns:
+        int: Number of documents inserted.
+
+    Raises:
+        Exception: Reading or inserting failed; documents inserted before the failure stay
+        in the collection (and in the value dictionary and statistics).
+    """
+    if collection_name is None:
+        collection_name = os.path.splitext(os.path.basename(csv_file_path))[0]
+    collection_name = collection_name.lower()
+    collection = get_mongo_client()[db_name][collection_name]
+
+    inserted = 0
+    values, column_stats = {}, {}
+    # Decided on the first chunk holding values of a column and kept for the rest of the file
+    column_types = {}
+    # A new collection starts with an empty value dictionary; appends extend it
+    replace_values = collection.estimated_document_count() == 0
+    json_file = open(json_file_path, "w") if json_file_path else None
+    try:
+        if json_file:
+            json_file.write("[")
+        for chunk in pd.read_csv(csv_file_path, encoding="utf-8", chunksize=chunksize):
+            # The collectors see the values as stored, not the CSV text
+            typed = typed_chunk(chunk, column_types)
+            documents = dataframe_documents(typed)
+            if json_file and documents:
+                # Written before insert_many, which adds an _id to every document
+                json_file.write(("," if inserted else "") + ",".join(json.dumps(doc, default=str) for doc in documents))
+            for start in range(0, len(documents), batch_size):
+                batch = documents[start:start + batch_size]
+                collection.insert_many(batch, ordered=False)
+                inserted += len(batch)
+            collect_values(typed, values)
+            collect_stats(typed, column_stats)
+        if json_file:
+            json_file.write("]")
+            logger.info("JSON file saved at: %s", json_file_path)
+    finally:
+        if json_file:
+            json_file.close()
+        # Cached results read from this collection are stale now
+        result_cache.invalidate("mongo", collection_name)
+        if inserted:
+            update_values("mongo", collection_name, values, replace=replace_values)
+            save_stats("mongo", collection_name, column_stats, replace=replace_values, db_name=db_name)
+            update_join_graph("mongo", collection_name, db_name=db_name)
+            try:
+                ensure_mongo_indexes(collection_name, fields=list(column_stats), db_name=db_name)
+            except Exception:
+                logger.exception("Could not index %s", collection_name)
+
+    logger.info("Data from %s successfully imported into %s.%s (%d documents)", csv_file_path, db_name, collection_name, inserted)
+    return inserted
+
 def import_multiple_json_to_mongodb(json_files, db_name):
     try:
-        # Connect to MongoDB
-        client = MongoClient('mongodb://localhost:27017/')
+        # Shared MongoDB client
+        client = get_mongo_client()
         db = client[db_name]
 
         for json_file in json_files:
@@ -45,7 +169,7 @@ def import_multiple_json_to_mongodb(json_files, db_name):
                     if isinstance(data, dict): 
                         data = [data]
                 except json.JSONDecodeError as e:
-                    print(f"Error decoding JSON in {json_file}: {e}")
+                    logger.warning("Error decoding JSON in %s: %s", json_file, e)
                     continue
 
             # Insert data into the collection
@@ -54,27 +178,20 @@ def import_multiple_json_to_mongodb(json_files, db_name):
                     collection.insert_many(data) 
                 else:
                     collection.insert_one(data) 
+                result_cache.invalidate("mongo", collection_name)
+                # Index the join keys (incidentid, ...) so $lookup does not scan the collection per document
+                ensure_mongo_indexes(collection_name, fields=list(data[0]) if isinstance(data, list) else list(data), db_name=db_name)
 
-            print(f"Data from {json_file} successfully imported into {db_name}.{collection_name}")
+            logger.info("Data from %s successfully imported into %s.%s", json_file, db_name, collection_name)
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    except Exception:
+        logger.exception("Could not import the JSON files into %s", db_name)
 
 if __name__ == "__main__":
-    csv_file_paths = ["data/INCIDENT.csv", "data/SHOOTER.csv", "data/VICTIM.csv"]
-    json_file_paths = []
-    for file in csv_file_paths:
-        match = re.search(r'/([A-Z]+)\.csv$', file)
-        if match:
-            result = match.group(1)
-        json_file_path = f"data/{result}.json"
-        json_file = csv_to_json(file, json_file_path)
-        if json_file is not None:
-            json_file_paths.append(json_file_path)
-
-    db_name='chatDB'
-    json_files = json_file_paths
-    import_multiple_json_to_mongodb(json_files, db_name)
+    # Load every CSV in data/ in parallel (see backend/bootstrap.py).
+    # Collection name is the file name in lowercase (e.g. data/INCIDENT.csv -> incident)
+    from backend.bootstrap import bootstrap, discover_manifest
+    bootstrap(discover_manifest(), targets=["mongodb"])
 
     # Old code for running on command line
     # if len(sys.argv) < 3:
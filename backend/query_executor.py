@@ -0,0 +1,254 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from backend.connections import get_mysql_connection, get_mysql_query_connection, get_mongo_client
+
+logger = logging.getLogger("chatdb.query_executor")
+
+# Runs user queries on worker threads with a per-query deadline, so a runaway
+# query cannot block the Streamlit script thread. The deadline is enforced on
+# the server (MySQL MAX_EXECUTION_TIME hint, MongoDB maxTimeMS) and, as a
+# fallback, by KILL QUERY / killOp once the caller stops waiting. Submitting a
+# new query for a session cancels the one it still has running.
+
+QUERY_TIMEOUT = 30  # seconds
+QUERY_WORKERS = 4
+# Extra time the caller waits for the server to enforce the deadline itself
+TIMEOUT_GRACE = 2
+
+# MySQL errors raised for an interrupted statement (ER_QUERY_TIMEOUT, ER_QUERY_INTERRUPTED)
+MYSQL_INTERRUPTED_ERRORS = {3024, 1317}
+
+_SELECT_KEYWORD = re.compile(r"^\s*select\b", re.IGNORECASE)
+
+_local = threading.local()
+
+
+class QueryTimeout(Exception):
+    """
+    A query ran past its deadline. partial holds whatever was read before it stopped (or None).
+    """
+    def __init__(self, message, partial=None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class QueryJob:
+    def __init__(self, timeout=QUERY_TIMEOUT):
+        self.id = uuid.uuid4().hex
+        self.comment = f"chatdb:{self.id}"  # Tags MongoDB operations so they can be found with $currentOp
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.cancelled = False
+        self.future = None
+        self._mysql_connection_id = None
+        self._uses_mongo = False
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0.001)
+
+    def attach_mysql(self, connection):
+        with self._lock:
+            self._mysql_connection_id = connection.connection_id
+
+    def detach_mysql(self):
+        with self._lock:
+            self._mysql_connection_id = None
+
+    def cancel(self):
+        """
+        Stop the job: drop it if it has not started, otherwise interrupt its running statement on the server.
+        """
+        with self._lock:
+            self.cancelled = True
+            connection_id = self._mysql_connection_id
+            uses_mongo = self._uses_mongo
+        if self.future is not None and self.future.cancel():
+            return
+        if connection_id is not None:
+            _kill_mysql_query(connection_id)
+        if uses_mongo:
+            _kill_mongo_ops(self.comment)
+
+    def result(self):
+        """
+        Wait for the job's result.
+
+        Raises:
+            QueryTimeout: The deadline passed (the running statement is killed).
+            QueryCancelled: The job was cancelled, e.g. by a newer submission.
+        """
+        try:
+            return self.future.result(timeout=self.remaining() + TIMEOUT_GRACE)
+        except FutureTimeout:
+            self.cancel()
+            raise QueryTimeout(f"Query did not finish within {self.timeout:g}s and was stopped.")
+        except QueryTimeout:
+            raise
+        except Exception:
+            if self.cancelled:
+                raise QueryCancelled("Query was cancelled.")
+            raise
+
+
+def _kill_mysql_query(connection_id):
+    # KILL QUERY has to come from another connection; the victim connection stays usable
+    connection = get_mysql_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+    except Exception as e:
+        logger.warning("Could not kill query on connection %s: %s", connection_id, e)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _kill_mongo_ops(comment):
+    admin = get_mongo_client().admin
+    try:
+        for op in admin.aggregate([{"$currentOp": {}}, {"$match": {"command.comment": comment}}]):
+            admin.command("killOp", op=op["opid"])
+    except Exception as e:
+        logger.warning("Could not kill MongoDB operations tagged %s: %s", comment, e)
+
+
+def current_job():
+    """
+    The QueryJob running on this thread, or None outside the executor.
+    """
+    return getattr(_local, "job", None)
+
+
+def query_timeout():
+    """
+    Seconds left for the query running on this thread (QUERY_TIMEOUT outside the executor).
+    """
+    job = current_job()
+    return job.remaining() if job else QUERY_TIMEOUT
+
+
+def mongo_comment():
+    """
+    Comment to tag a MongoDB operation with, so cancelling the current job can kill it.
+    """
+    job = current_job()
+    if job is None:
+        return None
+    with job._lock:
+        job._uses_mongo = True
+    return job.comment
+
+
+@contextmanager
+def mongo_deadline():
+    """
+    Give every MongoDB operation in the block a maxTimeMS from the time left
+    before the current query's deadline, and report running out as QueryTimeout.
+    """
+    try:
+        with pymongo.timeout(query_timeout()):
+            yield
+    except PyMongoError as e:
+        if e.timeout:
+            raise QueryTimeout(f"Query was stopped at its deadline: {e}") from e
+        raise
+
+
+def with_max_execution_time(query, timeout=None):
+    """
+    Add a MAX_EXECUTION_TIME optimizer hint to a SELECT (MySQL ignores it for other statements).
+    """
+    match = _SELECT_KEYWORD.match(query)
+    if not match:
+        return query
+    milliseconds = max(int((query_timeout() if timeout is None else timeout) * 1000), 1)
+    return f"{match.group(0)} /*+ MAX_EXECUTION_TIME({milliseconds}) */{query[match.end():]}"
+
+
+def is_interrupted(error):
+    """
+    True for MySQL errors raised by MAX_EXECUTION_TIME or KILL QUERY.
+    """
+    return getattr(error, "errno", None) in MYSQL_INTERRUPTED_ERRORS
+
+
+def run_with_mysql(fn, *args, **kwargs):
+    """
+    Call fn(*args, connection, **kwargs) with a connection of the query pool the current job can KILL.
+    """
+    connection = get_mysql_query_connection()
+    job = current_job()
+    if job:
+        job.attach_mysql(connection)
+    try:
+        return fn(*args, connection, **kwargs)
+    finally:
+        if job:
+            job.detach_mysql()
+        connection.close()
+
+
+class QueryExecutor:
+    def __init__(self, max_workers=QUERY_WORKERS, timeout=QUERY_TIMEOUT):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chatdb-query")
+        self._jobs = {}  # session -> latest job
+        self._lock = threading.Lock()
+
+    def submit(self, session, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on a worker thread, cancelling the session's previous job.
+
+        Args:
+            session: Key of the caller (e.g. a Streamlit session id); None never cancels anything.
+            fn (callable): The query function.
+            timeout (float, optional): Deadline in seconds (defaults to QUERY_TIMEOUT).
+
+        Returns:
+            QueryJob: Call job.result() to wait for the result.
+        """
+        job = QueryJob(timeout or self.timeout)
+        if session is not None:
+            with self._lock:
+                previous = self._jobs.get(session)
+                self._jobs[session] = job
+            if previous is not None and not previous.future.done():
+                previous.cancel()
+        # The job runs in a copy of the caller's context, so it belongs to the caller's trace (see tracing.py)
+        context = contextvars.copy_context()
+        job.future = self._pool.submit(context.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def cancel(self, session):
+        with self._lock:
+            job = self._jobs.pop(session, None)
+        if job is not None:
+            job.cancel()
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        if job.cancelled:
+            raise QueryCancelled("Query was cancelled before it started.")
+        _local.job = job
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.job = None
+
+
+query_executor = QueryExecutor()
@@ -0,0 +1,217 @@
+import json
+import os
+
+from backend.column_stats import get_table_stats, table_rows
+from backend.statement_cache import as_bound
+
+# Looks at how the database plans to run a generated query before it runs:
+# MySQL EXPLAIN FORMAT=JSON, MongoDB explain with "queryPlanner" verbosity
+# (plans only, nothing is executed). The plan summary (estimated rows
+# examined, access type and indexes per table) is shown in the UI, and a query
+# estimated to examine more than PLAN_MAX_ROWS rows, or scanning a whole
+# table/collection of at least PLAN_FULL_SCAN_ROWS rows, is blocked or has to
+# be confirmed first, depending on PLAN_MODE.
+#
+# MongoDB's query planner gives no row estimates, so they come from the
+# column statistics: a collection scan reads the whole collection, an index
+# scan about rows / distinct values of the indexed field, and a $lookup one
+# such read of the joined collection per outer document.
+
+# "off" skips planning, "confirm" asks before running a query over the limits, "block" refuses it
+PLAN_MODE = os.environ.get("CHATDB_PLAN_MODE", "confirm")
+# Estimated rows examined above which a query is stopped
+PLAN_MAX_ROWS = int(os.environ.get("CHATDB_PLAN_MAX_ROWS", "1000000"))
+# Full scans of tables smaller than this are cheap enough to let through
+PLAN_FULL_SCAN_ROWS = int(os.environ.get("CHATDB_PLAN_FULL_SCAN_ROWS", "10000"))
+
+# MySQL access type of a full table scan
+SQL_FULL_SCAN = "ALL"
+MONGO_FULL_SCAN = "COLLSCAN"
+
+
+class QueryBlocked(Exception):
+    """
+    A query's plan is over the limits. plan holds the plan summary; confirmable
+    is True when the query may still run once the user confirms it.
+    """
+    def __init__(self, message, plan, confirmable=False):
+        super().__init__(message)
+        self.plan = plan
+        self.confirmable = confirmable
+
+
+def planning_enabled():
+    return PLAN_MODE != "off"
+
+
+def _number(value):
+    # EXPLAIN FORMAT=JSON writes costs as strings ("1.25")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _sql_access(node, access, outer=1.0):
+    # Collect the table entries of an EXPLAIN FORMAT=JSON tree. Tables of a nested
+    # loop are read once per row the join produced before them.
+    if isinstance(node, list):
+        for item in node:
+            _sql_access(item, access, outer)
+        return
+    if not isinstance(node, dict):
+        return
+    if "access_type" in node and "table_name" in node:
+        access.append({
+            "table": node["table_name"],
+            "access_type": node["access_type"],
+            "key": node.get("key"),
+            "rows": outer * _number(node.get("rows_examined_per_scan", 0)),
+            "full_scan": node["access_type"] == SQL_FULL_SCAN,
+        })
+    for key, value in node.items():
+        if key != "nested_loop":
+            _sql_access(value, access, outer)
+    loop_outer = outer
+    for item in node.get("nested_loop", []):
+        _sql_access(item, access, loop_outer)
+        produced = item.get("table", {}).get("rows_produced_per_join")
+        if produced is not None:
+            loop_outer = outer * _number(produced)
+
+
+def _summary(backend, access, cost=None):
+    return {
+        "backend": backend,
+        "estimated_rows": int(sum(entry["rows"] for entry in access)),
+        "cost": cost,
+        "access": access,
+        "full_scan": any(entry["full_scan"] for entry in access),
+    }
+
+
+def explain_sql(connection, query):
+    """
+    Plan a SELECT with EXPLAIN FORMAT=JSON, without running it.
+
+    Args:
+        connection: MySQL connection.
+        query (BoundQuery or str): The statement and its values.
+
+    Returns:
+        dict: {"backend", "estimated_rows", "cost", "access", "full_scan"}; access lists
+        {"table", "access_type", "key", "rows", "full_scan"} per table read.
+    """
+    query = as_bound(query)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN FORMAT=JSON " + query.sql, query.params or None)
+        explained = json.loads(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+    access = []
+    _sql_access(explained, access)
+    cost = explained.get("query_block", {}).get("cost_info", {}).get("query_cost")
+    return _summary("sql", access, _number(cost) if cost is not None else None)
+
+
+def _winning_plan(explained):
+    # Aggregations put the plan of their first stage under stages[0].$cursor
+    planner = explained.get("queryPlanner")
+    if planner is None:
+        for stage in explained.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    plan = (planner or {}).get("winningPlan", {})
+    # Slot-based engine plans wrap the classic plan tree
+    return plan.get("queryPlan", plan)
+
+
+def _plan_stages(plan):
+    stages = [plan]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages += _plan_stages(child)
+    return stages
+
+
+def _estimated_reads(collection_stats, field, rows):
+    # Rows an equality on an indexed field reads: rows / distinct values (all rows without statistics)
+    distinct = collection_stats.get(field, {}).get("distinct")
+    return rows / distinct if distinct else rows
+
+
+def explain_mongo(db, collection_name, command, lookups=()):
+    """
+    Plan a count or aggregate command with "queryPlanner" verbosity, without running it.
+
+    Args:
+        db: MongoDB database.
+        collection_name (str): Collection the command reads.
+        command (dict): The command, e.g. {"count": "shooter", "query": {...}}.
+        lookups (list, optional): $lookup specs of the pipeline; the joined collections are read per document.
+
+    Returns:
+        dict: Same shape as explain_sql(); rows come from the column statistics.
+    """
+    explained = db.command("explain", command, verbosity="queryPlanner")
+    collection_stats = get_table_stats("mongo", collection_name, db.name)
+    total = table_rows(collection_stats) or db[collection_name].estimated_document_count()
+
+    access = []
+    for stage in _plan_stages(_winning_plan(explained)):
+        if stage.get("stage") == MONGO_FULL_SCAN:
+            access.append({"table": collection_name, "access_type": MONGO_FULL_SCAN, "key": None, "rows": total, "full_scan": True})
+        elif "indexName" in stage:
+            field = next(iter(stage.get("keyPattern", {})), None)
+            access.append({
+                "table": collection_name, "access_type": stage["stage"], "key": stage["indexName"],
+                "rows": _estimated_reads(collection_stats, field, total), "full_scan": False,
+            })
+    outer = sum(entry["rows"] for entry in access) or total
+
+    for lookup in lookups:
+        joined = lookup["from"]
+        joined_stats = get_table_stats("mongo", joined, db.name)
+        joined_rows = table_rows(joined_stats) or db[joined].estimated_document_count()
+        # The $lookup can only use an index that starts with the foreign field
+        index = next((
+            name for name, info in db[joined].index_information().items()
+            if info["key"][0][0] == lookup["foreignField"]
+        ), None)
+        if index:
+            access.append({
+                "table": joined, "access_type": "IXSCAN", "key": index,
+                "rows": outer * _estimated_reads(joined_stats, lookup["foreignField"], joined_rows), "full_scan": False,
+            })
+        else:
+            access.append({"table": joined, "access_type": MONGO_FULL_SCAN, "key": None, "rows": outer * joined_rows, "full_scan": True})
+    return _summary("mongo", access)
+
+
+def _violations(plan):
+    reasons = []
+    if plan["estimated_rows"] > PLAN_MAX_ROWS:
+        reasons.append(f"it is estimated to examine {plan['estimated_rows']:,} rows (limit {PLAN_MAX_ROWS:,})")
+    for entry in plan["access"]:
+        if entry["full_scan"] and entry["rows"] >= PLAN_FULL_SCAN_ROWS:
+            reasons.append(f"it scans all of {entry['table']} ({int(entry['rows']):,} rows)")
+    return reasons
+
+
+def check_plan(plan, confirmed=False):
+    """
+    Stop a query whose plan is over the limits, unless PLAN_MODE is "confirm" and the user confirmed it.
+
+    Raises:
+        QueryBlocked: The query must not run (yet).
+    """
+    if PLAN_MODE == "off" or (confirmed and PLAN_MODE == "confirm"):
+        return
+    reasons = _violations(plan)
+    if not reasons:
+        return
+    if PLAN_MODE == "block":
+        raise QueryBlocked("Query was blocked because " + " and ".join(reasons) + ".", plan)
+    raise QueryBlocked("Query needs confirmation because " + " and ".join(reasons) + ".", plan, confirmable=True)
@@ -0,0 +1,145 @@
+import json
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Process-wide cache of query results, shared by every Streamlit session.
+# Entries are keyed by backend, database and the normalized query text (SQL)
+# or pipeline/filter (MongoDB), evicted least-recently-used once either bound
+# is reached, expire after a TTL, and are dropped when their tables are written.
+
+RESULT_CACHE_MAX_ENTRIES = 512
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL = 300  # seconds
+
+# Quoted literals and identifiers (kept as written) or a run of whitespace (collapsed)
+_SQL_TOKEN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`|\s+", re.DOTALL)
+_SQL_TABLES = re.compile(r"\b(?:from|join)\s+`?(\w+)`?", re.IGNORECASE)
+_LOOKUP_FROM = re.compile(r"[\"']from[\"']\s*:\s*[\"'](\w+)[\"']")
+
+_MISS = object()
+
+
+def normalize_sql(query):
+    """
+    Collapse the whitespace of a SQL statement outside its string literals, so
+    reformatted statements share a key while 'a  b' and 'a b' do not.
+    """
+    query = _SQL_TOKEN.sub(lambda match: " " if match.group().isspace() else match.group(), query)
+    return query.strip().rstrip(";").strip()
+
+
+def sql_tables(query):
+    """
+    Names of the tables a SQL statement reads (lowercase), used for invalidation.
+    """
+    return {name.lower() for name in _SQL_TABLES.findall(query)}
+
+
+def mongo_collections(collection, query):
+    """
+    The collection a MongoDB query runs on plus any collections it $lookup's.
+    """
+    text = query if isinstance(query, str) else json.dumps(query, default=str)
+    return {collection.lower(), *(name.lower() for name in _LOOKUP_FROM.findall(text))}
+
+
+def make_key(backend, database, query, *extra):
+    """
+    Build a cache key. Dict/list queries (MongoDB filters and pipelines) are
+    serialized with sorted keys so equal queries give equal keys.
+    """
+    if isinstance(query, str):
+        text = normalize_sql(query) if backend == "sql" else query.strip()
+    else:
+        text = json.dumps(query, sort_keys=True, default=str)
+    return (backend, database, text) + extra
+
+
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, tables)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISS)
+            if entry is not _MISS and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = _MISS
+            if entry is _MISS:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, tables):
+        """
+        Store a result.
+
+        Args:
+            key: Key from make_key().
+            value: The result (must be picklable).
+            tables (iterable): (backend, table) pairs the result was read from.
+        """
+        try:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl, frozenset(tables))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, backend, table):
+        """
+        Drop every entry that read from a table (SQL) or collection (MongoDB).
+        """
+        target = (backend, table.lower())
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if target in entry[3]]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1]
+
+
+result_cache = ResultCache()
@@ -0,0 +1,139 @@
+import threading
+import time
+
+from backend.tracing import span
+
+# Catalog of every table and column in the current database, loaded with a
+# single information_schema query and reused until the schema changes.
+
+# Safety net for tables created by another process (e.g. the ingest scripts);
+# changes made through implement() invalidate the catalog immediately.
+SCHEMA_CACHE_TTL = 300
+
+SCHEMA_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, DATA_TYPE, EXTRA
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+# Tables ChatDB creates for itself start with this prefix
+INTERNAL_TABLE_PREFIX = "_chatdb_"
+# Invisible generated columns holding LOWER(<column>) end with this suffix
+LOWERCASE_SUFFIX = "__lc"
+
+_lock = threading.Lock()
+_schema_version = 0
+_cached = {"version": None, "loaded_at": 0.0, "tables": None}
+
+
+def get_schema_version():
+    """
+    Return the current schema-version stamp. It changes every time the catalog is invalidated.
+    """
+    return _schema_version
+
+
+def invalidate_schema():
+    """
+    Mark the cached catalog as stale. Called after a table is created or written to.
+    """
+    global _schema_version
+    with _lock:
+        _schema_version += 1
+        _cached["tables"] = None
+
+
+def load_schema(connection):
+    """
+    Fetch every table and column of the connected database in one round trip.
+
+    Args:
+        connection: MySQL connection.
+
+    Returns:
+        dict: Table names as keys and lists of {"name", "type", "data_type"} dicts as values.
+        Columns with an indexed lowercase copy also have "lowercase": the copy's name.
+    """
+    cursor = connection.cursor()
+    try:
+        with span("metadata_fetch", backend="sql"):
+            cursor.execute(SCHEMA_QUERY)
+            rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    tables = {}
+    lowercase = {}
+    for table, column, column_type, data_type, extra in rows:
+        # ChatDB's own bookkeeping tables (e.g. column statistics) are not user data
+        if table.startswith(INTERNAL_TABLE_PREFIX):
+            continue
+        # information_schema returns bytes on some server/connector combinations
+        if isinstance(column_type, (bytes, bytearray)):
+            column_type = column_type.decode()
+        if isinstance(data_type, (bytes, bytearray)):
+            data_type = data_type.decode()
+        if isinstance(extra, (bytes, bytearray)):
+            extra = extra.decode()
+        # Lowercase copies are an index detail, not columns users ask about
+        if column.endswith(LOWERCASE_SUFFIX) and "INVISIBLE" in (extra or "").upper():
+            lowercase[(table, column[:-len(LOWERCASE_SUFFIX)])] = column
+            continue
+        tables.setdefault(table, []).append({"name": column, "type": column_type, "data_type": data_type})
+    for (table, column), copy in lowercase.items():
+        for col in tables.get(table, []):
+            if col["name"] == column:
+                col["lowercase"] = copy
+    return tables
+
+
+def get_schema(connection):
+    """
+    Return the cached catalog, reloading it when it was invalidated or has expired.
+
+    Args:
+        connection: MySQL connection used only when the catalog has to be (re)loaded.
+
+    Returns:
+        dict: Table names as keys and column lists as values.
+    """
+    now = time.monotonic()
+    tables = _cached["tables"]
+    if tables is not None and _cached["version"] == _schema_version and now - _cached["loaded_at"] < SCHEMA_CACHE_TTL:
+        return tables
+
+    version = _schema_version
+    tables = load_schema(connection)
+    with _lock:
+        # Do not publish a catalog that was invalidated while it was loading
+        if version == _schema_version:
+            _cached["tables"] = tables
+            _cached["version"] = version
+            _cached["loaded_at"] = now
+    return tables
+
+
+def list_tables(connection):
+    return list(get_schema(connection).keys())
+
+
+def get_table_columns(connection, table):
+    """
+    Return the column list of a table, matching the table name case-insensitively.
+
+    Returns:
+        list: Column dicts, or an empty list if the table does not exist.
+    """
+    tables = get_schema(connection)
+    if table in tables:
+        return tables[table]
+    table = table.lower()
+    for name, columns in tables.items():
+        if name.lower() == table:
+            return columns
+    return []
+
+
+def get_column_names(connection, table):
+    return [col["name"] for col in get_table_columns(connection, table)]
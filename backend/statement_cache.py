@@ -0,0 +1,169 @@
+import datetime
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import NamedTuple
+
+logger = logging.getLogger("chatdb.statement_cache")
+
+# Generated SQL is built as a statement with %s placeholders plus the values
+# bound to them (BoundQuery), so user values never become SQL text. SELECTs run
+# as server-side prepared statements: each connection keeps its most recently
+# used statements prepared, keyed by statement text, so a template is parsed
+# and planned once per connection whatever values it is run with.
+#
+# User queries run on the MySQL query pool, which does not reset sessions on
+# check-in (see connections.py) because COM_RESET_CONNECTION would drop every
+# prepared statement. A prepared SELECT leaves nothing else in the session;
+# after any other statement the session is cleared with reset_session().
+# (The executor's deadline is a MAX_EXECUTION_TIME hint in the statement
+# itself, not a session variable.)
+
+# Prepared statements kept per connection (the server caps the total with max_prepared_stmt_count)
+STATEMENT_CACHE_SIZE = 32
+
+_lock = threading.Lock()
+_caches = weakref.WeakKeyDictionary()  # connection -> {"connection_id", "statements": OrderedDict(sql -> (sql, cursor))}
+_stats = {"hits": 0, "prepares": 0}
+
+
+class BoundQuery(NamedTuple):
+    """
+    A SQL statement with %s placeholders and the values bound to them, in order.
+    str() gives the statement with the values written in, for display only.
+    """
+    sql: str
+    params: tuple = ()
+
+    def __str__(self):
+        return interpolate(self.sql, self.params)
+
+
+def sql_literal(value):
+    """
+    Write a value as a SQL literal.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def interpolate(sql, params):
+    """
+    Write the values into a statement's %s placeholders (for display and cache keys; execution binds them).
+    A statement without values is returned as it is, even if its text contains '%s' (e.g. in a LIKE pattern).
+    """
+    if not params:
+        return sql
+    parts = sql.split("%s")
+    if len(parts) != len(params) + 1:
+        raise ValueError(f"Statement has {len(parts) - 1} placeholders but {len(params)} values")
+    text = parts[0]
+    for value, part in zip(params, parts[1:]):
+        text += sql_literal(value) + part
+    return text
+
+
+def as_bound(query):
+    """
+    Accept a BoundQuery or plain SQL text (e.g. typed by the user) and return a BoundQuery.
+    """
+    if isinstance(query, BoundQuery):
+        return query
+    return BoundQuery(query, ())
+
+
+def _statements(connection):
+    # Pooled connections wrap the real one; the statements belong to the real one
+    target = getattr(connection, "_cnx", None) or connection
+    cache = _caches.get(target)
+    if cache is None or cache["connection_id"] != target.connection_id:
+        # New connection, or the old session was lost (reconnect): nothing is prepared on it
+        cache = {"connection_id": target.connection_id, "statements": OrderedDict()}
+        _caches[target] = cache
+    return cache["statements"]
+
+
+def execute_prepared(connection, query):
+    """
+    Execute a statement as a prepared statement, preparing it only the first time this connection sees it.
+
+    Args:
+        connection: MySQL connection (pooled or not).
+        query (BoundQuery or str): The statement and its values.
+
+    Returns:
+        cursor: The prepared cursor holding the result. Read the result completely
+        before the connection runs anything else; do not close the cursor.
+    """
+    query = as_bound(query)
+    with _lock:
+        statements = _statements(connection)
+        entry = statements.get(query.sql)
+        if entry is not None:
+            statements.move_to_end(query.sql)
+            _stats["hits"] += 1
+        else:
+            _stats["prepares"] += 1
+    if entry is None:
+        entry = (query.sql, connection.cursor(prepared=True))
+        with _lock:
+            statements[query.sql] = entry
+            evicted = [statements.popitem(last=False)[1] for _ in range(len(statements) - STATEMENT_CACHE_SIZE)]
+        for _, cursor in evicted:
+            try:
+                cursor.close()  # Deallocates the statement on the server
+            except Exception as e:
+                logger.warning("Could not close a prepared statement: %s", e)
+    sql, cursor = entry
+    try:
+        # The cursor only skips preparing when it is handed the very same string object again
+        cursor.execute(sql, query.params)
+    except Exception:
+        forget_statement(connection, query)
+        raise
+    return cursor
+
+
+def forget_statement(connection, query):
+    """
+    Drop a statement whose execution failed (e.g. it was interrupted), which may have
+    left its cursor unusable; the next execution prepares it again.
+    """
+    query = as_bound(query)
+    with _lock:
+        entry = _statements(connection).pop(query.sql, None)
+    if entry is not None:
+        try:
+            entry[1].close()
+        except Exception:
+            pass
+
+
+def reset_session(connection):
+    """
+    Clear what a statement may have left in a connection's session (user and session
+    variables, temporary tables, locks) before the connection is reused. This also
+    deallocates the statements prepared on it, so they are forgotten.
+    """
+    target = getattr(connection, "_cnx", None) or connection
+    with _lock:
+        _caches.pop(target, None)
+    target.reset_session()
+
+
+def statement_cache_stats():
+    with _lock:
+        return {
+            "hits": _stats["hits"],
+            "prepares": _stats["prepares"],
+            "connections": len(_caches),
+            "statements": sum(len(cache["statements"]) for cache in _caches.values()),
+        }
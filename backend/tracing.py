@@ -0,0 +1,157 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Timing spans for every stage of a request (intent detection, parameter
+# extraction, metadata fetch, query generation, planning, execution, fetch,
+# rendering), so a slow answer can be pinned on regex, metadata round trips,
+# the database or the UI.
+#
+# A request opens a trace with start_trace(); span() records a stage inside
+# it, nested spans keep their parent. The trace follows the request onto the
+# query worker threads (the executor copies the caller's context). Finished
+# traces are appended to a JSONL file, logged, and the most recent ones are
+# kept in memory for the sidebar.
+#
+# Everything goes through the "chatdb" logger: CHATDB_LOG_LEVEL=DEBUG also
+# logs the pipeline's debug messages, WARNING (or higher) turns spans off.
+
+LOG_LEVEL = os.environ.get("CHATDB_LOG_LEVEL", "INFO").upper()
+# Spans are recorded when the "chatdb" logger is enabled for this level
+SPAN_LEVEL = logging.INFO
+# JSONL file finished traces are appended to (empty to keep them in memory only)
+SPANS_PATH = os.environ.get("CHATDB_SPANS_PATH", os.path.join(".chatdb", "spans.jsonl"))
+# Finished traces kept in memory for display
+RECENT_TRACES = 20
+
+logger = logging.getLogger("chatdb")
+logger.setLevel(LOG_LEVEL)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+_current_trace = contextvars.ContextVar("chatdb_trace", default=None)
+_current_span = contextvars.ContextVar("chatdb_span", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_TRACES)
+
+
+def tracing_enabled():
+    return logger.isEnabledFor(SPAN_LEVEL)
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    """
+    Trace one request: every span opened in the block (also on worker threads it submits to) belongs to it.
+
+    Yields:
+        dict or None: The trace ({"trace_id", "name", "attributes", "started_at", "spans"}), None when tracing is off.
+    """
+    if not tracing_enabled():
+        yield None
+        return
+    trace = {
+        "trace_id": uuid.uuid4().hex,
+        "name": name,
+        "attributes": attributes,
+        "started_at": time.time(),
+        "spans": [],
+        "_start": time.perf_counter(),
+        "_lock": threading.Lock(),
+    }
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _finish(trace)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage of the current request. Outside a trace (or with tracing off) this does nothing.
+
+    Yields:
+        dict: The span's attributes; add to it to record results (e.g. rows fetched).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+    record = {
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": _current_span.get(),
+        "name": name,
+        "thread": threading.current_thread().name,
+        "attributes": attributes,
+    }
+    token = _current_span.set(record["span_id"])
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        _current_span.reset(token)
+        record["start_ms"] = round((start - trace["_start"]) * 1000, 3)
+        record["duration_ms"] = round((end - start) * 1000, 3)
+        with trace["_lock"]:
+            trace["spans"].append(record)
+
+
+def traced(name):
+    """
+    Decorator that runs a function inside span(name).
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _finish(trace):
+    with trace["_lock"]:
+        spans = sorted(trace["spans"], key=lambda record: record["start_ms"])
+    finished = {key: value for key, value in trace.items() if not key.startswith("_")}
+    finished["spans"] = spans
+    with _lock:
+        _recent.append(finished)
+    root = next((record for record in spans if record["parent_id"] is None), None)
+    logger.info(
+        "%s took %.1f ms: %s", trace["name"], root["duration_ms"] if root else 0.0,
+        ", ".join(f"{record['name']} {record['duration_ms']:.1f}" for record in spans if record is not root)
+    )
+    if SPANS_PATH:
+        try:
+            os.makedirs(os.path.dirname(SPANS_PATH) or ".", exist_ok=True)
+            with _lock, open(SPANS_PATH, "a") as file:
+                file.write(json.dumps(finished, default=str) + "\n")
+        except OSError as e:
+            logger.warning("Could not write spans to %s: %s", SPANS_PATH, e)
+
+
+def recent_traces():
+    """
+    Return the most recent finished traces, newest first.
+    """
+    with _lock:
+        return list(reversed(_recent))
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger("chatdb.value_dictionary")
+
+# Distinct values of the low-cardinality text columns of every table/collection
+# (gender, race, State, injury, School_Level, ...). Collected from the chunks
+# implement() and the MongoDB import already read, merged on every append, and
+# served from memory. A JSON copy on disk keeps it across restarts, and is
+# shared with other processes loading data (e.g. python -m backend.bootstrap
+# next to the running app): every update re-reads it before merging, and the
+# in-memory copy is re-read at most VALUES_CACHE_TTL seconds after loading.
+
+VALUE_DICTIONARY_PATH = os.path.join(".chatdb", "value_dictionary.json")
+# Columns with more distinct values than this are not dictionary columns
+MAX_DISTINCT_VALUES = 60
+# Longer strings are free text (summaries, URLs), not category values
+MAX_VALUE_LENGTH = 40
+# Seconds before the dictionary is re-read for values other processes loaded
+VALUES_CACHE_TTL = 300
+
+_lock = threading.Lock()
+_version = 0
+_dictionary = None  # {"sql"/"mongo": {table: {column: [values] or None}}}; None = too many values
+_loaded_at = 0.0
+
+
+def _load(refresh=False):
+    # Callers hold _lock
+    global _dictionary, _loaded_at, _version
+    now = time.monotonic()
+    if _dictionary is None or refresh or now - _loaded_at >= VALUES_CACHE_TTL:
+        try:
+            with open(VALUE_DICTIONARY_PATH, "r") as file:
+                loaded = json.load(file)
+        except (OSError, ValueError):
+            loaded = _dictionary if _dictionary is not None else {}
+        if loaded != _dictionary:
+            _dictionary = loaded
+            _version += 1
+        _loaded_at = now
+    return _dictionary
+
+
+def _save():
+    os.makedirs(os.path.dirname(VALUE_DICTIONARY_PATH), exist_ok=True)
+    temp_path = VALUE_DICTIONARY_PATH + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(_dictionary, file, indent=1, sort_keys=True)
+    os.replace(temp_path, VALUE_DICTIONARY_PATH)
+
+
+def get_values_version():
+    """
+    Return a stamp that changes every time the dictionary is updated (here or, once re-read, by another process).
+    """
+    with _lock:
+        _load()
+        return _version
+
+
+def collect_values(df, collected=None):
+    """
+    Add the distinct text values of a DataFrame chunk to collected.
+
+    Args:
+        df (DataFrame): One chunk of a file.
+        collected (dict, optional): Result of earlier calls for the same file.
+
+    Returns:
+        dict: Column name -> set of values, or None once the column has too many
+        distinct (or too long) values to be a category.
+    """
+    if collected is None:
+        collected = {}
+    for column in df.columns:
+        if collected.get(column, ()) is None:
+            continue
+        series = df[column]
+        if not (series.dtype == "object" or pd.api.types.is_string_dtype(series.dtype)):
+            collected[column] = None
+            continue
+        values = collected.setdefault(column, set())
+        for value in series.dropna().unique():
+            value = str(value).strip()
+            if not value:
+                continue
+            if len(value) > MAX_VALUE_LENGTH:
+                values = None
+                break
+            values.add(value)
+            if len(values) > MAX_DISTINCT_VALUES:
+                values = None
+                break
+        collected[column] = values
+    return collected
+
+
+def update_values(backend, table, collected, replace=False):
+    """
+    Merge values collected from newly loaded rows into the dictionary.
+
+    Args:
+        backend (str): "sql" or "mongo".
+        table (str): Table or collection the rows were loaded into.
+        collected (dict): From collect_values().
+        replace (bool): Drop what is known about the table first (it was just created).
+    """
+    global _version
+    table = table.lower()
+    with _lock:
+        # Merge into the dictionary as saved, which may hold tables another process loaded since
+        tables = _load(refresh=True).setdefault(backend, {})
+        columns = {} if replace else tables.get(table, {})
+        for column, values in collected.items():
+            known = columns.get(column, [])
+            if values is None or known is None:
+                columns[column] = None
+                continue
+            merged = set(known) | values
+            columns[column] = sorted(merged) if len(merged) <= MAX_DISTINCT_VALUES else None
+        tables[table] = columns
+        _version += 1
+        try:
+            _save()
+        except OSError as e:
+            logger.warning("Could not save the value dictionary: %s", e)
+
+
+def has_table(backend, table):
+    with _lock:
+        return table.lower() in _load().get(backend, {})
+
+
+def get_table_values(backend, table):
+    """
+    Return {column: [values]} for the dictionary columns of a table (empty if unknown).
+    """
+    with _lock:
+        columns = _load().get(backend, {}).get(table.lower(), {})
+        return {column: list(values) for column, values in columns.items() if values}
+
+
+def get_values(backend, table, column):
+    return get_table_values(backend, table).get(column, [])
+
+
+def find_value(backend, table, text, column=None):
+    """
+    Recognize a literal value of a table, ignoring case.
+
+    Args:
+        backend (str): "sql" or "mongo".
+        table (str): Table or collection to look in.
+        text (str): The value as the user typed it (e.g. "male", "ca").
+        column (str, optional): Only look in this column (matched case-insensitively).
+
+    Returns:
+        tuple: (column, value as stored) or None if the value is not in the dictionary.
+    """
+    wanted = text.strip().lower()
+    for name, values in get_table_values(backend, table).items():
+        if column and name.lower() != column.lower():
+            continue
+        for value in values:
+            if value.lower() == wanted:
+                return name, value
+    return None
+
+
+def build_sql_values(connection, table, columns):
+    """
+    Fill in the dictionary of a table that was loaded before the dictionary existed.
+
+    Reads at most MAX_DISTINCT_VALUES + 1 distinct values per column, once; later
+    loads through implement() keep the entry up to date.
+    """
+    collected = {}
+    cursor = connection.cursor()
+    try:
+        for column in columns:
+            cursor.execute(f"SELECT DISTINCT `{column}` FROM {table} LIMIT {MAX_DISTINCT_VALUES + 1}")
+            collect_values(pd.DataFrame({column: [row[0] for row in cursor.fetchall()]}, dtype=object), collected)
+    finally:
+        cursor.close()
+    update_values("sql", table, collected, replace=True)
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark for NL intent detection.
+
+Compares the precompiled intent dispatcher (nlp.find_intent) against the
+previous implementation, which ran every intent regex in turn with re.search.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_intent [--iterations 20000]
+"""
+import argparse
+import re
+import time
+
+from nlp_logic.nlp import find_intent
+
+SAMPLE_INPUTS = [
+    "show tables",
+    "show table shooter attributes",
+    "get me gender of shooter where race is Hispanic",
+    "get me incident where state is LA",
+    "get me victim where injury is Fatal",
+    "total Shots_Fired by state from incident",
+    "Count victim by injury",
+    "Count shooter by age",
+    "show incident which has shooter that the shooteroutcome is Surrendered",
+    "show victim which has incident that the city is Los Angeles",
+    "find gender, age from shooter where race is Hispanic order by age desc",
+    "average age by schoolaffiliation from shooter",
+    "5 city with highest shots_fired",
+    "3 state with the highest number of incident",
+    "show incident where date is between '2022-05-30' and '2022-06-01'",
+    "can I get sample queries with group by",
+    "what is the weather like",
+]
+
+
+# Previous implementation of nlp.detect_intent (without its debug print)
+def legacy_detect_intent(user_input):
+    user_input = user_input.lower().strip()
+    intent_patterns = [
+        ("join_query", r"\b(show|get)\b\s+(?P<table1>\w+)\s+\bwhich has\b\s+(?P<table2>\w+)\s+\bthat the\b\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>\w+)"),
+        ("total_group_by", r"\btotal\b.*(\bby\b.*|\bwhere\b.*)"),
+        ("filter_sort", r"\bfind\b.*\bwhere\b.*\border by\b.*"),
+        ("count_by_category", r"\bcount\b.*\bby\b.*"),
+        ("average_by_category", r"\baverage\b|\bmean\b.*\bof\b.*"),
+        ("filter_by_date_range", r"\bshow\b.*\b(from|between)\b.*\b(to|and)\b.*"),
+        ("basic_select", r"\b(get|show)\b.*\bwhere\b"),
+        ("list_tables", r"\bshow\b.*\btables\b"),
+        ("list_collections", r"\blist\b.*\bcollections\b"),
+        ("describe_attr", r"\btable\b.*\battributes\b"),
+        ("sample_queries", r"\bsample queries\b"),
+        ("sample_construct_queries", r"\bsample queries with\b.*"),
+    ]
+    for intent, pattern in intent_patterns:
+        if re.search(pattern, user_input):
+            return intent
+    for extreme in ['highest', 'lowest', 'largest', 'smallest']:
+        if extreme in user_input:
+            return 'top_n_by_measures'
+    return "unknown"
+
+
+def current_detect_intent(user_input):
+    return find_intent(user_input)
+
+
+def measure(func, inputs, iterations):
+    """
+    Return intents per second for func over the sample inputs.
+    """
+    start = time.perf_counter()
+    count = 0
+    while count < iterations:
+        for user_input in inputs:
+            func(user_input)
+        count += len(inputs)
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NL intent detection.")
+    parser.add_argument("--iterations", type=int, default=20000, help="Number of inputs classified per implementation")
+    args = parser.parse_args()
+
+    # Both implementations must agree before their speed is worth comparing
+    for user_input in SAMPLE_INPUTS:
+        expected = legacy_detect_intent(user_input)
+        actual = current_detect_intent(user_input)
+        if expected != actual:
+            raise SystemExit(f"Intent mismatch for {user_input!r}: legacy={expected} current={actual}")
+
+    legacy_rate = measure(legacy_detect_intent, SAMPLE_INPUTS, args.iterations)
+    current_rate = measure(current_detect_intent, SAMPLE_INPUTS, args.iterations)
+
+    print(f"legacy detect_intent:   {legacy_rate:12,.0f} intents/s")
+    print(f"compiled find_intent:   {current_rate:12,.0f} intents/s")
+    print(f"speedup:                {current_rate / legacy_rate:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
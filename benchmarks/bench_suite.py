@@ -0,0 +1,383 @@
+"""
+Benchmark suite over the bundled incident datasets.
+
+Loads data/INCIDENT.csv, SHOOTER.csv, VICTIM.csv and WEAPON.csv at each scale
+factor into a MySQL and a MongoDB server (local instances, e.g. containers)
+and measures:
+
+- ingest throughput of implement() and import_csv_to_mongodb(), per file
+- p50/p95/p99 latency of every intent through nlp.process_user_input (SQL)
+  and mongo_NLP.parse_query + execute_query (MongoDB), with the translation
+  and result caches cleared before every run ("cold") and kept ("warm")
+- sample query (suggestion) generation time
+
+A scale factor of N loads every file N times over, with the join keys
+(Incident_ID, incidentid) suffixed per copy, so joins and group sizes keep
+their shape. Scaled files are generated once under the work directory.
+
+Everything runs against the database named by CHATDB_BENCH_DATABASE
+(default chatDB_bench), which is emptied before every scale factor; the
+application's database is never touched. Results are written as JSON
+together with the git commit, and --compare reports the metrics that got
+worse than a baseline result by more than --threshold.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_suite [--scales 1 10 100] [--iterations 30] [--targets mysql mongodb]
+    python -m benchmarks.bench_suite --compare benchmarks/results/<baseline>.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# The suite loads into (and empties) its own database, so point every module at it before they are imported
+os.environ["CHATDB_DATABASE"] = os.environ.get("CHATDB_BENCH_DATABASE", "chatDB_bench")
+os.environ.setdefault("CHATDB_LOG_LEVEL", "WARNING")
+
+import numpy as np
+import pandas as pd
+
+from backend.bootstrap import TARGETS, discover_manifest, ingest_file
+from backend.bulk_loader import DEFAULT_LOAD_STRATEGY, LOAD_STRATEGIES
+from backend.connections import DATABASE_NAME, get_mongo_client, get_mysql_connection, get_mysql_query_connection
+from backend.index_manager import key_columns
+from backend.result_cache import result_cache
+from backend.schema_catalog import invalidate_schema
+from nlp_logic.nlp import process_user_input
+from nlp_logic.mongo_NLP import execute_query, parse_query
+from nlp_logic.query_suggestions import process_sample_queries
+from nlp_logic.translation_cache import translation_cache
+
+DATA_FILES = ["INCIDENT.csv", "SHOOTER.csv", "VICTIM.csv", "WEAPON.csv"]
+SCALES = [1, 10, 100]
+ITERATIONS = 30
+PERCENTILES = (50, 95, 99)
+# Rows read per chunk when writing scaled files
+SCALE_CHUNK_SIZE = 10000
+WORK_DIR = os.path.join(".chatdb", "bench")
+RESULTS_DIR = os.path.join("benchmarks", "results")
+# Relative change beyond which --compare reports a metric as a regression
+REGRESSION_THRESHOLD = 0.2
+
+# One input per intent, taken from the README examples
+SQL_INPUTS = {
+    "list_tables": "show tables",
+    "describe_attr": "show table shooter attributes",
+    "basic_select": "get me victim where injury is Fatal",
+    "total_group_by": "total Shots_Fired by state from incident",
+    "count_by_category": "Count victim by injury",
+    "join_query": "show incident which has shooter that the shooteroutcome is Surrendered",
+    "filter_sort": "find gender, age from shooter where race is Hispanic order by age desc",
+    "average_by_category": "average age by schoolaffiliation from shooter",
+    "top_n_by_measures": "5 city with highest shots_fired",
+    "filter_by_date_range": "show incident where date is between '2022-05-30' and '2022-06-01'",
+}
+MONGO_INPUTS = {
+    "show_collections": "show collections",
+    "count_shooters": "count how many shooters are male",
+    "count_victims": "how many victims were fatal",
+    "count_incidents": "how many incidents occurred in ca",
+    "join_count": "how many incidents had a male shooter and a female victim",
+    "raw_find": 'db.weapon.find({"weapontype": "Handgun"})',
+    "raw_aggregate": 'db.shooter.aggregate([{"$group": {"_id": "$gender", "count": {"$sum": 1}}}])',
+}
+SUGGESTION_INPUTS = {
+    "examples": "can I get example queries",
+    "examples_group_by": "can I get example queries with group by",
+}
+
+
+def git_commit():
+    """
+    Return (commit, dirty) of the working tree, or (None, None) outside a git checkout.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def scale_file(source, target, factor):
+    """
+    Write factor copies of a CSV file, suffixing the join key columns with the copy number.
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = target + ".tmp"
+    header = True
+    for copy in range(factor):
+        for chunk in pd.read_csv(source, chunksize=SCALE_CHUNK_SIZE, dtype=str, keep_default_na=False):
+            if copy:
+                for column in key_columns(list(chunk.columns)):
+                    filled = chunk[column] != ""
+                    chunk.loc[filled, column] = chunk.loc[filled, column] + f"_{copy}"
+            chunk.to_csv(temp_path, mode="w" if header else "a", header=header, index=False)
+            header = False
+    os.replace(temp_path, target)
+
+
+def scaled_manifest(data_dir, factor, work_dir):
+    """
+    Return the manifest of the data files at a scale factor, generating missing scaled files.
+    """
+    manifest = [entry for entry in discover_manifest(data_dir) if os.path.basename(entry["path"]) in DATA_FILES]
+    if factor == 1:
+        return manifest
+    for entry in manifest:
+        target = os.path.join(work_dir, f"x{factor}", os.path.basename(entry["path"]))
+        if not os.path.exists(target):
+            print(f"Writing {target}")
+            scale_file(entry["path"], target, factor)
+        entry["path"] = target
+    return manifest
+
+
+def reset_databases(targets):
+    """
+    Empty the benchmark database and every cache that could serve stale data.
+    """
+    if "mysql" in targets:
+        connection = get_mysql_connection(database=None)
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s", (DATABASE_NAME,))
+            for (table,) in cursor.fetchall():
+                cursor.execute(f"DROP TABLE `{DATABASE_NAME}`.`{table}`")
+        finally:
+            cursor.close()
+            connection.close()
+        invalidate_schema()
+    if "mongodb" in targets:
+        get_mongo_client().drop_database(DATABASE_NAME)
+    clear_caches()
+
+
+def clear_caches():
+    result_cache.clear()
+    translation_cache.clear()
+
+
+def summarize(samples, errors=0):
+    """
+    Latency statistics in milliseconds of a list of durations in seconds.
+    """
+    if not samples:
+        return {"n": 0, "errors": errors}
+    milliseconds = np.array(samples) * 1000
+    summary = {"n": len(samples), "errors": errors, "mean": float(milliseconds.mean())}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(milliseconds, percentile))
+    return summary
+
+
+def time_runs(run, iterations, cold):
+    """
+    Time iterations calls of run(); cold clears the translation and result caches before each call.
+    """
+    samples, errors = [], 0
+    try:
+        run()  # Warm-up: connections, the schema catalog and the join graph
+    except Exception as e:
+        print(f"Benchmark run failed: {e}")
+        return summarize(samples, errors=1)
+    for _ in range(iterations):
+        if cold:
+            clear_caches()
+        start = time.perf_counter()
+        try:
+            run()
+        except Exception as e:
+            errors += 1
+            print(f"Benchmark run failed: {e}")
+            continue
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, errors)
+
+
+def bench_ingest(manifest, targets, load_strategy):
+    results = {}
+    for target in targets:
+        results[target] = {}
+        # One file at a time, so throughput is not shared between loads
+        for entry in manifest:
+            loaded = ingest_file(entry, target, load_strategy=load_strategy)
+            if loaded["error"]:
+                raise SystemExit(f"Loading {entry['path']} into {target} failed: {loaded['error']}")
+            results[target][entry["table"]] = {
+                "rows": loaded["rows"],
+                "seconds": loaded["seconds"],
+                "rows_per_sec": loaded["rows"] / loaded["seconds"] if loaded["seconds"] else None,
+            }
+    return results
+
+
+def bench_sql(iterations):
+    # The connection user queries run on, so prepared statements are reused as in the app
+    connection = get_mysql_query_connection()
+    try:
+        results = {}
+        for intent, user_input in SQL_INPUTS.items():
+            # confirmed: the query plan guard must not stop the larger scales
+            run = lambda: process_user_input(user_input, "SQL", connection, confirmed=True)
+            results[intent] = {"cold": time_runs(run, iterations, cold=True), "warm": time_runs(run, iterations, cold=False)}
+        suggestions = {
+            name: time_runs(lambda: process_sample_queries(user_input, "SQL", engine=connection), iterations, cold=True)
+            for name, user_input in SUGGESTION_INPUTS.items()
+        }
+    finally:
+        connection.close()
+    return results, suggestions
+
+
+def bench_mongo(iterations):
+    results = {}
+    for intent, user_input in MONGO_INPUTS.items():
+        run = lambda: execute_query(parse_query(user_input), confirmed=True)
+        results[intent] = {"cold": time_runs(run, iterations, cold=True), "warm": time_runs(run, iterations, cold=False)}
+    suggestions = {
+        name: time_runs(lambda: process_sample_queries(user_input, "MongoDB", db_name=DATABASE_NAME), iterations, cold=True)
+        for name, user_input in SUGGESTION_INPUTS.items()
+    }
+    return results, suggestions
+
+
+def run_suite(data_dir, scales, iterations, targets, load_strategy, work_dir):
+    results = []
+    for factor in scales:
+        print(f"--- scale x{factor} ---")
+        manifest = scaled_manifest(data_dir, factor, work_dir)
+        reset_databases(targets)
+        scale_result = {"scale": factor, "ingest": bench_ingest(manifest, targets, load_strategy), "latency": {}, "suggestions": {}}
+        if "mysql" in targets:
+            scale_result["latency"]["sql"], scale_result["suggestions"]["sql"] = bench_sql(iterations)
+        if "mongodb" in targets:
+            scale_result["latency"]["mongo"], scale_result["suggestions"]["mongo"] = bench_mongo(iterations)
+        results.append(scale_result)
+    return results
+
+
+def flatten(results):
+    """
+    Map every metric of a result file to {"x10/latency/sql/join_query/cold/p95": value}.
+    """
+    metrics = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}/{key}", child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix] = value
+
+    for scale_result in results["results"]:
+        for section in ("ingest", "latency", "suggestions"):
+            walk(f"x{scale_result['scale']}/{section}", scale_result[section])
+    return metrics
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Return the metrics that got worse than the baseline by more than threshold (relative).
+
+    Returns:
+        list: (metric, baseline value, current value, relative change) tuples, worst first.
+    """
+    current_metrics, baseline_metrics = flatten(current), flatten(baseline)
+    regressions = []
+    for metric, value in current_metrics.items():
+        before = baseline_metrics.get(metric)
+        name = metric.rsplit("/", 1)[-1]
+        # Only throughput and latencies; counts (rows, n, errors) are not speeds
+        if not before or name not in ("rows_per_sec", "mean") + tuple(f"p{p}" for p in PERCENTILES):
+            continue
+        change = (value - before) / before
+        worse = -change if name == "rows_per_sec" else change
+        if worse > threshold:
+            regressions.append((metric, before, value, worse))
+    return sorted(regressions, key=lambda regression: -regression[3])
+
+
+def print_summary(results):
+    for scale_result in results["results"]:
+        print(f"=== x{scale_result['scale']} ===")
+        for target, tables in scale_result["ingest"].items():
+            for table, stats in tables.items():
+                print(f"ingest  {target:8} {table:10} {stats['rows']:>10,} rows  {stats['rows_per_sec'] or 0:>12,.0f} rows/s")
+        for backend, intents in scale_result["latency"].items():
+            for intent, runs in intents.items():
+                cold, warm = runs["cold"], runs["warm"]
+                print(f"latency {backend:8} {intent:22} cold p50/p95/p99 {cold.get('p50', 0):8.2f} {cold.get('p95', 0):8.2f} "
+                      f"{cold.get('p99', 0):8.2f} ms  warm p50 {warm.get('p50', 0):8.2f} ms"
+                      + (f"  ({cold['errors'] + warm['errors']} errors)" if cold["errors"] + warm["errors"] else ""))
+        for backend, inputs in scale_result["suggestions"].items():
+            for name, stats in inputs.items():
+                print(f"suggest {backend:8} {name:22} p50 {stats.get('p50', 0):8.2f} ms  p95 {stats.get('p95', 0):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, query latency and suggestions over the bundled datasets.")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the CSV files")
+    parser.add_argument("--scales", nargs="+", type=int, default=SCALES, help="Scale factors to load the data at")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="Timed runs per input and cache mode")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--load-strategy", choices=list(LOAD_STRATEGIES), default=DEFAULT_LOAD_STRATEGY)
+    parser.add_argument("--work-dir", default=WORK_DIR, help="Scaled files and ChatDB's local state for the benchmark")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Baseline result file to report regressions against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    work_dir = os.path.abspath(args.work_dir)
+    commit, dirty = git_commit()
+    started = datetime.datetime.now(datetime.timezone.utc)
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"{started:%Y%m%d-%H%M%S}-{(commit or 'nogit')[:12]}.json"
+    ))
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+
+    # The value dictionary, join graph and spans live in .chatdb/ of the working directory; keep the benchmark's apart
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "started_at": started.isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "database": DATABASE_NAME,
+        "config": {
+            "scales": args.scales,
+            "iterations": args.iterations,
+            "targets": args.targets,
+            "load_strategy": args.load_strategy,
+        },
+        "results": run_suite(data_dir, args.scales, args.iterations, args.targets, args.load_strategy, work_dir),
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print_summary(results)
+    print(f"Results written to {output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for metric, before, value, worse in regressions:
+            print(f"REGRESSION {metric}: {before:,.2f} -> {value:,.2f} ({worse:+.0%})")
+        if regressions:
+            raise SystemExit(f"{len(regressions)} metrics regressed against {args.compare} (commit {baseline.get('commit')})")
+        print(f"No regressions against {args.compare} (commit {baseline.get('commit')})")
+
+
+if __name__ == "__main__":
+    main()
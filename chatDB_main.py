@@ -1,19 +1,28 @@
 
 import streamlit as st
-from sqlalchemy import create_engine
-from pymongo import MongoClient
-import mysql.connector
 import pandas as pd
 import random
 import os
+import uuid
+from contextlib import nullcontext
 
-from nlp_logic.nlp import process_user_input
+from nlp_logic.nlp import process_user_input, fetch_sql_page, count_query_rows, PAGE_SIZE, MAX_RESULT_ROWS
 from nlp_logic.query_patterns import generator
 from nlp_logic.query_suggestions import process_sample_queries
 from backend.backend_functions import implement
-from backend.nosql_backend import import_multiple_json_to_mongodb, csv_to_json
+from backend.bulk_loader import LOAD_STRATEGIES, DEFAULT_LOAD_STRATEGY
+from backend.bootstrap import bootstrap
+from backend import connections
+from backend.nosql_backend import import_csv_to_mongodb
 from nlp_logic.mongo_queries import process_user_input_mongodb
 from nlp_logic.mongo_NLP import parse_query, execute_query
+from nlp_logic.mongo_results import documents_to_frame
+from backend.result_cache import result_cache
+from nlp_logic.translation_cache import translation_cache
+from backend.statement_cache import statement_cache_stats
+from backend.query_executor import query_executor, run_with_mysql, QueryTimeout, QueryCancelled
+from backend.query_planner import QueryBlocked
+from backend.tracing import recent_traces, span, start_trace
 
 sql_examples = []
 mongodb_examples = []
@@ -38,25 +47,107 @@ def save_uploaded_file(uploaded_file):
         f.write(uploaded_file.getbuffer())
     return file_path
 
+# Connections come from the process-wide registry in backend/connections.py,
+# so a Streamlit rerun checks out a pooled connection instead of opening a new one
 def get_mysql_connection():
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",  # Update with your MySQL username
-            password="",  # Update with your MySQL password
-            database="chatDB"  # Replace with your database name
-        )
+        connection = connections.get_mysql_connection()
         if connection.is_connected():
             return connection
     except Exception as e:
         st.error(f"Error connecting to MySQL: {e}")
         return None
-    
+
 def get_sql_engine():
-    return create_engine('mysql+mysqlconnector://root@localhost/db')
+    return connections.get_sql_engine()
 
 def get_mongo_client():
-    return MongoClient('mongodb://localhost:27017/')
+    return connections.get_mongo_client()
+
+# Run a query function on a worker thread with its own pooled MySQL connection.
+# Submitting a new query cancels whatever this session still has running.
+def run_sql_job(session_id, fn, *args, **kwargs):
+    job = query_executor.submit(session_id, run_with_mysql, fn, *args, **kwargs)
+    with st.spinner("Running query..."):
+        return job.result()
+
+# Say that a query ran out of time and show whatever it read before it was stopped
+def display_timeout(error):
+    st.warning(f"{error} Showing partial results, if any.")
+    partial = error.partial
+    if isinstance(partial, dict) and partial.get("rows"):
+        st.dataframe(pd.DataFrame(partial["rows"], columns=partial["headers"]), use_container_width=True)
+    elif isinstance(partial, list) and partial:
+        st.dataframe(documents_to_frame(partial), use_container_width=True)
+
+# Show how the database plans to run a query: estimated rows examined, access type and index per table
+def display_plan(plan):
+    if not plan:
+        return
+    cost = f", cost {plan['cost']:,.1f}" if plan.get("cost") is not None else ""
+    st.caption(f"Query plan: about {plan['estimated_rows']:,} rows examined{cost}"
+               + (" (full scan)" if plan["full_scan"] else ""))
+    st.dataframe(pd.DataFrame(plan["access"], columns=["table", "access_type", "key", "rows", "full_scan"]),
+                 use_container_width=True)
+
+# Explain why a query was stopped before it ran and, if allowed, offer to run it anyway
+def display_blocked(error, user_input):
+    if error.confirmable:
+        st.warning(str(error))
+    else:
+        st.error(str(error))
+    display_plan(error.plan)
+    if error.confirmable:
+        st.button("Run anyway", on_click=lambda: st.session_state.update(confirmed_input=user_input))
+
+# Show how long each stage of the session's latest request took, nested spans indented under their parent
+def display_timings(session_id):
+    trace = next((trace for trace in recent_traces() if trace["attributes"].get("session") == session_id), None)
+    if trace is None:
+        st.sidebar.caption("No timings recorded yet (spans need CHATDB_LOG_LEVEL=INFO or DEBUG).")
+        return
+    st.sidebar.subheader("Timings")
+    st.sidebar.caption(trace["attributes"].get("input", trace["name"]))
+    parents = {record["span_id"]: record["parent_id"] for record in trace["spans"]}
+    rows = []
+    for record in trace["spans"]:
+        depth, parent = 0, record["parent_id"]
+        while parent is not None:
+            depth, parent = depth + 1, parents.get(parent)
+        rows.append({"stage": "  " * depth + record["name"], "start ms": record["start_ms"], "ms": record["duration_ms"]})
+    st.sidebar.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+# Show SQL results one page at a time; further pages are fetched only when asked for
+def display_sql_results(sql_query, first_page, session_id):
+    # Start again from the first page whenever the query changes
+    if st.session_state.get("sql_page_query") != sql_query:
+        st.session_state["sql_page_query"] = sql_query
+        st.session_state["sql_page"] = 0
+        st.session_state["sql_total"] = None
+    page = st.session_state["sql_page"]
+
+    if page == 0:
+        page_data = first_page
+    else:
+        page_data = run_sql_job(session_id, fetch_sql_page, sql_query, page=page)
+
+    st.write("Query Results:")
+    with span("render", rows=len(page_data["rows"])):
+        df = pd.DataFrame(page_data["rows"], columns=page_data["headers"])
+        st.dataframe(df, use_container_width=True)
+
+    if not str(sql_query).lstrip().lower().startswith("select"):
+        return
+    prev_col, info_col, next_col, count_col = st.columns([1, 2, 1, 2])
+    prev_col.button("Previous", disabled=page == 0,
+                    on_click=lambda: st.session_state.update(sql_page=page - 1))
+    info_col.write(f"Page {page + 1} (rows {page * PAGE_SIZE + 1}-{page * PAGE_SIZE + len(page_data['rows'])})")
+    next_col.button("Next", disabled=not page_data["has_more"],
+                    on_click=lambda: st.session_state.update(sql_page=page + 1))
+    if count_col.button("Count total rows"):
+        st.session_state["sql_total"] = run_sql_job(session_id, count_query_rows, sql_query)
+    if st.session_state.get("sql_total") is not None:
+        count_col.write(f"{st.session_state['sql_total']:,} rows in total (at most {MAX_RESULT_ROWS:,} can be paged)")
 
 # Main function for the Streamlit app
 def main():
@@ -74,93 +165,159 @@ def main():
 
     # Section for uploading datasets
     st.sidebar.subheader("Upload Dataset")
-    uploaded_file = st.sidebar.file_uploader("Choose a CSV file", type=["csv"])
-    table_name = st.sidebar.text_input("Enter Table/Collection Name")
-    if uploaded_file and table_name:
+    uploaded_files = st.sidebar.file_uploader("Choose CSV files", type=["csv"], accept_multiple_files=True)
+    table_name = st.sidebar.text_input("Enter Table/Collection Name (single file; defaults to the file name)")
+    load_strategy = st.sidebar.selectbox("SQL load strategy", list(LOAD_STRATEGIES), index=list(LOAD_STRATEGIES).index(DEFAULT_LOAD_STRATEGY)) if db_type == "SQL" else None
+
+    # Streamlit reruns the script on every interaction; only ingest each upload once
+    ingested = st.session_state.setdefault("ingested_uploads", set())
+    upload_key = (db_type, table_name, tuple((f.name, f.size) for f in uploaded_files or []))
+    if len(uploaded_files or []) > 1 and upload_key not in ingested:
+        # Several files: ingest them concurrently, one table/collection per file
+        try:
+            file_paths = [save_uploaded_file(f) for f in uploaded_files]
+            manifest = [{"path": path, "table": os.path.splitext(os.path.basename(path))[0].lower()} for path in file_paths]
+            with st.spinner(f"Loading {len(manifest)} files..."):
+                results = bootstrap(manifest, targets=["mysql" if db_type == "SQL" else "mongodb"], load_strategy=load_strategy or DEFAULT_LOAD_STRATEGY)
+            ingested.add(upload_key)
+            st.sidebar.dataframe(pd.DataFrame(results)[["table", "rows", "seconds", "error"]], use_container_width=True)
+            failed = [r for r in results if r["error"]]
+            if failed:
+                st.error(f"{len(failed)} of {len(results)} files failed to load.")
+            else:
+                st.success(f"Loaded {sum(r['rows'] for r in results):,} rows from {len(results)} files.")
+        except Exception as e:
+            st.error(f"Error uploading datasets: {e}")
+    elif uploaded_files and table_name and upload_key not in ingested:
+        uploaded_file = uploaded_files[0]
         try:
             file_path = save_uploaded_file(uploaded_file)
             if db_type == "SQL":
                 st.subheader("SQL Database Operations")
                 if file_path.lower().endswith('.csv'):
                     os.environ["IMPLEMENT_FILE_PATH"] = file_path  
-                    implement(file_path, table_name)  # Run the existing SQL data upload function
-                    st.success(f"Dataset '{uploaded_file.name}' uploaded to SQL as table '{table_name}' successfully.")
+                    progress_bar = st.progress(0.0, text="Loading dataset...")
+                    def report_progress(rows_loaded, fraction):
+                        progress_bar.progress(fraction, text=f"{rows_loaded:,} rows loaded")
+                    stats = implement(file_path, table_name, progress=report_progress, strategy=load_strategy)  # Stream the file into SQL chunk by chunk
+                    ingested.add(upload_key)
+                    st.success(f"Dataset '{uploaded_file.name}' uploaded to SQL as table '{table_name}' successfully "
+                               f"({stats['rows']:,} rows, {stats['rows_per_sec']:,.0f} rows/s).")
                 else:
                     st.error("Unsupported file format. Please upload a CSV.")
             elif db_type == "MongoDB":
                 st.subheader("MongoDB Operations")
                 if file_path.lower().endswith('.csv'):
-                    json_file_path = f"{table_name}.json"
-                    json_data = csv_to_json(file_path, json_file_path)
-                    if json_data is not None:
-                        import_multiple_json_to_mongodb([json_file_path], "chatDB")
-                        st.success(f"CSV file '{uploaded_file.name}' converted and uploaded to MongoDB as collection '{table_name}' successfully.")
+                    # Stream the CSV straight into the collection (no intermediate JSON file)
+                    inserted = import_csv_to_mongodb(file_path, "chatDB", collection_name=table_name)
+                    if inserted:
+                        ingested.add(upload_key)
+                        st.success(f"CSV file '{uploaded_file.name}' uploaded to MongoDB as collection '{table_name}' successfully ({inserted:,} documents).")
                     else:
-                        st.error("Failed to convert CSV to JSON")
+                        st.error("Failed to import CSV into MongoDB")
                 else:
                     st.error("Unsupported file format. Please upload a CSV or JSON file.")
 
         except Exception as e:
             st.error(f"Error uploading dataset: {e}")
 
+    # Identifies this browser session to the query executor
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
     # Text input for user query
     user_input = st.text_input("Enter your query (natural language or pattern-based):")
         
-    # Example queries section
-    if "example" in user_input.lower():
-        if db_type == "SQL":
-            st.write("Here are some examples of SQL queries you can try:")
-            result = process_sample_queries(user_input, db_type, engine=mysql_connection)
-        else:
-            st.write("Here are some examples of MongoDB queries you can try:")
-            result = process_sample_queries(user_input, db_type, db_name='chatDB')
-            st.write(result)
+    # Time every stage of this request (see backend/tracing.py)
+    with start_trace("request", backend=db_type, input=user_input, session=session_id) if user_input else nullcontext():
+        # Example queries section
+        if "example" in user_input.lower():
+            if db_type == "SQL":
+                st.write("Here are some examples of SQL queries you can try:")
+                result = process_sample_queries(user_input, db_type, engine=mysql_connection)
+            else:
+                st.write("Here are some examples of MongoDB queries you can try:")
+                result = process_sample_queries(user_input, db_type, db_name='chatDB')
+                st.write(result)
             
-        for i, query in enumerate(result, 1):
-            st.markdown(f"**{i}.** {query.get('description')}")
-            st.code(query.get('query'), language="sql" if db_type == "SQL" else "json") 
+            for i, query in enumerate(result, 1):
+                st.markdown(f"**{i}.** {query.get('description')}")
+                st.code(query.get('query'), language="sql" if db_type == "SQL" else "json") 
 
-    elif user_input:
-        try:
-            if db_type == "SQL":
-                # Run SQL query and display results
-                sql_query, result = process_user_input(
-                    user_input=user_input,
-                    db_type=db_type,
-                    engine=mysql_connection if db_type == "SQL" else mongo_client
-                )
-                if sql_query:
-                    st.write("Generated SQL Query:")
-                    st.code(sql_query, language="sql")
-                if result:
-                    res, headers = result
-                    st.write("Query Results:")
-                    df = pd.DataFrame(res, columns=headers)
-                    st.dataframe(df, use_container_width=True) 
-                else:
-                    st.warning("No results found or query failed.")
-            elif db_type == "MongoDB":
-                # Process MongoDB query and display results
-                user_query = parse_query(user_input)
-                result = execute_query(user_query)
-                if result:  
-                    mongo_query = result["query"]
-                    res = result["result"]
-                    st.write("Generated MongoDB Query:")
-                    st.code(mongo_query, language="json")
-                    st.write("Query Results:")
-                    if isinstance(res, list):
-                        st.json(res)  # Display as JSON
-                    elif isinstance(res, dict):
-                        st.json(res)  # Display a single document
+        elif user_input:
+            # The user confirmed this input after its plan was stopped
+            confirmed = st.session_state.get("confirmed_input") == user_input
+            try:
+                if db_type == "SQL":
+                    # Run SQL query off the script thread and display results
+                    sql_query, result, plan = run_sql_job(session_id, process_user_input, user_input, db_type, confirmed=confirmed)
+                    if sql_query:
+                        st.write("Generated SQL Query:")
+                        st.code(str(sql_query), language="sql")  # Bound values written in, for reading
+                        display_plan(plan)
+                    if result:
+                        display_sql_results(sql_query, result, session_id)
                     else:
-                        st.write(res)
-                else:
-                    st.warning("No results found or query failed.")
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+                        st.warning("No results found or query failed.")
+                elif db_type == "MongoDB":
+                    # Process MongoDB query and display results
+                    user_query = parse_query(user_input)
+                    job = query_executor.submit(session_id, execute_query, user_query, confirmed=confirmed)
+                    with st.spinner("Running query..."):
+                        result = job.result()
+                    if result:  
+                        mongo_query = result["query"]
+                        res = result["result"]
+                        st.write("Generated MongoDB Query:")
+                        st.code(mongo_query, language="json")
+                        if result.get("optimized_query"):
+                            st.write("Optimized MongoDB Query (executed):")
+                            st.code(result["optimized_query"], language="json")
+                        display_plan(result.get("plan"))
+                        st.write("Query Results:")
+                        with span("render", rows=len(res) if isinstance(res, list) else 1):
+                            if isinstance(res, list) and res and all(isinstance(doc, dict) for doc in res):
+                                # Flatten documents into a table (dotted column names for nested fields)
+                                st.dataframe(documents_to_frame(res), use_container_width=True)
+                                if result.get("truncated"):
+                                    st.caption(f"Showing the first {len(res):,} documents.")
+                            elif isinstance(res, list):
+                                st.json(res)  # Display as JSON
+                            elif isinstance(res, dict):
+                                st.json(res)  # Display a single document
+                            else:
+                                st.write(res)
+                    else:
+                        st.warning("No results found or query failed.")
+            except QueryBlocked as e:
+                display_blocked(e, user_input)
+            except QueryTimeout as e:
+                display_timeout(e)
+            except QueryCancelled:
+                st.info("The previous query was cancelled.")
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+
+    # Result cache counters (shared by every session in this process)
+    cache_stats = result_cache.stats()
+    st.sidebar.subheader("Result Cache")
+    st.sidebar.write(f"{cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+                     f"({cache_stats['hit_rate']:.0%} hit rate)")
+    st.sidebar.write(f"{cache_stats['entries']:,} entries, {cache_stats['bytes'] / 1024:,.0f} KB")
+    if st.sidebar.button("Clear result cache"):
+        result_cache.clear()
+    translation_stats = translation_cache.stats()
+    st.sidebar.write(f"Translations: {translation_stats['hits']:,} hits / {translation_stats['misses']:,} misses "
+                     f"({translation_stats['entries']:,} cached)")
+    if db_type == "SQL":
+        statement_stats = statement_cache_stats()
+        st.sidebar.write(f"Prepared statements: {statement_stats['hits']:,} reused / {statement_stats['prepares']:,} prepared "
+                         f"({statement_stats['statements']:,} open on {statement_stats['connections']:,} connections)")
+
+    # Stage timings of this session's latest request
+    if st.sidebar.checkbox("Show timings"):
+        display_timings(session_id)
 
-    # Close MySQL connection when the app ends
+    # Return the MySQL connection to the pool at the end of the rerun
     if mysql_connection:
         mysql_connection.close()
        
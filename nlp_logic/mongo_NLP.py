@@ -1,14 +1,41 @@
 import re
-from pymongo import MongoClient
 import ast
 import json
+import logging
+from pymongo.cursor import Cursor
+from pymongo.command_cursor import CommandCursor
+from backend.connections import get_mongo_client, DATABASE_NAME
+from backend.index_manager import CASE_INSENSITIVE
+from backend.query_executor import QueryTimeout, mongo_comment, mongo_deadline
+from backend.query_planner import check_plan, explain_mongo, planning_enabled
+from backend.tracing import span
+from backend.result_cache import result_cache, make_key, mongo_collections
+from backend.value_dictionary import find_value, get_values_version, has_table
+from backend.join_graph import find_join_path, get_join_graph_version
+from nlp_logic.translation_cache import translation_cache, normalize_input
+from nlp_logic.mongo_results import fetch_documents, DEFAULT_BATCH_SIZE, DEFAULT_DOC_LIMIT
+from nlp_logic.pipeline_optimizer import optimize_pipeline
 
-# MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["chatDB"]
+# MongoDB setup (shared client; MongoClient connects lazily on first use)
+db = get_mongo_client()[DATABASE_NAME]
+
+logger = logging.getLogger("chatdb.mongo_NLP")
 
 # Utility functions
 def parse_query(query):
+    # The parse depends only on the text, the value dictionary and the join graph
+    key = ("mongo_nlp", normalize_input(query), get_values_version(), get_join_graph_version())
+    with span("query_generation", backend="mongo"):
+        return translation_cache.get_or_translate(key, lambda: _parse_query(query))
+
+def _join_fields(collection, other, default):
+    # Join keys discovered at ingest; collections loaded before the graph existed use the default
+    path = find_join_path("mongo", collection, other)
+    if path and len(path) == 1:
+        return path[0][1], path[0][3]
+    return default, default
+
+def _parse_query(query):
     query = query.strip()
 
     # Check if the query is a valid MongoDB query
@@ -28,7 +55,8 @@ def parse_query(query):
         return {
         "operation": "count",
         "collection": "shooter",  # Match the actual collection name
-        "filter": {"gender": {"$regex": f"^{gender}$", "$options": "i"}}  # Case-insensitive match
+        "filter": {"gender": gender},
+        "collation": CASE_INSENSITIVE  # Case-insensitive match that can use the collation index
         }
     
     # Count victims with specific injury
@@ -38,7 +66,8 @@ def parse_query(query):
         return {
         "operation": "count",
         "collection": "victim",  # Match the exact name of the collection
-        "filter": {"injury": {"$regex": f"^{injury}$", "$options": "i"}}  # Case-insensitive match
+        "filter": {"injury": injury},
+        "collation": CASE_INSENSITIVE  # Case-insensitive match that can use the collation index
         }
 
     # Query: Count incidents by location
@@ -55,21 +84,37 @@ def parse_query(query):
     match = re.match(r"how many incidents had a (\w+) shooter and a (\w+) victim", query)
     if match:
         shooter_gender, victim_gender = match.groups()
+        local_field, foreign_field = _join_fields("shooter", "victim", "incidentid")
         return {
         "operation": "join_count",
         "lookup": {
             "from": "victim",  # Lowercase collection name for lookup
-            "localField": "incidentid",  # Match field for joining
-            "foreignField": "incidentid",
+            "localField": local_field,  # Match field for joining
+            "foreignField": foreign_field,
             "as": "victim_data"
         },
         "collection": "shooter",  # Lowercase main collection name
         "filter": {
-            "gender": {"$regex": f"^{shooter_gender}$", "$options": "i"},  # Case-insensitive shooter gender
-            "victim_data.gender": {"$regex": f"^{victim_gender}$", "$options": "i"}  # Case-insensitive victim gender
-        }
+            "gender": shooter_gender,
+            "victim_data.gender": victim_gender
+        },
+        "collation": CASE_INSENSITIVE  # Applies to the joined collection as well
         }
 
+    # Count documents holding a value the collection is known to have, e.g. "how many shooters were student"
+    match = re.match(r"how many (\w+) (?:are|were|had|have|with|in) (\w+)$", query)
+    if match:
+        collection, value = match.groups()
+        if not has_table("mongo", collection) and collection.endswith("s"):
+            collection = collection[:-1]
+        known = find_value("mongo", collection, value)
+        if known:
+            return {
+            "operation": "count",
+            "collection": collection,
+            "filter": {known[0]: known[1]}  # Exact value as stored
+            }
+
     # Fallback for unmatched query
     return "Query not recognized or improperly formatted."
 
@@ -107,7 +152,105 @@ def is_mongo_query(query):
     # If none of the above checks pass, it's not a MongoDB query
     return False
 
-def execute_query(parsed_query):
+# Raw commands that only read (their results may be cached) and ones that write
+_READ_COMMAND = re.compile(r"^(find|find_one|aggregate|count_documents|estimated_document_count|distinct)\(")
+_WRITE_COMMAND = re.compile(r"^(insert|update|delete|replace|drop|bulk_write|find_one_and|rename)")
+
+def _cache_target(parsed_query):
+    """
+    Return (collections read, is_write) for a parsed query, or (None, False) if it must not be cached.
+    """
+    operation = parsed_query.get("operation")
+    if operation == "count":
+        return mongo_collections(parsed_query["collection"], parsed_query["filter"]), False
+    if operation == "join_count":
+        return mongo_collections(parsed_query["collection"], parsed_query["lookup"]), False
+    if operation == "raw_mongo":
+        raw_query = parsed_query["query"].strip()
+        parts = raw_query.split(".", 2)
+        if raw_query.startswith("db.") and len(parts) == 3:
+            if _READ_COMMAND.match(parts[2]):
+                return mongo_collections(parts[1], parts[2]), False
+            if _WRITE_COMMAND.match(parts[2]):
+                return {parts[1].lower()}, True
+    return None, False
+
+def _join_pipeline(parsed_query):
+    # The pipeline as generated and the optimized one that runs
+    pipeline = [
+        {"$lookup": parsed_query["lookup"]},
+        {"$unwind": "$victim_data"},
+        {"$match": parsed_query["filter"]},
+        {"$count": "total"}
+    ]
+    return pipeline, optimize_pipeline(pipeline)
+
+def plan_query(parsed_query):
+    """
+    Plan a generated count or join count without running it (see backend/query_planner.py).
+
+    Returns:
+        dict or None: The plan summary, or None for operations that are not planned (raw queries).
+    """
+    operation = parsed_query.get("operation")
+    collation = {"collation": parsed_query["collation"]} if parsed_query.get("collation") else {}
+    if operation == "count":
+        command = {"count": parsed_query["collection"], "query": parsed_query["filter"], **collation}
+        return explain_mongo(db, parsed_query["collection"], command)
+    if operation == "join_count":
+        _, optimized = _join_pipeline(parsed_query)
+        command = {"aggregate": parsed_query["collection"], "pipeline": optimized, "cursor": {}, **collation}
+        return explain_mongo(db, parsed_query["collection"], command, lookups=[parsed_query["lookup"]])
+    return None
+
+def execute_query(parsed_query, limit=DEFAULT_DOC_LIMIT, batch_size=DEFAULT_BATCH_SIZE, confirmed=False):
+    """
+    Run a parsed query, planning generated queries first.
+
+    Args:
+        confirmed (bool): The user agreed to run the query even though its plan is over the limits.
+
+    Raises:
+        QueryBlocked: The plan is over the limits.
+    """
+    # parse_query returns a message string when it does not understand the input
+    if isinstance(parsed_query, str):
+        return {"query": None, "result": parsed_query}
+
+    collections, is_write = _cache_target(parsed_query)
+    if collections and not is_write:
+        # Repeated read queries are served from the shared result cache
+        cache_key = make_key("mongo", DATABASE_NAME, parsed_query, limit)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    with mongo_deadline():
+        plan = None
+        if planning_enabled() and "error" not in parsed_query:
+            try:
+                with span("query_planning"):
+                    plan = plan_query(parsed_query)
+            except QueryTimeout:
+                raise
+            except Exception as e:
+                logger.warning("Could not plan query: %s", e)
+        if plan is not None:
+            logger.debug("Query plan: %s", plan)
+            check_plan(plan, confirmed)
+        with span("db_execution", operation=parsed_query.get("operation")):
+            result = _execute_query(parsed_query, limit, batch_size)
+        if plan is not None:
+            result["plan"] = plan
+
+    if collections and is_write:
+        for name in collections:
+            result_cache.invalidate("mongo", name)
+    elif collections and result.get("query") is not None:
+        result_cache.put(cache_key, result, {("mongo", name) for name in collections})
+    return result
+
+def _execute_query(parsed_query, limit, batch_size):
     if "error" in parsed_query:
         return {"query": None, "result": parsed_query["error"]}
 
@@ -116,22 +259,22 @@ def execute_query(parsed_query):
 
     if parsed_query["operation"] == "count":
         collection = db[parsed_query["collection"]]
-        mongo_query = f'db.{parsed_query["collection"]}.count_documents({parsed_query["filter"]})'
-        result = collection.count_documents(parsed_query["filter"])
+        collation = parsed_query.get("collation")
+        options = f", collation={collation}" if collation else ""
+        mongo_query = f'db.{parsed_query["collection"]}.count_documents({parsed_query["filter"]}{options})'
+        result = collection.count_documents(parsed_query["filter"], collation=collation, comment=mongo_comment())
         return {"query": mongo_query, "result": result}
 
     if parsed_query["operation"] == "join_count":
         collection = db[parsed_query["collection"]]
-        pipeline = [
-            {"$lookup": parsed_query["lookup"]},
-            {"$unwind": "$victim_data"},
-            {"$match": parsed_query["filter"]},
-            {"$count": "total"}
-        ]
-        mongo_query = f'db.{parsed_query["collection"]}.aggregate({pipeline})'
-        result = list(collection.aggregate(pipeline))
+        pipeline, optimized = _join_pipeline(parsed_query)
+        collation = parsed_query.get("collation")
+        options = f", collation={collation}" if collation else ""
+        mongo_query = f'db.{parsed_query["collection"]}.aggregate({pipeline}{options})'
+        optimized_query = f'db.{parsed_query["collection"]}.aggregate({optimized}{options})'
+        result = list(collection.aggregate(optimized, collation=collation, comment=mongo_comment()))
         count_result = result[0]["total"] if result else 0
-        return {"query": mongo_query, "result": count_result}
+        return {"query": mongo_query, "optimized_query": optimized_query, "result": count_result}
 
     if parsed_query["operation"] == "raw_mongo":
         try:
@@ -146,10 +289,17 @@ def execute_query(parsed_query):
 
                 # Execute the operation dynamically
                 exec_result = eval(f"collection.{command}")
-                return {"query": raw_query, "result": list(exec_result) if hasattr(exec_result, "__iter__") else exec_result}
+                if isinstance(exec_result, (Cursor, CommandCursor)) or hasattr(exec_result, "batch_size"):
+                    # Read the cursor in batches, stopping at the default document limit
+                    documents = fetch_documents(exec_result, limit=limit, batch_size=batch_size)
+                    return {"query": raw_query, "result": documents, "truncated": len(documents) == limit}
+                return {"query": raw_query, "result": list(exec_result) if hasattr(exec_result, "__iter__") and not isinstance(exec_result, (str, dict)) else exec_result}
 
             return {"query": None, "result": "Invalid MongoDB raw query format"}
         except Exception as e:
+            # Deadlines are reported by the caller, not as a query error
+            if isinstance(e, QueryTimeout) or getattr(e, "timeout", False):
+                raise
             return {"query": None, "result": f"Error executing raw MongoDB query: {str(e)}"}
 
     return {"query": None, "result": "Unsupported operation"}
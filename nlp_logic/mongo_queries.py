@@ -1,5 +1,20 @@
-from pymongo import MongoClient
+import json
+import logging
+from backend.connections import get_mongo_client
+from backend.index_manager import CASE_INSENSITIVE
+from backend.query_executor import mongo_comment, mongo_deadline
+from backend.result_cache import result_cache, make_key, mongo_collections
+from backend.tracing import span
+from nlp_logic.translation_cache import translation_cache, normalize_input
+from nlp_logic.mongo_results import fetch_documents, with_limit, DEFAULT_BATCH_SIZE, DEFAULT_DOC_LIMIT
+from nlp_logic.pipeline_optimizer import optimize_pipeline
 import re
+from datetime import datetime
+
+logger = logging.getLogger("chatdb.mongo_queries")
+
+# e.g. "from incident find where Date between '2022-01-01' and '2022-06-30'"
+DATE_RANGE_PATTERN = r"from (?P<table>\w+) find where (?P<date_field>\w+) (?:is )?(?:between|from) '?(?P<start_date>[\d/-]+)'? (?:and|to) '?(?P<end_date>[\d/-]+)'?"
 
 class QueryGenerator:
     def generate_query(self, query_type, **kwargs):
@@ -24,6 +39,11 @@ class QueryGenerator:
                 {"$match": kwargs["condition"]},
                 {"$sort": {kwargs["sort_column"]: 1 if kwargs["sort_order"].lower() == "asc" else -1}}
             ]
+        elif query_type == "mongo_filter_by_date_range":
+            # Dates are stored as BSON dates, so the range compares dates and can use an index on the field
+            return [
+                {"$match": {kwargs["date_field"]: {"$gte": kwargs["start_date"], "$lte": kwargs["end_date"]}}}
+            ]
         elif query_type == "mongo_count_by_category":
             return [
                 {"$group": {"_id": f"${kwargs['category']}", "count": {"$sum": 1}}}
@@ -35,24 +55,55 @@ class QueryGenerator:
 
 generator = QueryGenerator()
 
-def run_mongo_query(query, db_name, collection_name=None):
+def run_mongo_query(query, db_name, collection_name=None, projection=None, limit=DEFAULT_DOC_LIMIT, batch_size=DEFAULT_BATCH_SIZE, collation=None):
     """
     Executes the MongoDB query on the specified database and collection.
+
+    Results are read in batches of batch_size documents and capped at limit
+    documents; projection restricts the fields returned by find queries.
+    collation (e.g. CASE_INSENSITIVE) applies to every string comparison of the query.
     """
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client[db_name]
-    
-    if isinstance(query, list):  # Aggregate query
-        collection = db[collection_name]
-        return list(collection.aggregate(query))
-    elif isinstance(query, dict):  # Simple find query
+    db = get_mongo_client()[db_name]
+
+    if isinstance(query, (list, dict)):
+        # Repeated queries are served from the shared result cache
+        cache_key = make_key(
+            "mongo", db_name, query, collection_name, json.dumps(projection, sort_keys=True), limit, json.dumps(collation, sort_keys=True)
+        )
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
         collection = db[collection_name]
-        return list(collection.find(query))
+        with mongo_deadline():
+            if isinstance(query, list):  # Aggregate query
+                optimized = optimize_pipeline(query)
+                if optimized != query:
+                    logger.debug("Pipeline: %s\nOptimized pipeline: %s", query, optimized)
+                with span("db_execution"):
+                    cursor = collection.aggregate(
+                        with_limit(optimized, limit), batchSize=batch_size, collation=collation, comment=mongo_comment()
+                    )
+            else:  # Simple find query (sent with the first fetch)
+                cursor = collection.find(
+                    query, projection, limit=limit, batch_size=batch_size, collation=collation, comment=mongo_comment()
+                )
+            documents = fetch_documents(cursor, limit=limit, batch_size=batch_size)
+        result_cache.put(cache_key, documents, {("mongo", name) for name in mongo_collections(collection_name, query)})
+        return documents
     elif query is None:  # List collections
         return db.list_collection_names()
     else:
         raise ValueError("Unsupported query format.")
 
+def parse_date(date_str):
+    """
+    Parses a date such as '2022-06-01' or '2022/6/1' into the datetime it is stored as.
+    """
+    try:
+        return datetime.strptime(date_str.strip().replace("/", "-"), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Unsupported date format: {date_str}")
+
 def parse_condition(condition_str):
     """
     Parses a condition string and converts it into MongoDB query syntax.
@@ -115,6 +166,7 @@ def detect_intent(user_input):
         ("join_query", r"from (?P<table1>\w+) and (?P<table2>\w+) join (?P<local_field>\w+\.\w+) with (?P<foreign_field>\w+\.\w+) where (?P<condition>.+)"),
         ("total_group_by", r"from (?P<table>\w+) total (?P<measure>\w+) by (?P<category>\w+)"),
         ("filter_sort", r"from (?P<table>\w+) find (?P<columns>.+?) where (?P<condition>.+) order by (?P<sort_column>\w+) (?P<sort_order>\w+)"),
+        ("filter_date_range", DATE_RANGE_PATTERN),
         ("count_by_category", r"from (?P<table>\w+) count (?P<category>\w+)"),
         ("list_collections", r"list collections"),
     ]
@@ -123,23 +175,15 @@ def detect_intent(user_input):
             return intent
     return "unknown"
 
-def process_user_input_mongodb(user_input, db_name):
+def translate_mongodb(user_input, intent):
     """
-    Processes the user input and executes a MongoDB query based on the detected intent.
-    """
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client[db_name]
-
-    intent = detect_intent(user_input)
-    if intent == "unknown":
-        raise ValueError(f"Unable to detect intent for query: {user_input}")
-
-    # Handle the special case for "list collections"
-    if intent == "list_collections":
-        return extract_collections(user_input, db=db)
+    Build the MongoDB query for a user input and its intent, without running it.
 
+    Returns:
+        tuple: (collection to run the query on, pipeline).
+    """
     # Extract collections dynamically from the user input
-    collections = extract_collections(user_input, db=db)
+    collections = extract_collections(user_input)
     if not collections:
         raise ValueError("No collections found in the query.")
     
@@ -159,6 +203,11 @@ def process_user_input_mongodb(user_input, db_name):
             "query_type": "mongo_filter_and_sort",
             "params": ["condition", "sort_column", "sort_order"],
         },
+        "filter_date_range": {
+            "pattern": DATE_RANGE_PATTERN,
+            "query_type": "mongo_filter_by_date_range",
+            "params": ["date_field", "start_date", "end_date"],
+        },
         "count_by_category": {
             "pattern": r"from (?P<table>\w+) count (?P<category>\w+)",
             "query_type": "mongo_count_by_category",
@@ -180,21 +229,44 @@ def process_user_input_mongodb(user_input, db_name):
     # Parse conditions if applicable
     if "condition" in params:
         params["condition"] = parse_condition(params["condition"])
+    for name in ("start_date", "end_date"):
+        if name in params:
+            params[name] = parse_date(params[name])
 
-    if len(collections) == 1:
-        collection_name = collections[0]
-        query = generator.generate_query(query_type, **params)
-        results = run_mongo_query(query, db_name, collection_name)
-    else:
+    if len(collections) > 1:
         # Handle joins if multiple collections are specified
         params["table1"] = collections[0]
         params["table2"] = collections[1]
-        query = generator.generate_query(query_type, **params)
-        results = run_mongo_query(query, db_name, collections[0])  # Using the first collection as the base
+    # The first collection is the base of a join; single-collection patterns name theirs
+    return params.get("table") or collections[0], generator.generate_query(query_type, **params)
+
+def process_user_input_mongodb(user_input, db_name):
+    """
+    Processes the user input and executes a MongoDB query based on the detected intent.
+    """
+    db = get_mongo_client()[db_name]
+
+    with span("intent_detection") as detected:
+        intent = detect_intent(user_input)
+        detected["intent"] = intent
+    if intent == "unknown":
+        raise ValueError(f"Unable to detect intent for query: {user_input}")
+
+    # Handle the special case for "list collections"
+    if intent == "list_collections":
+        return extract_collections(user_input, db=db)
+
+    # Translations only depend on the input text, so repeated questions skip parsing and generation
+    with span("query_generation", intent=intent):
+        collection_name, query = translation_cache.get_or_translate(
+            ("mongodb", normalize_input(user_input), intent), lambda: translate_mongodb(user_input, intent)
+        )
+    # parse_condition lowercases values; the collation matches them against stored values of any case
+    return run_mongo_query(query, db_name, collection_name, collation=CASE_INSENSITIVE)
 
-    return results
 
+if __name__ == "__main__":
+    user_input = "list collections"
+    results = process_user_input_mongodb(user_input, "shooter")
+    print(results)
 
-user_input = "list collections"
-results = process_user_input_mongodb(user_input, "shooter")
-print(results)
@@ -0,0 +1,82 @@
+import json
+from datetime import datetime
+from itertools import islice
+
+import pandas as pd
+from pymongo.errors import PyMongoError
+
+from backend.query_executor import QueryTimeout
+from backend.tracing import span
+
+# MongoDB documents fetched per round trip, and the most documents a query returns by default
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_DOC_LIMIT = 1000
+
+
+def fetch_documents(cursor, limit=DEFAULT_DOC_LIMIT, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Consume at most limit documents from a cursor, batch_size documents per round trip.
+
+    The cursor is closed afterwards so the server drops whatever is left.
+
+    Args:
+        cursor: pymongo Cursor or CommandCursor.
+        limit (int): Maximum number of documents to return.
+        batch_size (int): Documents per getMore batch.
+
+    Returns:
+        list: The documents read.
+
+    Raises:
+        QueryTimeout: The server stopped the query; partial holds the documents read until then.
+    """
+    if hasattr(cursor, "batch_size"):
+        cursor.batch_size(min(batch_size, limit) if limit else batch_size)
+    documents = []
+    try:
+        with span("fetch") as fetched:
+            documents.extend(islice(cursor, limit) if limit else cursor)
+            fetched["rows"] = len(documents)
+        return documents
+    except PyMongoError as e:
+        if e.timeout:
+            # Keep the batches that arrived before maxTimeMS ran out
+            raise QueryTimeout(f"Query was stopped at its deadline after {len(documents)} documents: {e}", partial=documents) from e
+        raise
+    finally:
+        cursor.close()
+
+
+def with_limit(pipeline, limit=DEFAULT_DOC_LIMIT):
+    """
+    Append a $limit stage to an aggregation pipeline that does not end with one.
+    """
+    if not limit or (pipeline and "$limit" in pipeline[-1]) or (pipeline and "$count" in pipeline[-1]):
+        return pipeline
+    return pipeline + [{"$limit": limit}]
+
+
+def _cell(value):
+    # Arrays and nested values that json_normalize leaves in place are shown as JSON text
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def documents_to_frame(documents):
+    """
+    Flatten documents into a DataFrame with dotted column names (e.g. victim_data.gender).
+
+    ObjectIds and other BSON values become strings, arrays become JSON text and
+    the remaining columns get pandas' best matching nullable dtypes.
+    """
+    if not documents:
+        return pd.DataFrame()
+    df = pd.json_normalize(documents, sep=".")
+    for column in df.columns:
+        if df[column].dtype == "object":
+            df[column] = df[column].map(_cell)
+            # ObjectId, Decimal128, etc. are not understood by Arrow-based rendering
+            if not df[column].map(lambda v: v is None or isinstance(v, (str, int, float, bool, datetime))).all():
+                df[column] = df[column].map(lambda v: v if v is None else str(v))
+    return df.convert_dtypes()
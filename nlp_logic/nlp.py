@@ -1,105 +1,375 @@
+import logging
+import math
 import re
+from datetime import datetime
 from nlp_logic.query_patterns import generator
 from nlp_logic.query_suggestions import fetch_sql_metadata, fetch_mongo_metadata, process_sample_queries
 from sqlalchemy.sql import text
-from pymongo import MongoClient
+from backend.connections import get_mongo_client, DATABASE_NAME
+from backend.result_cache import result_cache, make_key, sql_tables
+from backend.query_executor import QueryTimeout, is_interrupted, query_timeout, with_max_execution_time
+from backend.statement_cache import BoundQuery, as_bound, execute_prepared, forget_statement, reset_session
+from backend.query_planner import check_plan, explain_sql, planning_enabled
+from backend.tracing import span, traced
+from backend.schema_catalog import get_column_names, get_schema_version, get_table_columns, list_tables
+from backend.value_dictionary import find_value, get_values_version
+from backend.join_graph import find_join_path, get_join_graph_version, has_join_table, join_table_name
+from nlp_logic.translation_cache import translation_cache, normalize_input
+
+logger = logging.getLogger("chatdb.nlp")
+
+# Intent patterns in priority order. The third element holds the dispatch
+# words of each intent: its pattern cannot match unless one of them occurs.
+INTENT_PATTERNS = [
+    ("join_query", r"\b(show|get)\b\s+(?P<table1>\w+)\s+\bwhich has\b\s+(?P<table2>\w+)\s+\bthat the\b\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>\w+)", {"which"}),  # Specific pattern for join queries
+    ("total_group_by", r"\btotal\b.*(\bby\b.*|\bwhere\b.*)", {"total"}),  # Updated pattern to handle 'total ... where ...'
+    ("filter_sort", r"\bfind\b.*\bwhere\b.*\border by\b.*", {"find"}),  # Pattern for filter and sort queries
+    ("count_by_category", r"\bcount\b.*\bby\b.*", {"count"}),  # Pattern for count by category
+    ("average_by_category", r"\baverage\b|\bmean\b.*\bof\b.*", {"average", "mean"}),  # Pattern for average by category
+    ("filter_by_date_range", r"\bshow\b.*\b(from|between)\b.*\b(to|and)\b.*", {"from", "between"}),  # Pattern for date range filters
+    ("basic_select", r"\b(get|show)\b.*\bwhere\b", {"where"}),  # Pattern for basic select queries
+    ("list_tables", r"\bshow\b.*\btables\b", {"tables"}),  # Pattern for listing tables
+    ("list_collections", r"\blist\b.*\bcollections\b", {"collections"}),  # Pattern for listing collections
+    # ("top_n_by_measure", r"\btop\b.*\bwhere\b.*"),  # Pattern for top N queries
+    ("describe_attr", r"\btable\b.*\battributes\b", {"attributes"}),
+    ("sample_queries", r"\bsample queries\b", {"sample"}),
+    ("sample_construct_queries", r"\bsample queries with\b.*", {"sample"}),
+]
+
+COMPILED_INTENT_PATTERNS = [(intent, re.compile(pattern)) for intent, pattern, _ in INTENT_PATTERNS]
+
+# Dispatch table: word -> positions (priorities) of the intents it can trigger
+INTENT_DISPATCH = {}
+for _priority, (_, _, _words) in enumerate(INTENT_PATTERNS):
+    for _word in _words:
+        INTENT_DISPATCH.setdefault(_word, []).append(_priority)
+
+EXTREMES = ['highest', 'lowest', 'largest', 'smallest']
+
+# Parameter extraction patterns, compiled once (case-insensitive)
+PARAM_PATTERNS = {
+    name: re.compile(pattern, re.IGNORECASE)
+    for name, pattern in {
+        "join_query": r"show\s+(?P<table1>\w+)\s+which\s+has\s+(?P<table2>\w+)\s+that\s+the\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>.+)",
+        "filter_by_date_range": r"show\s+(?P<table>\w+)\s+where\s+(?P<date_column>\w+)\s+is\s+(from|between)\s+'(?P<start_date>[\d/-]+)'\s+(to|and)\s+'(?P<end_date>[\d/-]+)'",
+        "basic_select_of": r"(get|show)\s+(?P<columns>[\w\s,]+)\s+(of)\s+(?P<table>\w+)\s*(?:where\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>[\w\s]+))?",
+        "basic_select": r"(get|show)\s+(?P<table>\w+)\s*(?:where\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>\w+))?",
+        "total_group_by": r"total (?P<measure>[\w\s]+) by (?P<category>\w+) from (?P<table>\w+)",
+        "average_by_category": r"average (?P<measure>[\w\s]+) by (?P<category>\w+) from (?P<table>\w+)",
+        "filter_sort": r"find\s+(?P<columns>(?:\w+\s*,\s*)*\w+)\s+from\s+(?P<table>\w+)\s+where\s+(?P<condition>.+)\s+order\s+by\s+(?P<sort_column>\w+)\s+(?P<sort_order>asc|desc)",
+        "count_by_category": r"count (?P<table>\w+) by (?P<category>\w+)",
+        "describe_attr": r"show\s+table\s+(?P<table>\w+)\s+attributes",
+    }.items()
+}
+
+# Filler words dropped before extraction (the lookahead keeps the following
+# space so consecutive fillers such as " me all " are all removed)
+_FILLER_ME = re.compile(r" me(?= )")
+_FILLER_WORDS = re.compile(r" (?:me|all|every)(?= )")
+_GET_PREFIX = re.compile(r"get (?:me )?")
+_WORD = re.compile(r"\w+")
+# "<column> <operator> <value>" conditions of filter_sort, e.g. "age is 15", "age > 15"
+_CONDITION = re.compile(r"^\s*(?P<column>\w+)\s*(?P<operator>is\b|!=|<>|>=|<=|=|>|<)\s*(?P<value>.+?)\s*$", re.IGNORECASE)
+
+_param_pattern_cache = {}
+
+
+def _compile_param_pattern(pattern):
+    regex = _param_pattern_cache.get(pattern)
+    if regex is None:
+        regex = _param_pattern_cache[pattern] = re.compile(pattern, re.IGNORECASE)
+    return regex
+
+
+class ParsedInput:
+    """
+    A user input normalized and tokenized once, shared by intent detection and parameter extraction.
+    """
+    __slots__ = ("text", "lowered", "tokens", "token_set")
+
+    def __init__(self, user_input):
+        self.text = user_input.strip()          # Original casing, used for extracting values
+        self.lowered = self.text.lower()        # Used for intent matching
+        self.tokens = _WORD.findall(self.lowered)
+        self.token_set = set(self.tokens)
+
+
+def parse_input(user_input):
+    return ParsedInput(user_input)
 
 
 # MongoDB Query Execution
 def run_mongo_query(query, db_name):
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client[db_name]
+    db = get_mongo_client()[db_name]
     result = db.command(query)
     return query, result
 
-# Function to run a SQL query
-def run_sql_query(query, engine):
-    cursor = engine.cursor()
-    res = []
-    headers = None
+# Rows shown per page of SQL results, and the most rows a generated SELECT may return
+PAGE_SIZE = 100
+MAX_RESULT_ROWS = 10000
+
+_SELECT = re.compile(r"^\s*select\b", re.IGNORECASE)
+# Statements that leave the session as it was, unless they assign variables (@x := ..., INTO @x) or take named locks
+_SESSION_READ = re.compile(r"^\s*(?:select|show|describe|desc|explain)\b", re.IGNORECASE)
+_SESSION_CHANGE = re.compile(r"@|\binto\b|\b(?:get|release)_lock\b", re.IGNORECASE)
+_TRAILING_LIMIT = re.compile(r"\s+limit\s+(\d+)\s*$", re.IGNORECASE)
+
+
+def _split_limit(query):
+    """
+    Split a SELECT into the statement without a trailing LIMIT n and that n (or None).
+    """
+    query = as_bound(query)
+    sql = query.sql.strip().rstrip(";").rstrip()
+    match = _TRAILING_LIMIT.search(sql)
+    if match:
+        return BoundQuery(sql[:match.start()], query.params), int(match.group(1))
+    return BoundQuery(sql, query.params), None
+
+
+# Give a generated SELECT the default row cap unless it already has a LIMIT
+def apply_row_limit(query, limit=MAX_RESULT_ROWS):
+    if not query or not _SELECT.match(as_bound(query).sql):
+        return query
+    base, existing = _split_limit(query)
+    return BoundQuery(f"{base.sql} LIMIT {existing if existing is not None else limit}", base.params)
+
+
+def paginate_query(query, page, page_size=PAGE_SIZE):
+    """
+    Rewrite a SELECT to fetch one page, pushing the row cap into its LIMIT.
+
+    Returns:
+        tuple: (paged query, number of rows on the page); the paged query asks for
+        one extra row when there may be a next page. Its LIMIT and OFFSET are bound,
+        so every page of a query runs the same prepared statement.
+    """
+    base, existing = _split_limit(query)
+    cap = min(existing, MAX_RESULT_ROWS) if existing is not None else MAX_RESULT_ROWS
+    offset = page * page_size
+    rows = max(0, min(page_size, cap - offset))
+    fetch = rows + 1 if offset + rows < cap else rows
+    return BoundQuery(f"{base.sql} LIMIT %s OFFSET %s", base.params + (fetch, offset)), rows
+
+
+def _with_deadline(query):
+    # Whole seconds, so a statement keeps the same text (and prepared statement) from run to run
+    return BoundQuery(with_max_execution_time(query.sql, math.ceil(query_timeout())), query.params)
+
+
+def fetch_sql_page(query, engine, page=0, page_size=PAGE_SIZE):
+    """
+    Execute one page of a query.
+
+    SELECTs run as prepared statements (see backend/statement_cache.py), paged
+    with LIMIT/OFFSET so only page_size rows (plus one to detect a next page)
+    leave the server; other statements (SHOW ...) are fetched whole.
+
+    Returns:
+        dict: {"rows", "headers", "page", "page_size", "has_more"}.
+    """
+    query = as_bound(query)
+    is_select = bool(_SELECT.match(query.sql))
+    if is_select:
+        # Repeated SELECTs are served from the shared result cache
+        cache_key = make_key("sql", DATABASE_NAME, str(query), page, page_size)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    page_data = {"rows": [], "headers": None, "page": page, "page_size": page_size, "has_more": False}
+    cursor = None
     try:
-        cursor.execute(query)
-    
-        res = cursor.fetchall()
-        headers = [desc[0] for desc in cursor.description]
-    except:
-        print('Run query error!')
+        if is_select:
+            paged_query, rows = paginate_query(query, page, page_size)
+            # The server stops the statement when the query's deadline passes
+            paged_query = _with_deadline(paged_query)
+            with span("db_execution", page=page):
+                prepared = execute_prepared(engine, paged_query)
+            try:
+                with span("fetch") as fetched:
+                    res = prepared.fetchmany(rows + 1) if rows else []
+                    prepared.fetchall()  # Drain the result before the connection is reused
+                    fetched["rows"] = len(res)
+            except Exception:
+                forget_statement(engine, paged_query)
+                raise
+            page_data["has_more"] = len(res) > rows
+            page_data["rows"] = res[:rows]
+            page_data["headers"] = [desc[0] for desc in prepared.description]
+            result_cache.put(cache_key, page_data, {("sql", table) for table in sql_tables(query.sql)})
+        else:
+            cursor = engine.cursor(buffered=False)
+            with span("db_execution"):
+                cursor.execute(query.sql, query.params or None)
+            with span("fetch") as fetched:
+                page_data["rows"] = cursor.fetchall()
+                fetched["rows"] = len(page_data["rows"])
+            page_data["headers"] = [desc[0] for desc in cursor.description]
+    except Exception as e:
+        if is_interrupted(e):
+            raise QueryTimeout(f"Query was stopped at its deadline: {e}", partial=page_data) from e
+        logger.error("Run query error! %s", e)
     finally:
-        cursor.close()
-        return res, headers
+        if cursor is not None:
+            cursor.close()
+        if not _SESSION_READ.match(query.sql) or _SESSION_CHANGE.search(query.sql):
+            # Query connections keep their sessions (and prepared statements) between checkouts,
+            # so whatever this statement may have set must not reach the next query
+            try:
+                reset_session(engine)
+            except Exception as e:
+                logger.warning("Could not reset the session: %s", e)
+    return page_data
+
+
+# Total row count of a query (without its row cap), only computed when asked for
+def count_query_rows(query, engine):
+    base, _ = _split_limit(query)
+    count_query = _with_deadline(BoundQuery(f"SELECT COUNT(*) FROM ({base.sql}) AS count_q", base.params))
+    try:
+        with span("db_execution", count=True):
+            return execute_prepared(engine, count_query).fetchall()[0][0]
+    except Exception:
+        forget_statement(engine, count_query)
+        raise
+
+
+# Function to run a SQL query (first page of results)
+def run_sql_query(query, engine, page=0, page_size=PAGE_SIZE, confirmed=False):
+    """
+    Plan a query (see backend/query_planner.py) and run one page of it.
+
+    Args:
+        confirmed (bool): The user agreed to run the query even though its plan is over the limits.
+
+    Returns:
+        tuple: (page, plan); page is fetch_sql_page()'s {"rows", "headers", "page", "page_size", "has_more"},
+        plan is None for statements that were not planned.
+
+    Raises:
+        QueryBlocked: The plan is over the limits.
+    """
+    plan = None
+    if planning_enabled() and _SELECT.match(as_bound(query).sql):
+        try:
+            with span("query_planning"):
+                plan = explain_sql(engine, query)
+        except Exception as e:
+            # A statement EXPLAIN rejects still runs and reports its own error
+            logger.warning("Could not plan query: %s", e)
+    if plan is not None:
+        logger.debug("Query plan: %s", plan)
+        check_plan(plan, confirmed)
+    return fetch_sql_page(query, engine, page, page_size), plan
     
+def iso_date(text):
+    """
+    Write a date the way DATE columns compare against it ('2022/6/1' -> '2022-06-01').
+    Text that is not a date is returned unchanged.
+    """
+    try:
+        return datetime.strptime(text.replace("/", "-"), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return text
+
+def equals_condition(engine, table, column, value, qualifier=""):
+    """
+    Build a case-insensitive equality condition that can use the column's index, with the value bound.
+
+    Columns with a case-insensitive collation compare as they are; case-sensitive
+    ones are compared through their indexed lowercase copy, when ingestion made one.
+
+    Args:
+        qualifier (str, optional): Table name to prefix the column with (for joins).
+    """
+    prefix = f"{qualifier}." if qualifier else ""
+    for col in get_table_columns(engine, table):
+        if col["name"].lower() == column.lower() and col.get("lowercase"):
+            return BoundQuery(f"{prefix}{col['lowercase']} = %s", (value.lower(),))
+    return BoundQuery(f"{prefix}{column} = %s", (value,))
+
 # Steps:
 # 1. Extract Parameters Dynamically: Use regex to extract parameters from the natural language input.
 # 2. Map Intent to the Query Pattern: Use the detected intent to choose the appropriate query template.
 # 3. Generate Queries Dynamically: Once parameters are extracted, use them to generate the query using the pattern's template depending on the database chosen (MongoDB or SQL).
-def process_user_input_sql(user_input, intent, engine):
+def translate_sql(parsed, intent, engine, params):
+    """
+    Build the SQL query for a parsed input and its intent, without running it.
+
+    Only schema metadata is read (through the schema catalog), so the result
+    depends on nothing but the input and the schema.
+
+    Values taken from the input are bound to placeholders, never written into the SQL.
+
+    Args:
+        parsed (ParsedInput): The user input.
+        intent (str): Its intent.
+        engine: SQLAlchemy engine, for schema metadata.
+        params (dict or None): The parameters match_intent() extracted for the intent.
 
-    result = []
+    Returns:
+        BoundQuery or None: The generated query, or None if the parameters could not be extracted.
+    """
+    query = None
 
     if intent == "join_query": #most complicated
-        # Updated pattern for join queries
-        pattern = r"show\s+(?P<table1>\w+)\s+which\s+has\s+(?P<table2>\w+)\s+that\s+the\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>.+)"
-        params = extract_params(user_input, pattern)
         if not params or not all(k in params for k in ['table1', 'table2', 'column', 'value']):
             raise ValueError("Invalid or missing parameters for join query.")
 
-        # Fetch column information for both tables
-        cursor = engine.cursor()
-        cursor.execute(f"DESC {params['table1']}")
-        columnsOf1 = [column[0] for column in cursor.fetchall()]
-
-        cursor.execute(f"DESC {params['table2']}")
-        columnsOf2 = [column[0] for column in cursor.fetchall()]
-        cursor.close()
-        # Identify joinable columns
-        join_column1 = next((col for col in columnsOf1 if 'id' in col.lower()), None)
-        join_column2 = next((col for col in columnsOf2 if 'id' in col.lower()), None)
-
-        if not join_column1 or not join_column2:
-            raise ValueError(f"No joinable columns found between {params['table1']} and {params['table2']}.")
+        # Tables the join graph knows are written as they were loaded (MySQL table names can be case-sensitive)
+        table1, table2 = join_table_name("sql", params['table1']), join_table_name("sql", params['table2'])
+        # Plan the joins with the join graph discovered at ingest (possibly through other tables)
+        path = find_join_path("sql", table1, table2)
+        if path is None:
+            if has_join_table("sql", table1) and has_join_table("sql", table2):
+                raise ValueError(f"No joinable columns found between {table1} and {table2}.")
+            # Tables loaded before the join graph existed: fall back to the first id-like columns
+            join_column1 = next((col for col in get_column_names(engine, table1) if 'id' in col.lower()), None)
+            join_column2 = next((col for col in get_column_names(engine, table2) if 'id' in col.lower()), None)
+            if not join_column1 or not join_column2:
+                raise ValueError(f"No joinable columns found between {table1} and {table2}.")
+            path = [(table1, join_column1, table2, join_column2)]
+        joins = "\n        ".join(
+            f"INNER JOIN {right} ON {left}.{left_column} = {right}.{right_column}"
+            for left, left_column, right, right_column in path
+        )
+        condition = equals_condition(engine, table2, params['column'], params['value'], table2)
         # Generate the query
-        query = f"""
-        SELECT {params['table1']}.* 
-        FROM {params['table1']} 
-        INNER JOIN {params['table2']} 
-        ON {params['table1']}.{join_column1} = {params['table2']}.{join_column2}
-        WHERE {params['table2']}.{params['column']} = '{params['value']}'
-        """.strip()
-        print("Generated Join Query:", query)
-        result = run_sql_query(query, engine)
+        query = BoundQuery(f"""
+        SELECT {table1}.* 
+        FROM {table1} 
+        {joins}
+        WHERE {condition.sql}
+        """.strip(), condition.params)
+        logger.info("Generated Join Query: %s", query)
     
     elif intent == "filter_by_date_range":
-        pattern = r"show\s+(?P<table>\w+)\s+where\s+(?P<date_column>\w+)\s+is\s+(from|between)\s+'(?P<start_date>[\d-]+)'\s+(to|and)\s+'(?P<end_date>[\d-]+)'"
-        params = extract_params(user_input, pattern)
-
         if params:
-            # Use generator to construct the query
-            query = generator.generate_query(
+            # Bare-column range on the DATE column, so an index on it can be used
+            query = generator.generate_statement(
                 "filter_by_date_range",
                 table=params["table"],
                 date_column=params["date_column"],
-                start_date=params["start_date"],
-                end_date=params["end_date"]
+                start_date=iso_date(params["start_date"]),
+                end_date=iso_date(params["end_date"])
             )
-            print(f"Generated Query: {query}")
-            result = run_sql_query(query, engine)
-            print("SQL Query Result:", result)
+            logger.info("Generated Query: %s", query)
 
     elif intent == 'basic_select':
-        # Flexible pattern for basic select queries
-        if " of " in user_input:
-            pattern = r"(get|show)\s+(?P<columns>[\w\s,]+)\s+(of)\s+(?P<table>\w+)\s*(?:where\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>[\w\s]+))?"
-        else:
-            user_input = user_input.replace(" all ", " ").replace(" every ", " ")    
-            pattern = r"(get|show)\s+(?P<table>\w+)\s*(?:where\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>\w+))?"
-        user_input = user_input.replace(" me ", " ")
-        params = extract_params(user_input, pattern)
-
+        select_input, _ = _param_input(parsed, intent)
         if params:
             # Dynamically construct the condition
             condition = None
             if params.get("column") and params.get("value"):
-                condition = f"{params['column']} = '{params['value']}'"
+                # Use the value as stored when the value dictionary knows it (e.g. "male" -> "Male")
+                known = find_value("sql", params["table"], params["value"], column=params["column"])
+                condition = equals_condition(engine, params["table"], params["column"], known[1] if known else params["value"])
+            elif " where " in select_input.lower():
+                # "show victims where fatal": find the column that holds the value
+                known = find_value("sql", params["table"], select_input.lower().split(" where ", 1)[1])
+                if known:
+                    condition = equals_condition(engine, params["table"], known[0], known[1])
 
 
             columns = "*"
@@ -107,58 +377,47 @@ def process_user_input_sql(user_input, intent, engine):
             if 'columns' in params:
                 columns = params['columns']
             # Generate the SQL query
-            query = generator.generate_query(
+            query = generator.generate_statement(
                 "basic_select",
                 table=params["table"],
                 condition=condition if condition else '',  # Default to no filtering
                 columns=columns
             )
-            print("Generated Basic Select Query:", query)
-
-            # Run the query
-            result = run_sql_query(query, engine)
+            logger.info("Generated Basic Select Query: %s", query)
     elif intent == "total_group_by":
-        pattern = r"total (?P<measure>[\w\s]+) by (?P<category>\w+) from (?P<table>\w+)"
-        params = extract_params(user_input, pattern)
         if params:
-            query = generator.generate_query(
+            query = generator.generate_statement(
                 "total_by_category",
                 category=params["category"],
                 measure=params["measure"].strip().replace(" ", "_"),  # Convert multi-word measures to column format if needed
                 table=params["table"]
             )
-            result = run_sql_query(query, engine)  # Run SQL query
-            print("Generated and Executed SQL Group By Query:", query)
-            print("SQL Query Result:", result)
+            logger.info("Generated SQL Group By Query: %s", query)
     
     elif intent == "average_by_category":
-        pattern = r"average (?P<measure>[\w\s]+) by (?P<category>\w+) from (?P<table>\w+)"
-        params = extract_params(user_input, pattern)
         if params:
-            query = generator.generate_query(
+            query = generator.generate_statement(
                 "average_by_category",
                 category=params["category"],
                 measure=params["measure"].strip().replace(" ", "_"),  # Convert multi-word measures to column format if needed
                 table=params["table"]
             )
-            result = run_sql_query(query, engine)  # Run SQL query
-            print("Generated and Executed SQL Group By Query:", query)
-            print("SQL Query Result:", result)
+            logger.info("Generated SQL Group By Query: %s", query)
 
     elif intent == "filter_sort":
-        pattern = r"find\s+(?P<columns>(?:\w+\s*,\s*)*\w+)\s+from\s+(?P<table>\w+)\s+where\s+(?P<condition>.+)\s+order\s+by\s+(?P<sort_column>\w+)\s+(?P<sort_order>asc|desc)"
-        params = extract_params(user_input, pattern)
         if params:
             # Split and clean up the column list
             columns = ', '.join([col.strip() for col in params['columns'].split(',')])
 
-            # Fix condition syntax (replace "is" with "=" for SQL compliance)
-            
-            condition  = params["condition"].replace(params["condition"].split("is ")[-1],f'\'{params["condition"].split("is ")[-1]}\'')
-            condition = condition.replace(" is ", " = ")
+            # "age is 15" -> age = %s with 15 bound ("is" becomes "=" for SQL compliance)
+            match = _CONDITION.match(params["condition"])
+            if not match:
+                raise ValueError(f"Unsupported condition: {params['condition']}")
+            operator = "=" if match.group("operator").lower() == "is" else match.group("operator")
+            condition = BoundQuery(f"{match.group('column')} {operator} %s", (match.group("value").strip("'\""),))
 
             # Generate the query dynamically using the generator
-            query = generator.generate_query(
+            query = generator.generate_statement(
                 "filter_sort",
                 columns=columns,  # Dynamically include columns
                 table=params["table"],
@@ -166,43 +425,26 @@ def process_user_input_sql(user_input, intent, engine):
                 sort_column=params["sort_column"],
                 sort_order=params["sort_order"].upper()  # Convert sort order to uppercase for SQL compliance
             )
-            print(f"Generated Filter and Sort Query: {query}")
-
-            # Execute the query
-            result = run_sql_query(query, engine)
-            print("SQL Query Result:", result)
+            logger.info("Generated Filter and Sort Query: %s", query)
 
     elif intent == "count_by_category":
-        pattern = r"count (?P<table>\w+) by (?P<category>\w+)"
-        params = extract_params(user_input, pattern)
         if params:
-            query = generator.generate_query(
+            query = generator.generate_statement(
                 "count_by_category",
                 category=params["category"],
                 table=params["table"]
             )
-            result = run_sql_query(query, engine)  # Run SQL query
-            print("Generated and Executed SQL Count By Query:", query)
-            print("SQL Query Result:", result)
+            logger.info("Generated SQL Count By Query: %s", query)
 
     elif intent == "list_tables":
-        query = generator.generate_query("list_tables")
-        result = run_sql_query(query, engine)
-        print("Generated List Tables Query:", query)
-        print("SQL Query Result:", result)
+        query = generator.generate_statement("list_tables")
+        logger.info("Generated List Tables Query: %s", query)
     
     
     elif intent == 'top_n_by_measures':
-        query = generator.generate_query("list_tables")
-        tuple_of_tables = run_sql_query(query, engine)
-        tables = []
-        for item in tuple_of_tables:            
-            if type(item[0]) == tuple:
-                tables=item
+        tables = [table.lower() for table in list_tables(engine)]
         
-        tables =  [item[0].lower() for item in tables]
-        
-        trim_input = user_input.replace("get me ", "").replace('get ', '')
+        trim_input = _GET_PREFIX.sub("", parsed.text)
         tokens = trim_input.split()
         number = tokens[0]
         extremes = ['highest', 'lowest', 'largest', 'smallest']
@@ -217,23 +459,20 @@ def process_user_input_sql(user_input, intent, engine):
             sort = 'ASC'
         
         if tokens[1] in tables or tokens[1][:-1] in tables:
-            print(tokens[1])
             if tokens[1] in tables:    
                 table = tokens[1]
             else:
                 table = tokens[1][:-1]
                 
             measure = tokens[-1]
-            print( number, table, measure, sort) 
-            print('NORMAL GET ORDER BY MEASURE')
-            query = generator.generate_query(
+            logger.debug("Top %s %s by %s (%s)", number, table, measure, sort)
+            query = generator.generate_statement(
                 "top_n_by_measure_table",
                 measure=measure,
                 table=table,
-                n=number,
+                n=int(number),  # LIMIT takes the number as written, so it must be one
                 sort_order=sort
             )
-            result = run_sql_query(query, engine)
         else:
            
             later_half = trim_input.split(mid)[-1]
@@ -244,120 +483,173 @@ def process_user_input_sql(user_input, intent, engine):
                     chosen_table = table
             measure =tokens[1]
             if chosen_table != '':
-                print( number, chosen_table, measure, sort) 
-                print('COUNT MEASURE')
-                query = generator.generate_query(
+                logger.debug("Top %s by count of %s in %s (%s)", number, measure, chosen_table, sort)
+                query = generator.generate_statement(
                     "top_n_by_measure_count",
                     measure=measure,
                     table=chosen_table,
-                    n=number,
+                    n=int(number),
                     sort_order=sort
                 )
-                result = run_sql_query(query, engine)
             else:
                 column = tokens[1].strip()
                 measure = later_half.strip().replace("number of ", "")
                 
                 for table in tables:
-                    query = 'SHOW COLUMNS FROM ' + table.upper()
-                    cols = run_sql_query(query, engine)[0]
-                    cols = [item[0].lower() for item in cols]
+                    cols = [col.lower() for col in get_column_names(engine, table)]
                     if column in cols  and measure in cols:
                         chosen_table = table                            
                         break
                 
-                query = generator.generate_query(
+                query = generator.generate_statement(
                     "top_n_by_measure_no_table",
                     measure=measure,
                     table=chosen_table,
-                    n=number,
+                    n=int(number),
                     sort_order=sort,
                     column=column
                 )
-                result = run_sql_query(query, engine)
-        print("Generated List Tables Query:", query)
-        print("SQL Query Result:", result)
+        logger.info("Generated List Tables Query: %s", query)
     elif intent == "describe_attr":
-        # Extract the table name from the user input
-        pattern = r"show\s+table\s+(?P<table>\w+)\s+attributes"
-        params = extract_params(user_input, pattern)
-
         if not params or 'table' not in params:
             raise ValueError("Invalid or missing table name for describe attributes intent.")
 
         table_name = params["table"]
 
-        # Generate and execute the DESCRIBE query
+        # Generate the DESCRIBE query
         query = f"SHOW COLUMNS FROM {table_name}"
-        print(f"Generated Describe Query: {query}")
-        result = run_sql_query(query, engine)
-        print("SQL Query Result:", result)
-    return query, result
+        logger.info("Generated Describe Query: %s", query)
+    return query
+
+
+def process_user_input_sql(user_input, intent, engine, confirmed=False, params=None):
+    # Accept either raw text or input already normalized by parse_input()
+    parsed = user_input if isinstance(user_input, ParsedInput) else parse_input(user_input)
+    # Parameters come with the intent from match_intent(); extract them only for callers that have none
+    if params is None:
+        params = intent_params(parsed, intent)
+
+    # Translations are reused until the schema, the value dictionary or the join graph changes (see translation_cache.py)
+    key = ("sql", normalize_input(parsed.text), intent, get_schema_version(), get_values_version(), get_join_graph_version())
+    with span("query_generation", intent=intent):
+        query = translation_cache.get_or_translate(key, lambda: translate_sql(parsed, intent, engine, params))
+    if query is None:
+        raise ValueError(f"Could not extract the parameters of a {intent} query from: {parsed.text}")
+
+    # The first page, with has_more telling whether there is a next one
+    result, plan = run_sql_query(query, engine, confirmed=confirmed)
+    logger.debug("SQL Query Result: %s", result["rows"])
+    # Show the query with the row cap that paging enforces
+    return apply_row_limit(query), result, plan
+
+
+def _param_input(parsed, intent):
+    # The text and parameter pattern an intent's parameters are extracted with
+    if intent == "basic_select":
+        # Flexible pattern for basic select queries
+        if " of " in parsed.text:
+            return _FILLER_ME.sub("", parsed.text), PARAM_PATTERNS["basic_select_of"]
+        return _FILLER_WORDS.sub("", parsed.text), PARAM_PATTERNS["basic_select"]
+    return parsed.text, PARAM_PATTERNS.get(intent)
 
 
-def detect_intent(user_input):
-    user_input = user_input.lower().strip()
-
-    # Define intent patterns with priorities
-    intent_patterns = [
-        ("join_query", r"\b(show|get)\b\s+(?P<table1>\w+)\s+\bwhich has\b\s+(?P<table2>\w+)\s+\bthat the\b\s+(?P<column>\w+)\s+(is|=)\s+(?P<value>\w+)"),  # Specific pattern for join queries
-        ("total_group_by", r"\btotal\b.*(\bby\b.*|\bwhere\b.*)"),  # Updated pattern to handle 'total ... where ...'
-        ("filter_sort", r"\bfind\b.*\bwhere\b.*\border by\b.*"),  # Pattern for filter and sort queries
-        ("count_by_category", r"\bcount\b.*\bby\b.*"),  # Pattern for count by category
-        ("average_by_category", r"\baverage\b|\bmean\b.*\bof\b.*"),  # Pattern for average by category
-        ("filter_by_date_range", r"\bshow\b.*\b(from|between)\b.*\b(to|and)\b.*"),  # Pattern for date range filters
-        ("basic_select", r"\b(get|show)\b.*\bwhere\b"),  # Pattern for basic select queries
-        ("list_tables", r"\bshow\b.*\btables\b"),  # Pattern for listing tables
-        ("list_collections", r"\blist\b.*\bcollections\b"),  # Pattern for listing collections
-        # ("top_n_by_measure", r"\btop\b.*\bwhere\b.*"),  # Pattern for top N queries
-        ("describe_attr", r"\btable\b.*\battributes\b"),
-        ("sample_queries", r"\bsample queries\b"),
-        ("sample_construct_queries", r"\bsample queries with\b.*")
-
-    ]
-
-    # Check patterns in priority order
-    for intent, pattern in intent_patterns:
-        if re.search(pattern, user_input):
-            print(f"Matched intent: {intent} for input: {user_input} with pattern: {pattern}")
+def intent_params(parsed, intent):
+    """
+    Extract the parameters of an intent from the input, as typed.
+
+    Returns:
+        dict or None: The parameters ({} for intents without any), None if the intent's parameter pattern does not match.
+    """
+    text, pattern = _param_input(parsed, intent)
+    return extract_params(text, pattern) if pattern else {}
+
+
+def find_intent(user_input):
+    """
+    Find the intent of a user input.
+
+    The input is normalized and tokenized once. Its tokens are looked up in the
+    dispatch table, so only the intents one of its words can trigger have their
+    pattern tried, still in priority order.
+
+    Args:
+        user_input (str or ParsedInput): The natural language query.
+
+    Returns:
+        str: The intent, "unknown" if none matches.
+    """
+    parsed = user_input if isinstance(user_input, ParsedInput) else parse_input(user_input)
+    lowered = parsed.lowered
+
+    candidates = set()
+    for token in parsed.token_set:
+        priorities = INTENT_DISPATCH.get(token)
+        if priorities:
+            candidates.update(priorities)
+
+    for priority in sorted(candidates):
+        intent, regex = COMPILED_INTENT_PATTERNS[priority]
+        if regex.search(lowered):
             return intent
 
-    extremes = ['highest', 'lowest', 'largest', 'smallest']
-    for extreme in extremes:
-        if extreme in user_input:
+    for extreme in EXTREMES:
+        if extreme in lowered:
             return 'top_n_by_measures'
 
     # Default intent if no patterns match
     return "unknown"
 
 
+def match_intent(user_input):
+    """
+    Find the intent of a user input and extract its parameters, once, for the query translation.
+
+    Args:
+        user_input (str or ParsedInput): The natural language query.
+
+    Returns:
+        tuple: (intent, params) where params is a dict (may be empty), or None when the intent's parameters could not be extracted.
+    """
+    parsed = user_input if isinstance(user_input, ParsedInput) else parse_input(user_input)
+    intent = find_intent(parsed)
+    return intent, intent_params(parsed, intent)
+
+
+def detect_intent(user_input):
+    intent = find_intent(user_input)
+    if intent != "unknown":
+        logger.debug("Matched intent: %s for input: %s", intent, user_input)
+    return intent
+
+
 # Extract parameters dynamically from the natural language query
+@traced("parameter_extraction")
 def extract_params(nl_query, pattern):
     """
     Extract parameters dynamically from a natural language query based on the provided pattern.
     
     Args:
         nl_query (str): The natural language query input from the user.
-        pattern (str): The regex pattern to match and extract parameters.
+        pattern (str or re.Pattern): The regex pattern to match and extract parameters.
     
     Returns:
         dict: A dictionary of extracted parameters or None if no match is found.
     """
     try:
-        # Convert the natural language pattern into a regex pattern
-        regex = re.compile(pattern, re.IGNORECASE)  # Case-insensitive matching
-        print(f"Using Regex Pattern: {regex}")
+        # Patterns are normally precompiled; plain strings are compiled once and reused
+        regex = pattern if isinstance(pattern, re.Pattern) else _compile_param_pattern(pattern)
+        logger.debug("Using Regex Pattern: %s", regex)
         # Attempt to match the regex pattern to the user query
         match = regex.match(nl_query.strip())
         
         if not match:
-            print(f"Could not extract parameters from: '{nl_query}'")
-            print(f"Tokenized input for debugging: {nl_query.split()}")
+            logger.debug("Could not extract parameters from: '%s'", nl_query)
+            logger.debug("Tokenized input for debugging: %s", nl_query.split())
             return None
 
         # Extract parameters into a dictionary
         data_dict = match.groupdict()
-        print(f"Extracted Parameters: {data_dict}")
+        logger.debug("Extracted Parameters: %s", data_dict)
 
         # Adjust special cases for 'columns'
         if 'columns' in data_dict and data_dict['columns'].strip().lower() in ['all', '*']:
@@ -371,20 +663,22 @@ def extract_params(nl_query, pattern):
         return data_dict
 
     except re.error as re_err:
-        print(f"Regex error: {re_err}")
+        logger.error("Regex error: %s", re_err)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred in extract_params: {e}")
+        logger.error("An unexpected error occurred in extract_params: %s", e)
         return None
   
 
 # Main function for processing the user input
-def process_user_input(user_input, db_type, engine):
-    # Step 1: Detect intent
-    intent = detect_intent(user_input)
-    print(intent)
+def process_user_input(user_input, db_type, engine, confirmed=False):
+    # Step 1: Normalize the input once and detect intent
+    parsed = parse_input(user_input)
+    with span("intent_detection") as detected:
+        intent, params = translation_cache.get_or_translate(("intent", normalize_input(parsed.text)), lambda: match_intent(parsed))
+        detected["intent"] = intent
     if intent == 'unknown':
-        print("Cannot detect intention")
+        logger.info("Cannot detect intention: %s", user_input)
         return []
 
     if intent == "sample_queries" or intent == "sample_construct_queries":
@@ -393,10 +687,10 @@ def process_user_input(user_input, db_type, engine):
 
     data_from_db = []
     if db_type == 'SQL':
-        data_from_db = process_user_input_sql(user_input, intent, engine)
+        data_from_db = process_user_input_sql(parsed, intent, engine, confirmed, params=params)
     elif db_type == 'MongoDB':
         data_from_db = process_user_input_mongodb(user_input, intent, engine)
     else:
-        print("Invalid DB Type")
+        logger.error("Invalid DB Type: %s", db_type)
         return []
     return data_from_db
@@ -0,0 +1,133 @@
+import copy
+
+# Rewrites generated MongoDB aggregation pipelines into cheaper equivalents:
+#
+# 1. Predicates of a $match that follows a $lookup (and its $unwind) but do not
+#    touch the joined field run before the $lookup, so fewer documents are joined.
+# 2. When the joined array is unwound, predicates on the joined documents move
+#    into the $lookup's own pipeline, so only matching documents are joined.
+# 3. $unwind + $count on the joined field becomes a $count inside the $lookup
+#    plus a $group summing the per-document counts.
+# 4. Adjacent $match, $limit and $skip stages are merged.
+#
+# The $lookup pipeline form used together with localField/foreignField needs MongoDB 5.0+.
+
+
+def _stage(stage):
+    return next(iter(stage.items()))
+
+
+def _unwind_path(stage):
+    # $unwind without preserveNullAndEmptyArrays drops unmatched documents, like an inner join
+    name, spec = _stage(stage)
+    if name != "$unwind":
+        return None
+    if isinstance(spec, str):
+        return spec.lstrip("$")
+    if spec.get("preserveNullAndEmptyArrays") or spec.get("includeArrayIndex"):
+        return None
+    return spec["path"].lstrip("$")
+
+
+def _split_match(condition, joined):
+    """
+    Split a $match condition into (predicates on the outer documents, predicates on
+    the joined field with the joined prefix removed, predicates that must stay put).
+    """
+    outer, inner, rest = {}, {}, {}
+    for field, predicate in condition.items():
+        if field.startswith("$"):
+            rest[field] = predicate
+        elif field == joined:
+            rest[field] = predicate
+        elif field.startswith(joined + "."):
+            inner[field[len(joined) + 1:]] = predicate
+        else:
+            outer[field] = predicate
+    return outer, inner, rest
+
+
+def _merge_matches(first, second):
+    if not set(first) & set(second):
+        return {**first, **second}
+    return {"$and": [first, second]}
+
+
+def _push_down_lookups(pipeline):
+    result = []
+    i = 0
+    while i < len(pipeline):
+        name, spec = _stage(pipeline[i])
+        if name != "$lookup" or "localField" not in spec:
+            result.append(pipeline[i])
+            i += 1
+            continue
+
+        lookup = copy.deepcopy(spec)
+        joined = lookup["as"]
+        unwound = i + 1 < len(pipeline) and _unwind_path(pipeline[i + 1]) == joined
+        following = i + 2 if unwound else i + 1
+        before = []
+        after = [{"$unwind": pipeline[i + 1]["$unwind"]}] if unwound else []
+
+        if following < len(pipeline) and _stage(pipeline[following])[0] == "$match":
+            outer, inner, rest = _split_match(pipeline[following]["$match"], joined)
+            if outer:
+                before.append({"$match": outer})
+            if inner and unwound:
+                # Only exact with $unwind: without it, the $match keeps whole documents, not matching array elements
+                lookup["pipeline"] = lookup.get("pipeline", []) + [{"$match": inner}]
+            elif inner:
+                rest.update({f"{joined}.{field}": predicate for field, predicate in inner.items()})
+            if rest:
+                after.append({"$match": rest})
+            following += 1
+
+        # Count inside the $lookup instead of unwinding every joined document
+        if (unwound and len(after) == 1 and following < len(pipeline)
+                and _stage(pipeline[following])[0] == "$count"):
+            total = pipeline[following]["$count"]
+            lookup["pipeline"] = lookup.get("pipeline", []) + [{"$count": "n"}]
+            after = [
+                {"$unwind": f"${joined}"},
+                {"$group": {"_id": None, total: {"$sum": f"${joined}.n"}}},
+            ]
+            following += 1
+
+        result += before + [{"$lookup": lookup}] + after
+        i = following
+    return result
+
+
+def _merge_adjacent(pipeline):
+    result = []
+    for stage in pipeline:
+        name, spec = _stage(stage)
+        if result:
+            previous_name, previous_spec = _stage(result[-1])
+            if name == previous_name == "$match":
+                result[-1] = {"$match": _merge_matches(previous_spec, spec)}
+                continue
+            if name == previous_name == "$limit":
+                result[-1] = {"$limit": min(previous_spec, spec)}
+                continue
+            if name == previous_name == "$skip":
+                result[-1] = {"$skip": previous_spec + spec}
+                continue
+        result.append(stage)
+    return result
+
+
+def optimize_pipeline(pipeline):
+    """
+    Return an equivalent, cheaper version of an aggregation pipeline (the input is not modified).
+
+    Args:
+        pipeline (list): Aggregation stages.
+
+    Returns:
+        list: The optimized stages.
+    """
+    if not isinstance(pipeline, list) or not all(isinstance(stage, dict) and len(stage) == 1 for stage in pipeline):
+        return pipeline
+    return _merge_adjacent(_push_down_lookups(_merge_adjacent(copy.deepcopy(pipeline))))
@@ -1,3 +1,12 @@
+import re
+from string import Formatter
+
+from backend.statement_cache import BoundQuery, sql_literal
+
+# In SQL templates, {name!v} marks a value: it becomes a %s placeholder with the
+# value bound to it instead of being written into the statement. Other
+# placeholders are identifiers or keywords (tables, columns, ASC/DESC).
+
 sql_query_patterns = [
     {
         "name": "total_by_category",
@@ -21,7 +30,7 @@ sql_query_patterns = [
     },
     {
         "name": "filter_by_date_range",
-        "sql": "SELECT * FROM {table} WHERE CONVERT(DATE, {date_column}) >= '{start_date}' AND CONVERT(DATE, {date_column}) <= '{end_date}' ",
+        "sql": "SELECT * FROM {table} WHERE {date_column} >= {start_date!v} AND {date_column} <= {end_date!v}",
         "description": "Filter {table} by date range between {start_date} and {end_date}"
     },
     {
@@ -82,7 +91,7 @@ mongo_query_patterns = [
     },
     {
         "name": "mongo_filter_by_date_range",
-        "query": '[{{"$match": {{"{date_field}": {{"$gte": "{start_date}", "$lte": "{end_date}"}}}}}}]',
+        "query": '[{{"$match": {{"{date_field}": {{"$gte": {{"$date": "{start_date}T00:00:00Z"}}, "$lte": {{"$date": "{end_date}T00:00:00Z"}}}}}}}}]',
         "description": "Filter documents in {collection} where {date_field} is between {start_date} and {end_date}"
     },
     {
@@ -107,7 +116,7 @@ mongo_query_patterns = [
     },
     {
         "name": "mongo_update_query",
-        "query": '[{{"update": "{collection}", "updates": [{{"q": {{"{field}": "{value}"}}, "u": {{"$set": {columns}}}}]}}]',
+        "query": '[{{"update": "{collection}", "updates": [{{"q": {{"{field}": "{value}"}}, "u": {{"$set": {columns}}}}}]}}]',
         "description": "Update documents in {collection} where {field} is {value}"
     },
     {
@@ -127,40 +136,90 @@ mongo_query_patterns = [
 # Class for a query pattern QueryPattern Class:
 # Each pattern will represent a specific query type (e.g., "total by category").
 # It includes a name (to identify the pattern), a query template (with placeholders like {category} and {measure}), and a description to explain what the pattern does.
+# The template is parsed once when the pattern is created, so the placeholders it needs are known up front.
 class QueryPattern:
     def __init__(self, name, template, description):
         self.name = name           # Name of the pattern (e.g., "total_by_category")
         self.template = template   # SQL or MongoDB query template with placeholders
         self.description = description  # A brief description of what the query does
-        # self.conditionclase = 
+        self.parts = list(Formatter().parse(template))  # (literal text, placeholder, format spec, conversion)
+        self.required = frozenset(
+            re.split(r"[.\[]", field_name, maxsplit=1)[0]
+            for _, field_name, _, _ in self.parts
+            if field_name
+        )  # Placeholder names the template needs
+
+    def bind(self, **kwargs):
+        return self._fill(kwargs)[0]
+
+    def render(self, **kwargs):
+        # The query as text, with any values written in (for display)
+        return self._fill(kwargs)[1]
+
+    def _fill(self, kwargs):
+        # Build the statement with its values bound and, alongside it, the display text: values are
+        # written in only where this loop put a placeholder, so a '%s' in any other text stays as it is.
+        # Check every placeholder is present before doing any formatting work
+        missing = self.required.difference(kwargs)
+        if missing:
+            raise ValueError(f"Missing parameter: {', '.join(sorted(missing))}")
+        sql, params, text = [], [], []
+        for literal, field_name, format_spec, conversion in self.parts:
+            sql.append(literal)
+            text.append(literal)
+            if field_name is None:
+                continue
+            value = kwargs[field_name]
+            if conversion == "v":
+                sql.append("%s")
+                params.append(value)
+                text.append(sql_literal(value))
+            elif isinstance(value, BoundQuery):
+                # A fragment with its own values, e.g. a WHERE condition
+                sql.append(value.sql)
+                params.extend(value.params)
+                text.append(str(value))
+            else:
+                sql.append(format(value, format_spec or ""))
+                text.append(sql[-1])
+        return BoundQuery("".join(sql), tuple(params)), "".join(text)
 
 
 # Class to manage multiple patterns and generate queries
-# This class manages a collection of query patterns.
+# This class manages a collection of query patterns, indexed by backend ("sql" or "mongo") and pattern name.
 # You can add new query patterns to it.
 # You can generate SQL or MongoDB queries by selecting the pattern and filling in the required placeholders (like the table name, column names, etc.).
 class QueryGenerator:
+    BACKENDS = ("sql", "mongo")
+
     def __init__(self):
-        self.patterns = []  # List to store all query patterns
+        self.patterns = {backend: {} for backend in self.BACKENDS}  # backend -> {pattern name: QueryPattern}
 
     # Function to add new patterns to the generator
-    def add_pattern(self, pattern):
-        self.patterns.append(pattern)
+    def add_pattern(self, pattern, backend="sql"):
+        if backend not in self.patterns:
+            raise ValueError(f"Unknown backend {backend}")
+        self.patterns[backend][pattern.name] = pattern
 
-    # Function to generate a query based on the pattern name
-    def generate_query(self, pattern_name, **kwargs):
-        for pattern in self.patterns:
-            if pattern.name == pattern_name:
-                print(pattern.template.format(**kwargs))
-
-                # Fill in the placeholders in the template with actual values (kwargs)
-                try:
-                    return pattern.template.format(**kwargs)
-                except KeyError as e:
-                    raise ValueError(f"Missing parameter: {e}")
+    def get_pattern(self, pattern_name, backend=None):
+        # Without an explicit backend, look the name up in each backend in turn
+        backends = (backend,) if backend else self.BACKENDS
+        for name in backends:
+            pattern = self.patterns.get(name, {}).get(pattern_name)
+            if pattern is not None:
+                return pattern
         # If the pattern is not found, raise an error
         raise ValueError(f"Pattern {pattern_name} not found")
 
+    # Function to generate a query based on the pattern name
+    def generate_query(self, pattern_name, backend=None, **kwargs):
+        # Fill in the placeholders in the template with actual values (kwargs)
+        return self.get_pattern(pattern_name, backend).render(**kwargs)
+
+    # Function to generate a SQL statement with its values bound rather than written in
+    def generate_statement(self, pattern_name, **kwargs):
+        return self.get_pattern(pattern_name, "sql").bind(**kwargs)
+
 # Initialize the query generator
 generator = QueryGenerator()
 
@@ -170,7 +229,7 @@ for pattern in mongo_query_patterns:
         pattern["name"],
         pattern["query"],
         pattern["description"]
-    ))
+    ), backend="mongo")
 
 
 for pattern in sql_query_patterns:
@@ -178,4 +237,4 @@ for pattern in sql_query_patterns:
         pattern["name"],
         pattern["sql"],
         pattern["description"]
-    ))
\ No newline at end of file
+    ), backend="sql")
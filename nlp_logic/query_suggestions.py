@@ -1,36 +1,32 @@
+import logging
 import random
-from pymongo import MongoClient
+from backend.connections import get_mongo_client
+from backend.schema_catalog import INTERNAL_TABLE_PREFIX, get_schema
+from backend.column_stats import get_table_stats, is_category, is_measure, table_rows
+from backend.value_dictionary import build_sql_values, get_table_values, get_values, has_table
+from backend.tracing import span
 from sqlalchemy.sql import text
 from sqlalchemy import create_engine
-from nlp_logic.query_patterns import sql_query_patterns, mongo_query_patterns
+from nlp_logic.query_patterns import generator, sql_query_patterns, mongo_query_patterns
 import mysql.connector
 
+logger = logging.getLogger("chatdb.query_suggestions")
+
+# MySQL DATA_TYPE values of numeric columns (compact schemas use the narrow integer types)
+NUMERIC_DATA_TYPES = ['tinyint', 'smallint', 'mediumint', 'int', 'bigint', 'float', 'double', 'decimal', 'number']
+
 def fetch_sql_metadata(engine):
     """
     Fetch table and column metadata from the SQL database.
 
     Args:
-        engine: SQLAlchemy engine object.
+        engine: MySQL connection.
 
     Returns:
         dict: A dictionary with table names as keys and column lists with types as values.
     """
-    metadata = {}
-    query = "SHOW TABLES;"
-            
-    cursor = engine.cursor()
-    cursor.execute(query)
-    res = cursor.fetchall()
-    tables = [row[0] for row in res]
-    
-    for table in tables:
-        attr_query = f"SHOW COLUMNS FROM {table}"
-        cursor.execute(attr_query)
-        attr_result = cursor.fetchall()
-        metadata[table] = [{"name": col[0], "type": col[1]} for col in attr_result]
- 
-    cursor.close()
-    return metadata
+    # Served from the cached schema catalog (one information_schema query per schema change)
+    return get_schema(engine)
 
 
 def fetch_mongo_metadata(db_name):
@@ -44,14 +40,17 @@ def fetch_mongo_metadata(db_name):
         dict: A dictionary with collection names as keys and field lists as values.
     """
     metadata = {}
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client[db_name]
-    collections = db.list_collection_names()
-    for collection_name in collections:
-        collection = db[collection_name]
-        sample_doc = collection.find_one()
-        if sample_doc:
-            metadata[collection_name] = list(sample_doc.keys())
+    db = get_mongo_client()[db_name]
+    with span("metadata_fetch", backend="mongo"):
+        collections = db.list_collection_names()
+        for collection_name in collections:
+            # Skip ChatDB's own bookkeeping collections (e.g. column statistics)
+            if collection_name.startswith(INTERNAL_TABLE_PREFIX):
+                continue
+            collection = db[collection_name]
+            sample_doc = collection.find_one()
+            if sample_doc:
+                metadata[collection_name] = list(sample_doc.keys())
     return metadata
 
 
@@ -95,26 +94,38 @@ def generate_sample_queries(db_type, metadata, construct=None, limit=3, engine=N
         if not columns:
             continue
 
-        # Classify columns       
-        numeric_columns = [col for col in columns if col['type'].strip() in ['float', 'int', 'number']]
-        categorical_columns = [col for col in columns if col not in numeric_columns]
+        # Classify columns with the statistics catalog: aggregate only over mostly-filled
+        # numeric columns and group only by low-cardinality ones
+        table_stats = get_table_stats("sql", table)
+        if table_stats:
+            numeric_columns = [col for col in columns if is_measure(table_stats.get(col['name']))]
+            categorical_columns = [col for col in columns if is_category(table_stats.get(col['name']))]
+        else:
+            numeric_columns = [col for col in columns if col.get('data_type', col['type']).strip() in NUMERIC_DATA_TYPES]
+            categorical_columns = [col for col in columns if col not in numeric_columns]
 
         # Generate date_column safely
-        date_columns = [col for col in columns if "date" in col['name'].lower()]
+        date_columns = [col for col in columns if col.get('data_type') == "date" or "date" in col['name'].lower()]
         list_date_col_names = [col['name'] for col in date_columns]
         date_column = random.choice(list_date_col_names) if list_date_col_names else None
         list_col_names = [col['name'] for col in columns]
         list_cate_col_names = [col['name'] for col in categorical_columns]
         list_numeric_col_names = [col['name'] for col in numeric_columns]
         
-        condition_col = random.choice(list_cate_col_names)
-        query = f"select {condition_col} from {table} group by {condition_col}"
-        cursor = engine.cursor()
-        cursor.execute(query)
-        res = cursor.fetchall()
-        res = [item[0] for item in res if item[0] and len(item[0].split()) == 1]
-        
-        random_condition_choice = random.choice(res)
+        # Condition values come from the value dictionary built at ingest time
+        if not has_table("sql", table):
+            build_sql_values(engine, table, list_cate_col_names)
+        condition_values = {
+            column: [value for value in values if len(value.split()) == 1]
+            for column, values in get_table_values("sql", table).items()
+            if column in list_cate_col_names
+        }
+        condition_values = {column: values for column, values in condition_values.items() if values}
+        if condition_values:
+            condition_col = random.choice(list(condition_values))
+            condition = f"{condition_col} is {random.choice(condition_values[condition_col])}"
+        else:
+            condition = None
         
         # Fill placeholders with actual values or defaults
         placeholders = {
@@ -122,19 +133,23 @@ def generate_sample_queries(db_type, metadata, construct=None, limit=3, engine=N
             "category": random.choice(list_cate_col_names) if list_cate_col_names else random.choice(list_col_names),
             "measure": random.choice(list_numeric_col_names) if list_numeric_col_names else random.choice(list_col_names),
             "columns": ", ".join(random.sample(list_col_names, min(2, len(list_col_names)))),
-            "condition": f"{condition_col} is {random_condition_choice}",
+            "condition": condition,
             "sort_column": random.choice(list_col_names),
             "sort_order": random.choice(["ASC", "DESC"]),
             "date_column": date_column,
             "start_date": "2022-01-01",
             "end_date": "2022-12-31",
-            "n": random.randint(4,10),
+            # Never ask for more rows than the table has
+            "n": min(random.randint(4, 10), table_rows(table_stats)) if table_stats else random.randint(4,10),
             "column": random.choice(list_col_names),
         }
 
         # Skip queries that require a date column but none exist
         if "{date_column}" in pattern.get("sql", "") and not placeholders["date_column"]:
             continue
+        # ... or a condition but the table has no category values
+        if "{condition}" in pattern.get("sql", "") and not placeholders["condition"]:
+            continue
         
         if not all(placeholders.get(key) for key in ["table", "columns", "measure", "sort_column", "sort_order"]):
             sample_queries.append({
@@ -154,8 +169,11 @@ def generate_sample_queries(db_type, metadata, construct=None, limit=3, engine=N
         }
 
         try:
-            query = pattern["sql"] if db_type.lower() == "sql" else pattern["query"]
-            query = query.format(**placeholders)
+            if db_type.lower() == "sql":
+                # Rendered with the values written in, since samples are shown, not run
+                query = generator.get_pattern(pattern["name"], "sql").render(**placeholders)
+            else:
+                query = pattern["query"].format(**placeholders)
 
             # Update the description with actual values
             description = description_templates.get(pattern["name"], pattern["description"]).format(
@@ -178,8 +196,8 @@ def generate_sample_queries(db_type, metadata, construct=None, limit=3, engine=N
                 "description": description,
                 "query": query
             })
-        except KeyError as e:
-            print(f"Missing placeholder: {e}")
+        except (KeyError, ValueError) as e:
+            logger.debug("Missing placeholder: %s", e)
             
 
     return sample_queries
@@ -217,18 +235,28 @@ def generate_mongo_sample_queries(metadata, construct=None, limit=3):
         if not fields:
             continue
 
-        # Classify fields
-        numeric_fields = [field for field in fields if "int" in field or "double" in field or "float" in field]
-        string_fields = [field for field in fields if field not in numeric_fields]
-        date_fields = [field for field in fields if "date" in field]
+        # Classify fields with the statistics catalog when the collection has statistics
+        collection_stats = get_table_stats("mongo", collection)
+        if collection_stats:
+            numeric_fields = [field for field in fields if is_measure(collection_stats.get(field))]
+            string_fields = [field for field in fields if is_category(collection_stats.get(field))]
+        else:
+            numeric_fields = [field for field in fields if "int" in field or "double" in field or "float" in field]
+            string_fields = [field for field in fields if field not in numeric_fields]
+        date_fields = [field for field in fields if "date" in field.lower()]
+
+        # Group and filter on low-cardinality fields when the statistics say which those are
+        field = random.choice(string_fields) if collection_stats and string_fields else random.choice(fields)
+        # A value the field actually holds, from the value dictionary built at import time
+        field_values = get_values("mongo", collection, field)
 
         placeholders_mongo = {
             "collection": collection,
-            "field": random.choice(fields),
+            "field": field,
             "numeric_field": random.choice(numeric_fields) if numeric_fields else random.choice(fields),
             "string_field": random.choice(string_fields) if string_fields else random.choice(fields),
             "date_field": random.choice(date_fields) if date_fields else None,
-            "value": "example_value",
+            "value": random.choice(field_values) if field_values else "example_value",
             "start_date": "2022-01-01",
             "end_date": "2022-12-31",
         }
@@ -258,7 +286,7 @@ def generate_mongo_sample_queries(metadata, construct=None, limit=3):
                 "query": query
             })
         except KeyError as e:
-            print(f"Missing placeholder: {e}")
+            logger.debug("Missing placeholder: %s", e)
 
     return sample_queries
 
@@ -288,11 +316,12 @@ def process_sample_queries(user_input, db_type, engine=None, metadata=None, db_n
     if "with" in user_input:
         construct = user_input.split("with")[-1].strip()
 
-    if db_type == "SQL":
-        queries = generate_sample_queries(db_type, metadata, construct=construct, limit=3, engine=engine)
-    elif db_type == "MongoDB":
-        queries = generate_mongo_sample_queries(metadata, construct=construct, limit=3)
+    with span("query_generation", samples=True):
+        if db_type == "SQL":
+            queries = generate_sample_queries(db_type, metadata, construct=construct, limit=3, engine=engine)
+        elif db_type == "MongoDB":
+            queries = generate_mongo_sample_queries(metadata, construct=construct, limit=3)
 
     for query in queries:
-        print(f"Description: {query['description']}\nQuery: {query['query']}\n")
+        logger.debug("Description: %s\nQuery: %s\n", query['description'], query['query'])
     return queries
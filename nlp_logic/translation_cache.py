@@ -0,0 +1,71 @@
+import copy
+import re
+import threading
+from collections import OrderedDict
+
+# Memoized natural language -> query translations (intent, parameters and the
+# generated SQL or MongoDB query), kept apart from the result cache: a
+# translation stays valid when the data changes and only goes stale when the
+# schema does, so SQL translations are keyed by the schema-version stamp.
+
+TRANSLATION_CACHE_MAX_ENTRIES = 1024
+
+_WHITESPACE = re.compile(r"\s+")
+
+_MISS = object()
+
+
+def normalize_input(user_input):
+    """
+    Collapse whitespace in a user input. Case is kept because values (e.g. 'Male') are taken from the input as typed.
+    """
+    return _WHITESPACE.sub(" ", user_input).strip()
+
+
+class TranslationCache:
+    def __init__(self, max_entries=TRANSLATION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_translate(self, key, translate):
+        """
+        Return the cached translation for key, or call translate() and cache what it returns.
+
+        Exceptions from translate() propagate and nothing is cached. A copy is
+        returned so callers may modify the dicts and pipelines they get back.
+        """
+        with self._lock:
+            value = self._entries.get(key, _MISS)
+            if value is not _MISS:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is _MISS:
+            value = translate()
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return copy.deepcopy(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+translation_cache = TranslationCache()
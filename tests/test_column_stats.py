@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from backend import column_stats, connections
+
+mongomock = pytest.importorskip("mongomock")
+
+ROWS = pd.DataFrame({"incidentid": [1, 2, 3], "injury": ["Fatal", "Wounded", "Fatal"]})
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    monkeypatch.setitem(connections._mongo_clients, connections.MONGO_URI, mongomock.MongoClient())
+    monkeypatch.setattr(column_stats, "_cached", {})
+
+
+def save(rows, replace=False):
+    column_stats.save_stats("mongo", "victim", column_stats.collect_stats(rows), replace=replace, db_name="chatDB")
+
+
+def rows():
+    return column_stats.table_rows(column_stats.get_table_stats("mongo", "victim", "chatDB"))
+
+
+def save_from_another_process(monkeypatch, rows):
+    cached = dict(column_stats._cached)
+    column_stats._cached.clear()
+    save(rows)
+    monkeypatch.setattr(column_stats, "_cached", cached)
+
+
+def test_appends_merge(catalog):
+    save(ROWS, replace=True)
+    save(ROWS)
+    stats = column_stats.get_table_stats("mongo", "victim", "chatDB")
+    assert column_stats.table_rows(stats) == 6
+    assert stats["injury"]["distinct"] == 2
+    assert column_stats.is_category(stats["injury"])
+
+
+def test_statistics_another_process_saved_are_read_after_the_ttl(catalog, monkeypatch):
+    save(ROWS, replace=True)
+    save_from_another_process(monkeypatch, ROWS)
+    assert rows() == 3
+    monkeypatch.setattr(column_stats, "STATS_CACHE_TTL", 0)
+    assert rows() == 6
+
+
+def test_append_merges_into_the_saved_statistics(catalog, monkeypatch):
+    save(ROWS, replace=True)
+    save_from_another_process(monkeypatch, ROWS)
+    save(ROWS)
+    assert rows() == 9
+
+
+def test_catalog_is_read_without_holding_the_lock(catalog, monkeypatch):
+    save(ROWS, replace=True)
+    read = column_stats._read_mongo_states
+    held = []
+
+    def checked_read(table, db_name):
+        held.append(column_stats._lock.locked())
+        return read(table, db_name)
+
+    monkeypatch.setattr(column_stats, "_read_mongo_states", checked_read)
+    monkeypatch.setattr(column_stats, "_cached", {})
+    assert rows() == 3
+    save(ROWS)
+    assert held == [False, False]
+    assert rows() == 6
@@ -0,0 +1,110 @@
+import pandas as pd
+
+import pytest
+
+from backend import backend_functions
+from backend.backend_functions import (
+    coerce_chunk, infer_column_type, infer_column_types, load_file_chunks, merge_column_type, merge_column_types,
+    parse_column_type, prepare_table,
+)
+
+
+@pytest.mark.parametrize("values, expected", [
+    ([1, 2, 300], "SMALLINT"),
+    ([1.5, 2], "FLOAT"),
+    (["2022/6/1", "2022-06-02"], "DATE"),
+    (["1:30", "12:05:09"], "TIME"),
+    ([None, None], None),
+])
+def test_inferred_types(values, expected):
+    assert infer_column_type(pd.Series(values)) == expected
+
+
+@pytest.mark.parametrize("current, new, widened", [
+    (None, "DATE", "DATE"),
+    ("DATE", None, "DATE"),
+    ("TINYINT", "SMALLINT", "SMALLINT"),
+    ("INT", "TINYINT", "INT"),
+    ("TINYINT", "FLOAT", "FLOAT"),
+    ("ENUM('a','b')", "ENUM('c')", "ENUM('a','b','c')"),
+    ("ENUM('a')", "VARCHAR(64)", "VARCHAR(64)"),
+    # Text has to hold the other type's values written out (an INT takes up to 20 characters)
+    ("VARCHAR(16)", "INT", "VARCHAR(32)"),
+    ("DATE", "VARCHAR(16)", "VARCHAR(16)"),
+    ("VARCHAR(16)", "TEXT", "TEXT"),
+])
+def test_types_widen(current, new, widened):
+    assert merge_column_type(current, new) == widened
+    assert merge_column_type(new, current) == widened
+
+
+def test_enum_with_too_many_values_becomes_varchar():
+    assert merge_column_type("ENUM(" + ",".join(f"'{i}'" for i in range(10)) + ")",
+                             "ENUM(" + ",".join(f"'{i}'" for i in range(10, 20)) + ")") == "VARCHAR(16)"
+
+
+def test_values_are_coerced_to_their_column_types():
+    df = pd.DataFrame({"i": ["1", "2.0", "x"], "d": ["2022/6/1", "bad", None], "t": ["1:30", "12:05:09", "x"]})
+    coerced = coerce_chunk(df, {"i": "SMALLINT", "d": "DATE", "t": "TIME"})
+    assert coerced["i"].tolist()[:2] == [1, 2] and pd.isna(coerced["i"].iloc[2])
+    assert str(coerced["d"].iloc[0]) == "2022-06-01" and pd.isna(coerced["d"].iloc[1]) and pd.isna(coerced["d"].iloc[2])
+    assert coerced["t"].tolist()[:2] == ["01:30:00", "12:05:09"] and pd.isna(coerced["t"].iloc[2])
+    # The input chunk is left alone
+    assert df["i"].tolist() == ["1", "2.0", "x"]
+
+
+def test_padded_values_are_enum_members_after_coercion():
+    series = pd.Series(["No"] * 20 + ["Yes"] * 5 + [" No", "Yes ", None])
+    column_type = infer_column_type(series)
+    assert column_type == "ENUM('No','Yes')"
+
+    coerced = coerce_chunk(pd.DataFrame({"Officer_Involved": series}), {"Officer_Involved": column_type})
+    values = coerced["Officer_Involved"]
+    assert values.iloc[-3:-1].tolist() == ["No", "Yes"]
+    assert values.isna().iloc[-1]
+    assert set(values.dropna()) <= {"No", "Yes"}
+
+
+def test_blank_values_are_missing():
+    series = pd.Series(["abc", "  ", "de "])
+    assert infer_column_type(series) == "VARCHAR(16)"
+    coerced = coerce_chunk(pd.DataFrame({"c": series}), {"c": "VARCHAR(16)"})["c"]
+    assert coerced.iloc[0] == "abc"
+    assert pd.isna(coerced.iloc[1])
+    assert coerced.iloc[2] == "de"
+
+
+def test_bundled_incident_values_fit_inferred_types():
+    # The load must not fail in strict mode: every text value fits its ENUM or VARCHAR
+    types = {}
+    for chunk, _ in load_file_chunks("data/INCIDENT.csv", chunksize=500):
+        types = merge_column_types(types, infer_column_types(chunk))
+    for chunk, _ in load_file_chunks("data/INCIDENT.csv", chunksize=500):
+        coerced = coerce_chunk(chunk, types)
+        for column, column_type in types.items():
+            kind, detail = parse_column_type(column_type or "VARCHAR(255)")
+            values = coerced[column].dropna()
+            if kind == "enum":
+                assert set(values) <= set(detail), column
+            elif kind == "varchar" and len(values):
+                assert values.astype(str).str.len().max() <= detail, column
+
+
+@pytest.mark.parametrize("chunksize, kept", [(10, True), (2, False)])
+def test_prepare_table_keeps_a_file_read_in_one_chunk(tmp_path, monkeypatch, chunksize, kept):
+    created = []
+    monkeypatch.setattr(backend_functions, "existing_column_types", lambda table_name: {})
+    monkeypatch.setattr(backend_functions, "create_table_from_dataframe", lambda df, table_name, engine, column_types: created.append(column_types))
+    monkeypatch.setattr(backend_functions, "invalidate_schema", lambda: None)
+    path = tmp_path / "people.csv"
+    path.write_text("name,age\nann,31\nbob,42\ncid,300\n")
+
+    columns, column_types, only_chunk = prepare_table(str(path), "people", engine=None, chunksize=chunksize)
+    assert columns == ["name", "age"]
+    # The types cover every chunk either way
+    assert column_types["age"] == "SMALLINT"
+    assert created == [column_types]
+    # Only a single-chunk file is handed back for loading; a larger one is read again
+    assert (only_chunk is not None) == kept
+    if kept:
+        assert list(only_chunk["name"]) == ["ann", "bob", "cid"]
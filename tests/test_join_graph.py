@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import join_graph
+
+
+def sketch(values, complete=True):
+    hashes = np.unique(pd.util.hash_pandas_object(pd.Series(values).astype(str), index=False).to_numpy().view(np.int64))
+    return hashes.tolist(), complete
+
+
+TABLES = {
+    "INCIDENT": {"Incident_ID": sketch(range(100))},
+    "shooter": {"incidentid": sketch(range(50)), "shooterid": sketch(range(1000, 1050))},
+    "weapon": {"shooterid": sketch(range(1000, 1020))},
+    "survey": {"surveyid": sketch(range(5000, 5030))},
+    "victim": {"incidentid": sketch(range(20, 80))},
+}
+
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(join_graph, "JOIN_GRAPH_PATH", str(tmp_path / "join_graph.json"))
+    monkeypatch.setattr(join_graph, "_graph", None)
+    monkeypatch.setattr(join_graph, "_loaded_at", 0.0)
+    monkeypatch.setattr(join_graph, "get_table_stats", lambda backend, table, db_name: {})
+    monkeypatch.setattr(join_graph, "get_table_sketches", lambda backend, table, db_name: next(
+        columns for name, columns in TABLES.items() if name.lower() == table
+    ))
+    for table in ["INCIDENT", "shooter", "weapon", "survey"]:
+        join_graph.update_join_graph("sql", table)
+
+
+def test_containment_of_a_foreign_key():
+    key = {"hashes": sketch(range(100))[0], "complete": True}
+    foreign = {"hashes": sketch(range(50))[0], "complete": True}
+    assert join_graph.containment(foreign, key) == 1.0
+    assert join_graph.containment(key, foreign) == 0.5
+
+
+def test_containment_needs_a_shared_range():
+    left = {"hashes": sketch(range(3))[0], "complete": True}
+    right = {"hashes": sketch(range(100))[0], "complete": True}
+    assert join_graph.containment(left, right) is None
+
+
+def test_direct_join(graph):
+    assert join_graph.find_join_path("sql", "incident", "shooter") == [("INCIDENT", "Incident_ID", "shooter", "incidentid")]
+
+
+def test_join_through_another_table(graph):
+    assert join_graph.find_join_path("sql", "weapon", "incident") == [
+        ("weapon", "shooterid", "shooter", "shooterid"),
+        ("shooter", "incidentid", "INCIDENT", "Incident_ID"),
+    ]
+
+
+def test_same_and_unconnected_tables(graph):
+    assert join_graph.find_join_path("sql", "shooter", "SHOOTER") == []
+    assert join_graph.find_join_path("sql", "incident", "survey") is None
+
+
+def test_tables_keep_the_name_they_were_loaded_with(graph):
+    assert join_graph.has_join_table("sql", "Incident")
+    assert join_graph.join_table_name("sql", "incident") == "INCIDENT"
+    assert join_graph.join_table_name("sql", "unknown") == "unknown"
+    # Reloading a table replaces its edges rather than adding a second copy
+    join_graph.update_join_graph("sql", "INCIDENT")
+    assert len(join_graph.join_edges("sql", "incident")) == 1
+
+
+def test_join_query_names_tables_as_loaded(graph, monkeypatch):
+    from nlp_logic import nlp
+
+    monkeypatch.setattr(nlp, "get_table_columns", lambda engine, table: [])
+    parsed = nlp.parse_input("show incident which has shooter that the gender is Male")
+    intent, params = nlp.match_intent(parsed)
+    query = nlp.translate_sql(parsed, intent, None, params)
+    assert query.sql.split() == (
+        "SELECT INCIDENT.* FROM INCIDENT INNER JOIN shooter ON INCIDENT.Incident_ID = shooter.incidentid "
+        "WHERE shooter.gender = %s"
+    ).split()
+    assert query.params == ("Male",)
+
+
+def test_tables_another_process_loaded(graph, monkeypatch):
+    # Another process loads victim and saves the graph; this process still has its own copy
+    stale = join_graph._graph
+    monkeypatch.setattr(join_graph, "_graph", None)
+    join_graph.update_join_graph("sql", "victim")
+    monkeypatch.setattr(join_graph, "_graph", stale)
+    version = join_graph.get_join_graph_version()
+    assert join_graph.find_join_path("sql", "victim", "incident") is None
+
+    monkeypatch.setattr(join_graph, "JOIN_GRAPH_CACHE_TTL", 0)
+    assert join_graph.find_join_path("sql", "victim", "incident") == [("victim", "incidentid", "INCIDENT", "Incident_ID")]
+    assert join_graph.get_join_graph_version() != version
+
+
+def test_update_keeps_tables_another_process_loaded(graph, monkeypatch):
+    stale = join_graph._graph
+    monkeypatch.setattr(join_graph, "_graph", None)
+    join_graph.update_join_graph("sql", "victim")
+    monkeypatch.setattr(join_graph, "_graph", stale)
+
+    join_graph.update_join_graph("sql", "weapon")
+    assert join_graph.has_join_table("sql", "victim")
+    assert join_graph.find_join_path("sql", "victim", "weapon") is not None
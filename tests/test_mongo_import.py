@@ -0,0 +1,52 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from backend import connections, value_dictionary
+from backend.nosql_backend import import_csv_to_mongodb
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def mongo(tmp_path, monkeypatch):
+    # Statistics and the value dictionary are written under .chatdb in the working directory
+    monkeypatch.chdir(tmp_path)
+    client = mongomock.MongoClient()
+    monkeypatch.setitem(connections._mongo_clients, connections.MONGO_URI, client)
+    monkeypatch.setattr(value_dictionary, "_dictionary", None)
+    monkeypatch.setattr(value_dictionary, "_loaded_at", 0.0)
+    return client
+
+
+def test_import_returns_documents_inserted(mongo, tmp_path):
+    path = tmp_path / "people.csv"
+    path.write_text("name,age\nann,31\nbob,42\n")
+    assert import_csv_to_mongodb(str(path), "chatDB") == 2
+    assert mongo["chatDB"]["people"].count_documents({}) == 2
+
+
+def test_failed_import_raises(mongo, tmp_path):
+    path = tmp_path / "broken.csv"
+    # Unterminated quote on the last row: the first chunk is inserted before reading fails
+    path.write_text('name,age\nann,31\nbob,"42\n')
+    with pytest.raises(pd.errors.ParserError):
+        import_csv_to_mongodb(str(path), "chatDB", chunksize=1)
+
+
+def test_column_types_are_decided_once_per_file(mongo, tmp_path):
+    path = tmp_path / "events.csv"
+    # One row per chunk: a chunk holding only 'unknown' must not turn the column into text
+    path.write_text("day,start\n2022/6/1,1:30\n2022-06-02,12:05\nunknown,\n")
+    import_csv_to_mongodb(str(path), "chatDB", chunksize=1)
+    documents = list(mongo["chatDB"]["events"].find({}, {"_id": 0}))
+    assert [doc["day"] for doc in documents] == [datetime.datetime(2022, 6, 1), datetime.datetime(2022, 6, 2), "unknown"]
+    assert [doc["start"] for doc in documents] == ["01:30:00", "12:05:00", None]
+
+
+def test_value_dictionary_sees_the_stored_values(mongo, tmp_path):
+    path = tmp_path / "shifts.csv"
+    path.write_text("start\n1:30\n1:30\n9:00\n")
+    import_csv_to_mongodb(str(path), "chatDB")
+    assert sorted(value_dictionary.get_values("mongo", "shifts", "start")) == ["01:30:00", "09:00:00"]
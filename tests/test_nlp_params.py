@@ -0,0 +1,25 @@
+from nlp_logic import nlp
+
+
+def test_match_intent_extracts_params_as_typed():
+    intent, params = nlp.match_intent("get me gender of shooter where race is Hispanic")
+    assert intent == "basic_select"
+    assert params == {"columns": "gender", "table": "shooter", "column": "race", "value": "Hispanic"}
+
+
+def test_match_intent_without_params():
+    assert nlp.match_intent("show tables") == ("list_tables", {})
+    assert nlp.match_intent("hello there") == ("unknown", {})
+
+
+def test_translate_sql_uses_the_matched_params(monkeypatch):
+    parsed = nlp.parse_input("find name, age from shooters where age > 15 order by age desc")
+    intent, params = nlp.match_intent(parsed)
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("parameters extracted twice")
+
+    monkeypatch.setattr(nlp, "extract_params", no_extraction)
+    query = nlp.translate_sql(parsed, intent, None, params)
+    assert query.sql == "SELECT name, age FROM shooter WHERE age > %s ORDER BY age DESC"
+    assert query.params == ("15",)
@@ -0,0 +1,59 @@
+import copy
+
+from nlp_logic.pipeline_optimizer import optimize_pipeline
+
+LOOKUP = {"$lookup": {"from": "shooter", "localField": "incidentid", "foreignField": "incidentid", "as": "shooters"}}
+
+
+def lookup_with(*stages):
+    return {"$lookup": {**LOOKUP["$lookup"], "pipeline": list(stages)}}
+
+
+def test_outer_predicates_run_before_the_lookup():
+    pipeline = [LOOKUP, {"$match": {"State": "CA", "shooters": {"$ne": []}}}]
+    assert optimize_pipeline(pipeline) == [{"$match": {"State": "CA"}}, LOOKUP, {"$match": {"shooters": {"$ne": []}}}]
+
+
+def test_joined_predicates_move_into_the_unwound_lookup():
+    pipeline = [LOOKUP, {"$unwind": "$shooters"}, {"$match": {"State": "CA", "shooters.gender": "Male"}}]
+    assert optimize_pipeline(pipeline) == [
+        {"$match": {"State": "CA"}},
+        lookup_with({"$match": {"gender": "Male"}}),
+        {"$unwind": "$shooters"},
+    ]
+
+
+def test_joined_predicates_stay_without_unwind():
+    # Without $unwind the $match keeps whole documents, so the joined array must not be filtered
+    pipeline = [LOOKUP, {"$match": {"shooters.gender": "Male"}}]
+    assert optimize_pipeline(pipeline) == pipeline
+
+
+def test_preserved_unwind_is_not_an_inner_join():
+    pipeline = [LOOKUP, {"$unwind": {"path": "$shooters", "preserveNullAndEmptyArrays": True}},
+                {"$match": {"shooters.gender": "Male"}}]
+    assert optimize_pipeline(pipeline) == pipeline
+
+
+def test_count_of_joined_documents_runs_inside_the_lookup():
+    pipeline = [LOOKUP, {"$unwind": "$shooters"}, {"$match": {"shooters.gender": "Male"}}, {"$count": "total"}]
+    assert optimize_pipeline(pipeline) == [
+        lookup_with({"$match": {"gender": "Male"}}, {"$count": "n"}),
+        {"$unwind": "$shooters"},
+        {"$group": {"_id": None, "total": {"$sum": "$shooters.n"}}},
+    ]
+
+
+def test_adjacent_stages_are_merged():
+    pipeline = [{"$match": {"a": 1}}, {"$match": {"b": 2}}, {"$match": {"a": 3}}, {"$skip": 5}, {"$skip": 5},
+                {"$limit": 20}, {"$limit": 10}]
+    assert optimize_pipeline(pipeline) == [
+        {"$match": {"$and": [{"a": 1, "b": 2}, {"a": 3}]}}, {"$skip": 10}, {"$limit": 10},
+    ]
+
+
+def test_input_is_not_modified():
+    pipeline = [LOOKUP, {"$unwind": "$shooters"}, {"$match": {"State": "CA", "shooters.gender": "Male"}}]
+    original = copy.deepcopy(pipeline)
+    optimize_pipeline(pipeline)
+    assert pipeline == original
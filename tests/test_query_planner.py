@@ -0,0 +1,113 @@
+import pytest
+
+from backend import query_planner
+from backend.query_planner import QueryBlocked, check_plan
+
+EXPLAIN_JOIN = {
+    "query_block": {
+        "cost_info": {"query_cost": "2400.50"},
+        "nested_loop": [
+            {"table": {"table_name": "incident", "access_type": "ALL", "rows_examined_per_scan": 1000,
+                       "rows_produced_per_join": 1000}},
+            {"table": {"table_name": "shooter", "access_type": "ref", "key": "incidentid",
+                       "rows_examined_per_scan": 2, "rows_produced_per_join": 2000}},
+        ],
+    }
+}
+
+
+def plan(rows, full_scan=False):
+    access = [{"table": "incident", "access_type": "ALL" if full_scan else "ref", "key": None, "rows": rows, "full_scan": full_scan}]
+    return query_planner._summary("sql", access)
+
+
+def test_nested_loop_tables_are_read_per_outer_row():
+    access = []
+    query_planner._sql_access(EXPLAIN_JOIN, access)
+    assert [(entry["table"], entry["rows"], entry["full_scan"]) for entry in access] == [
+        ("incident", 1000, True), ("shooter", 2000, False),
+    ]
+    assert query_planner._summary("sql", access)["estimated_rows"] == 3000
+
+
+@pytest.mark.parametrize("mode", ["confirm", "block"])
+def test_cheap_plans_run(monkeypatch, mode):
+    monkeypatch.setattr(query_planner, "PLAN_MODE", mode)
+    check_plan(plan(500))
+    check_plan(plan(query_planner.PLAN_FULL_SCAN_ROWS - 1, full_scan=True))
+
+
+def test_large_full_scans_need_confirmation(monkeypatch):
+    monkeypatch.setattr(query_planner, "PLAN_MODE", "confirm")
+    with pytest.raises(QueryBlocked) as blocked:
+        check_plan(plan(query_planner.PLAN_FULL_SCAN_ROWS, full_scan=True))
+    assert blocked.value.confirmable
+    assert "scans all of incident" in str(blocked.value)
+    check_plan(plan(query_planner.PLAN_FULL_SCAN_ROWS, full_scan=True), confirmed=True)
+
+
+def test_block_mode_ignores_confirmation(monkeypatch):
+    monkeypatch.setattr(query_planner, "PLAN_MODE", "block")
+    with pytest.raises(QueryBlocked) as blocked:
+        check_plan(plan(query_planner.PLAN_MAX_ROWS + 1), confirmed=True)
+    assert not blocked.value.confirmable
+    assert "estimated to examine" in str(blocked.value)
+
+
+def test_off_mode_lets_everything_run(monkeypatch):
+    monkeypatch.setattr(query_planner, "PLAN_MODE", "off")
+    check_plan(plan(query_planner.PLAN_MAX_ROWS * 10, full_scan=True))
+
+
+class FakeCollection:
+    def __init__(self, documents, indexes):
+        self.documents = documents
+        self.indexes = indexes
+
+    def estimated_document_count(self):
+        return self.documents
+
+    def index_information(self):
+        return self.indexes
+
+
+class FakeDatabase:
+    name = "chatDB"
+
+    def __init__(self, explained, collections):
+        self.explained = explained
+        self.collections = collections
+
+    def command(self, *args, **kwargs):
+        return self.explained
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def test_mongo_estimates_come_from_the_statistics(monkeypatch):
+    stats = {
+        "incident": {"State": {"rows": 1000, "distinct": 50}},
+        "shooter": {"incidentid": {"rows": 3000, "distinct": 1000}},
+    }
+    monkeypatch.setattr(query_planner, "get_table_stats", lambda backend, table, db_name: stats.get(table, {}))
+    explained = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {
+        "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "State_1", "keyPattern": {"State": 1}},
+    }}}}]}
+    db = FakeDatabase(explained, {
+        "incident": FakeCollection(1000, {}),
+        "shooter": FakeCollection(3000, {"incidentid_1": {"key": [("incidentid", 1)]}}),
+        "victim": FakeCollection(20000, {}),
+    })
+    lookup = {"from": "shooter", "localField": "Incident_ID", "foreignField": "incidentid", "as": "shooters"}
+    summary = query_planner.explain_mongo(db, "incident", {"aggregate": "incident"}, lookups=[lookup])
+    # 1000 rows / 50 states read through the index, then 3 shooters per incident through theirs
+    assert [(entry["table"], entry["rows"], entry["full_scan"]) for entry in summary["access"]] == [
+        ("incident", 20, False), ("shooter", 60, False),
+    ]
+
+    # Without an index on the foreign field every outer document scans the joined collection
+    lookup = {"from": "victim", "localField": "Incident_ID", "foreignField": "incidentid", "as": "victims"}
+    summary = query_planner.explain_mongo(db, "incident", {"aggregate": "incident"}, lookups=[lookup])
+    assert summary["access"][-1] == {"table": "victim", "access_type": "COLLSCAN", "key": None, "rows": 400000, "full_scan": True}
+    assert summary["full_scan"]
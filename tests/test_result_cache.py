@@ -0,0 +1,60 @@
+import time
+
+from backend.result_cache import ResultCache, make_key, mongo_collections, normalize_sql, sql_tables
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1, [("sql", "t")])
+    cache.put("b", 2, [("sql", "t")])
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3, [("sql", "t")])
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_size_bound():
+    cache = ResultCache(max_bytes=2000)
+    cache.put("big", "x" * 5000, [])
+    assert cache.get("big") is None
+    cache.put("a", "x" * 900, [])
+    cache.put("b", "x" * 900, [])
+    cache.put("c", "x" * 900, [])
+    assert cache.get("a") is None and cache.get("c") is not None
+    assert cache.stats()["bytes"] <= 2000
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl=10)
+    cache.put("a", 1, [])
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_writes_to_a_table_invalidate_its_results():
+    cache = ResultCache()
+    cache.put("join", 1, [("sql", "incident"), ("sql", "shooter")])
+    cache.put("victims", 2, [("sql", "victim")])
+    cache.put("mongo", 3, [("mongo", "shooter")])
+    cache.invalidate("sql", "SHOOTER")
+    assert cache.get("join") is None
+    assert (cache.get("victims"), cache.get("mongo")) == (2, 3)
+
+
+def test_keys_and_tables():
+    assert make_key("sql", "db", "SELECT *\n  FROM t;") == make_key("sql", "db", "SELECT * FROM t")
+    assert make_key("mongo", "db", {"b": 1, "a": 2}) == make_key("mongo", "db", {"a": 2, "b": 1})
+    assert sql_tables("SELECT * FROM INCIDENT INNER JOIN `shooter` ON x = y") == {"incident", "shooter"}
+    assert mongo_collections("Incident", [{"$lookup": {"from": "shooter"}}]) == {"incident", "shooter"}
+
+
+def test_sql_keys_keep_whitespace_inside_literals():
+    assert make_key("sql", "db", "SELECT * FROM t WHERE name = 'a  b'") != make_key("sql", "db", "SELECT * FROM t WHERE name = 'a b'")
+    assert make_key("sql", "db", "SELECT *  FROM t WHERE name = 'it''s  here'") == make_key("sql", "db", "SELECT * FROM t\nWHERE name = 'it''s  here';")
+    assert normalize_sql("SELECT  \"x  y\",\t`a  b` FROM t") == "SELECT \"x  y\", `a  b` FROM t"
@@ -0,0 +1,55 @@
+import pytest
+
+from nlp_logic import nlp
+
+
+class FakeCursor:
+    description = [("id",)]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params):
+        limit, offset = params[-2:]
+        self.result = self.rows[offset:offset + limit]
+
+    def fetchmany(self, size):
+        result, self.result = self.result[:size], self.result[size:]
+        return result
+
+    def fetchall(self):
+        result, self.result = self.result, []
+        return result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    connection_id = 1
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, prepared=False, buffered=None):
+        return FakeCursor(self.rows)
+
+
+@pytest.fixture(autouse=True)
+def no_planning_or_caching(monkeypatch):
+    monkeypatch.setattr(nlp, "planning_enabled", lambda: False)
+    monkeypatch.setattr(nlp.result_cache, "get", lambda key: None)
+    monkeypatch.setattr(nlp.result_cache, "put", lambda key, value, tables: None)
+
+
+@pytest.mark.parametrize("total, has_more", [
+    (nlp.PAGE_SIZE - 1, False),
+    (nlp.PAGE_SIZE, False),
+    (nlp.PAGE_SIZE + 1, True),
+])
+def test_first_page_knows_whether_there_is_a_next_one(total, has_more):
+    connection = FakeConnection([(i,) for i in range(total)])
+    page, plan = nlp.run_sql_query(nlp.BoundQuery("SELECT id FROM t"), connection)
+    assert len(page["rows"]) == min(total, nlp.PAGE_SIZE)
+    assert page["has_more"] is has_more
+    assert page["headers"] == ["id"] and plan is None
@@ -0,0 +1,134 @@
+import datetime
+
+import pytest
+
+from backend import statement_cache
+from backend.statement_cache import BoundQuery, execute_prepared, interpolate, reset_session
+from nlp_logic.nlp import fetch_sql_page
+from nlp_logic.query_patterns import generator
+
+
+class FakeCursor:
+    description = [("value",)]
+
+    def __init__(self, fail=False):
+        self.executed = []
+        self.closed = False
+        self.fail = fail
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, size):
+        return []
+
+    def execute(self, sql, params):
+        if self.fail:
+            raise RuntimeError("interrupted")
+        self.executed.append((sql, params))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, connection_id=1):
+        self.connection_id = connection_id
+        self.cursors = []
+        self.fail = False
+        self.resets = 0
+
+    def cursor(self, prepared=False, buffered=None):
+        self.cursors.append(FakeCursor(self.fail))
+        return self.cursors[-1]
+
+    def reset_session(self):
+        self.resets += 1
+
+
+def test_values_are_written_as_literals_for_display():
+    query = BoundQuery("SELECT * FROM t WHERE a = %s AND b = %s AND c = %s AND d = %s AND e = %s",
+                       ("O'Brien\\", None, True, datetime.date(2022, 6, 1), 1.5))
+    assert str(query) == "SELECT * FROM t WHERE a = 'O''Brien\\\\' AND b = NULL AND c = 1 AND d = '2022-06-01' AND e = 1.5"
+
+
+def test_placeholders_must_match_the_values():
+    with pytest.raises(ValueError):
+        interpolate("SELECT %s, %s", (1,))
+
+
+def test_patterns_bind_values_and_fragments():
+    condition = BoundQuery("gender = %s", ("Male'; DROP TABLE shooter; --",))
+    query = generator.generate_statement("basic_select", columns="*", table="shooter", condition=condition)
+    assert query == BoundQuery("SELECT * FROM shooter WHERE gender = %s", ("Male'; DROP TABLE shooter; --",))
+
+    query = generator.generate_statement("filter_by_date_range", table="incident", date_column="Date",
+                                         start_date="2022-01-01", end_date="2022-12-31")
+    assert query.sql == "SELECT * FROM incident WHERE Date >= %s AND Date <= %s"
+    assert str(query) == "SELECT * FROM incident WHERE Date >= '2022-01-01' AND Date <= '2022-12-31'"
+
+
+def test_statements_are_prepared_once_per_connection():
+    connection = FakeConnection()
+    first = execute_prepared(connection, BoundQuery("SELECT * FROM t WHERE a = %s", (1,)))
+    second = execute_prepared(connection, BoundQuery("SELECT * FROM t WHERE a = %s", (2,)))
+    assert first is second and len(connection.cursors) == 1
+    assert first.executed == [("SELECT * FROM t WHERE a = %s", (1,)), ("SELECT * FROM t WHERE a = %s", (2,))]
+
+    # A reconnect loses the prepared statements
+    connection.connection_id = 2
+    execute_prepared(connection, BoundQuery("SELECT * FROM t WHERE a = %s", (3,)))
+    assert len(connection.cursors) == 2
+
+
+def test_least_recently_used_statements_are_closed(monkeypatch):
+    monkeypatch.setattr(statement_cache, "STATEMENT_CACHE_SIZE", 2)
+    connection = FakeConnection()
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+        execute_prepared(connection, sql)
+    one, two, three = connection.cursors
+    assert two.closed and not one.closed and not three.closed
+
+
+def test_failed_statements_are_prepared_again():
+    connection = FakeConnection()
+    connection.fail = True
+    with pytest.raises(RuntimeError):
+        execute_prepared(connection, "SELECT 1")
+    connection.fail = False
+    execute_prepared(connection, "SELECT 1")
+    assert connection.cursors[0].closed and len(connection.cursors) == 2
+
+
+def test_percent_s_in_text_is_not_a_placeholder():
+    assert generator.generate_query("mongo_basic_select", backend="mongo", field="name", value="50%s off") == \
+        '[{"$match": {"name": "50%s off"}}]'
+    assert generator.generate_query("basic_select", backend="sql", columns="*", table="t",
+                                    condition="name LIKE '50%s'") == "SELECT * FROM t WHERE name LIKE '50%s'"
+    assert generator.generate_query("filter_by_date_range", table="t", date_column="d",
+                                    start_date="50%s", end_date="2022-01-01") == \
+        "SELECT * FROM t WHERE d >= '50%s' AND d <= '2022-01-01'"
+    assert str(BoundQuery("SELECT * FROM t WHERE name LIKE '50%s'")) == "SELECT * FROM t WHERE name LIKE '50%s'"
+
+
+def test_reset_session_forgets_the_prepared_statements():
+    connection = FakeConnection()
+    execute_prepared(connection, "SELECT 1")
+    reset_session(connection)
+    execute_prepared(connection, "SELECT 1")
+    assert connection.resets == 1 and len(connection.cursors) == 2
+
+
+@pytest.mark.parametrize("sql, resets", [
+    ("SHOW TABLES", 0),
+    ("SELECT * FROM t", 0),
+    ("SET @limit = 5", 1),
+    ("CREATE TEMPORARY TABLE tmp (a INT)", 1),
+    ("SELECT @total := COUNT(*) FROM t", 1),
+])
+def test_statements_that_may_change_the_session_reset_it(monkeypatch, sql, resets):
+    monkeypatch.setattr("nlp_logic.nlp.result_cache.get", lambda key: None)
+    monkeypatch.setattr("nlp_logic.nlp.result_cache.put", lambda key, value, tables: None)
+    connection = FakeConnection()
+    fetch_sql_page(sql, connection)
+    assert connection.resets == resets
@@ -0,0 +1,48 @@
+import json
+
+import pandas as pd
+import pytest
+
+from backend import value_dictionary
+
+
+@pytest.fixture
+def dictionary_path(tmp_path, monkeypatch):
+    path = tmp_path / "value_dictionary.json"
+    monkeypatch.setattr(value_dictionary, "VALUE_DICTIONARY_PATH", str(path))
+    monkeypatch.setattr(value_dictionary, "_dictionary", None)
+    monkeypatch.setattr(value_dictionary, "_loaded_at", 0.0)
+    return path
+
+
+def load(table, df):
+    value_dictionary.update_values("sql", table, value_dictionary.collect_values(df), replace=True)
+
+
+def test_values_are_found_ignoring_case(dictionary_path):
+    load("shooter", pd.DataFrame({"gender": ["Male", "Female", "Male"]}))
+    assert value_dictionary.find_value("sql", "shooter", "male") == ("gender", "Male")
+    assert value_dictionary.find_value("sql", "shooter", "unknown") is None
+
+
+def test_update_keeps_tables_another_process_saved(dictionary_path):
+    load("shooter", pd.DataFrame({"gender": ["Male", "Female"]}))
+    # Another process loads a table and rewrites the file
+    saved = json.loads(dictionary_path.read_text())
+    saved["sql"]["victim"] = {"injury": ["Fatal", "Wounded"]}
+    dictionary_path.write_text(json.dumps(saved))
+
+    load("weapon", pd.DataFrame({"gun_type": ["Handgun", "Rifle"]}))
+    assert value_dictionary.has_table("sql", "victim")
+    assert set(json.loads(dictionary_path.read_text())["sql"]) == {"shooter", "victim", "weapon"}
+
+
+def test_values_another_process_loaded_appear_after_the_ttl(dictionary_path, monkeypatch):
+    load("shooter", pd.DataFrame({"gender": ["Male", "Female"]}))
+    version = value_dictionary.get_values_version()
+    dictionary_path.write_text(json.dumps({"sql": {"victim": {"injury": ["Fatal", "Wounded"]}}}))
+
+    assert not value_dictionary.has_table("sql", "victim")
+    monkeypatch.setattr(value_dictionary, "VALUES_CACHE_TTL", 0)
+    assert value_dictionary.find_value("sql", "victim", "fatal") == ("injury", "Fatal")
+    assert value_dictionary.get_values_version() != version